@@ -0,0 +1,150 @@
+#! /usr/bin/env python3
+"""Sputnik Allocation Benchmark
+
+This measures the memory a Network allocates for each line it receives from an
+IRC network and delivers to its Clients, half of which have enabled the IRCv3
+``server-time`` capability. tracemalloc reports the median peak of memory
+allocated while reading and delivering a chunk of traffic, and the memory
+still held afterwards. A profiling hook counts the calls that encode, decode,
+normalize or tag a line. A recorded log may be given as an argument, e.g.
+`python3 benchmarks/allocations.py freenode.log`.
+"""
+
+import asyncio
+import collections
+import contextlib
+import gc
+import os
+import statistics
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "sputnik"))
+sys.path.insert(0, os.path.dirname(__file__))
+from client import Client
+from network import Network
+import traffic
+
+COUNTED = ("encode", "decode", "normalize", "add_tags")
+BUILTINS = ("encode",)
+
+
+class Transport(object):
+    """A transport that discards everything written to it."""
+
+    def write(self, data): pass
+    def writelines(self, lines): pass
+    def set_write_buffer_limits(self, high, low): pass
+    def get_extra_info(self, name, default=None): return default
+
+
+class Bouncer(object):
+    """A Bouncer with no Datastore and no listeners."""
+
+    def __init__(self):
+        self.clients = set()
+        self.networks = dict()
+        self.subscribers = dict()
+        self.datastore = None
+        self.archive = None
+
+
+def populate(clients):
+    """Creates a Bouncer with one Network and its Clients."""
+
+    bouncer = Bouncer()
+    network = Network(bouncer, "bench", "localhost", 6667,
+                      "nick", "user", "real")
+    bouncer.networks["bench"] = network
+    network.connection_made(Transport())
+    for number in range(clients):
+        client = Client(bouncer)
+        client.connection_made(Transport())
+        client.data_received(b"USER bench 0 * :real\r\n")
+        if number % 2: client.caps.add("server-time")
+    return network
+
+
+def chunks(lines, size=4096):
+    """Splits traffic into reads of roughly the size a socket would return."""
+
+    payload = "".join(line + "\r\n" for line in lines).encode()
+    return [payload[start:start+size]
+            for start in range(0, len(payload), size)]
+
+
+def deliver(network, chunk):
+    """Reads a chunk, and delivers it as the event loop would."""
+
+    network.data_received(chunk)
+    network.flush()
+
+    # the flush has already run, so none needs to be scheduled
+    network.flushing = True
+
+
+def allocations(network, reads):
+    """Returns the median peak and retained bytes allocated for the traffic.
+
+    Tracing restarts for every chunk, so that each peak is its own, without
+    ``tracemalloc.reset_peak``, which needs Python 3.9. The traffic is then
+    delivered again, under a single trace, to find the memory retained.
+    """
+
+    gc.collect()
+    peaks = []
+    for chunk in reads:
+        tracemalloc.start()
+        deliver(network, chunk)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    gc.collect()
+    tracemalloc.start()
+    for chunk in reads: deliver(network, chunk)
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.size for stat in snapshot.statistics("filename")
+                   if "sputnik" in stat.traceback[0].filename)
+    return statistics.median(peaks), retained
+
+
+def calls(network, reads):
+    """Returns the number of calls made to each counted function."""
+
+    counts = collections.Counter()
+
+    def profile(frame, event, argument):
+        if event == "call": name = frame.f_code.co_name
+        elif event == "c_call" and argument.__name__ in BUILTINS:
+            name = argument.__name__
+        else: return
+        if name in COUNTED: counts[name] += 1
+
+    sys.setprofile(profile)
+    try:
+        for chunk in reads: deliver(network, chunk)
+    finally: sys.setprofile(None)
+    return counts
+
+
+if __name__ == "__main__":
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    lines = traffic.load(sys.argv[1] if len(sys.argv) > 1 else None, 20000)
+    reads = chunks(lines)
+    total = len(lines)
+
+    print("%8s %14s %14s %s" % ("clients", "peak/read", "retained/line",
+                                "  ".join("%9s" % name for name in COUNTED)))
+    with open(os.devnull, "w") as devnull:
+        for clients in [1, 4, 16]:
+            with contextlib.redirect_stdout(devnull):
+                network = populate(clients)
+                deliver(network, reads[0])
+                peak, retained = allocations(network, reads)
+                counts = calls(populate(clients), reads)
+            print("%8d %12dB %13.1fB %s" % (
+                clients, peak, retained / total,
+                "  ".join("%9.2f" % (counts[name] / total)
+                          for name in COUNTED)))
@@ -0,0 +1,84 @@
+#! /usr/bin/env python3
+"""Sputnik Parse and Dispatch Benchmark
+
+This routes a busy-channel log through the Message parser and the Connection
+dispatch table, and compares it against the `str.split` and `if/elif` chain
+previously used by `Network.data_received`. A recorded log of raw IRC lines may
+be given as an argument, e.g. `python3 benchmarks/dispatch.py freenode.log`.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "sputnik"))
+sys.path.insert(0, os.path.dirname(__file__))
+from connection import Connection
+from message import Message
+import traffic
+
+
+class Router(Connection):
+    """A Connection that counts messages instead of acting on them."""
+
+    def __init__(self):
+        self.counts = [0, 0, 0]
+        self.connection_made(transport=None)
+
+    def irc_PING(self, message): self.counts[0] += 1
+    def irc_PONG(self, message): self.counts[0] += 1
+    def irc_PRIVMSG(self, message): self.counts[1] += 1
+    def unhandled(self, message): self.counts[2] += 1
+
+
+def legacy(lines):
+    """Routes lines the way `Network.data_received` used to."""
+
+    counts = [0, 0, 0]
+    for line in lines:
+        words = line.split(" ", 2)
+        if   words[0] == "PING": counts[0] += 1
+        elif words[1] == "PONG": counts[0] += 1
+        elif words[0] == "PRIVMSG" or words[1] == "PRIVMSG": counts[1] += 1
+        else: counts[2] += 1
+    return counts
+
+
+def dispatched(lines):
+    """Routes lines through the dispatch table, parsing only the command."""
+
+    router = Router()
+    for line in lines: router.line_received(line)
+    return router.counts
+
+
+def parsed(lines):
+    """Fully parses every line, as a handler inspecting parameters would."""
+
+    for line in lines:
+        message = Message(line)
+        message.tags, message.prefix, message.params
+
+
+def measure(function, lines):
+    """Returns the elapsed time of the fastest of three runs."""
+
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        function(lines)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    lines = traffic.load(sys.argv[1] if len(sys.argv) > 1 else None)
+    assert legacy(lines) == dispatched(lines)
+
+    print("%d lines" % len(lines))
+    for name, function in [("legacy split/if-chain", legacy),
+                           ("dispatch (command only)", dispatched),
+                           ("full parse", parsed)]:
+        elapsed = measure(function, lines)
+        print("%-26s %10.2fms %10.0fns/line" % (
+            name, elapsed * 1000, elapsed * 1e9 / len(lines)))
@@ -0,0 +1,257 @@
+"""Sputnik Benchmark Fakes
+
+This module provides stand-ins for everything around the Bouncer, so that it
+can be driven under load in a single process: an IRC server that emits timed
+channel traffic, IRC clients that measure how long that traffic takes to reach
+them, and a Datastore that keeps everything in memory.
+"""
+
+import asyncio
+import random
+import time
+import types
+
+
+def resolved(value=None):
+    """Returns a Future that has already resolved to a value."""
+
+    future = asyncio.Future()
+    future.set_result(value)
+    return future
+
+
+class Traffic(object):
+    """The shape of the traffic sent to each Network.
+
+    Lines are sent in bursts, spaced so that the average rate is kept. A
+    burst of ``1`` is steady traffic, while larger bursts resemble netsplits
+    and busy moments.
+
+    Attributes:
+        rate (float): PRIVMSG lines per second, for each Network.
+        burst (int): The number of lines sent at once.
+        seed (int): The random seed used to pick channels and nicknames.
+    """
+
+    def __init__(self, rate=1000.0, burst=1, seed=2812):
+        self.rate = rate
+        self.burst = burst
+        self.seed = seed
+
+
+class Session(asyncio.Protocol):
+    """A connection from a Network to the fake IRC server.
+
+    The session registers the Network, confirms each channel it joins, and
+    once started, sends PRIVMSG lines to those channels. Each line carries
+    the time it was sent, so that Clients can measure its latency.
+
+    Attributes:
+        server (FakeServer): The fake IRC server.
+        channels (list of str): The channels the Network has joined.
+        sent (int): The number of PRIVMSG lines sent.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.channels = []
+        self.sent = 0
+        self.nickname = "nick"
+        self.buffer = b""
+        self.task = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.sessions.append(self)
+
+    def connection_lost(self, exc):
+        if self.task: self.task.cancel()
+        self.server.sessions.remove(self)
+
+    def data_received(self, data):
+        lines = (self.buffer + data).split(b"\r\n")
+        self.buffer = lines.pop()
+        for line in lines:
+            words = line.decode().split(" ")
+            if words[0] == "NICK": self.nickname = words[1]
+            elif words[0] == "USER":
+                self.write(":irc.example.net 001 %s :Welcome" % self.nickname,
+                           ":irc.example.net 005 %s PREFIX=(ov)@+ "
+                           "CHANTYPES=# :are supported" % self.nickname)
+            elif words[0] == "JOIN":
+                for channel in words[1].split(","):
+                    self.channels.append(channel)
+                    self.write(":%s!user@host JOIN %s" % (self.nickname,
+                                                          channel),
+                               ":irc.example.net 366 %s %s :End of /NAMES"
+                               % (self.nickname, channel))
+            elif words[0] == "PING":
+                self.write(":irc.example.net PONG irc.example.net %s"
+                           % words[-1])
+
+    def write(self, *lines):
+        self.transport.write("".join(line + "\r\n" for line in lines).encode())
+
+    @asyncio.coroutine
+    def emit(self, traffic):
+        """Sends timed PRIVMSG lines until cancelled."""
+
+        generator = random.Random(traffic.seed)
+        loop = asyncio.get_event_loop()
+        interval = traffic.burst / traffic.rate
+        deadline = loop.time()
+        while True:
+            stamp = time.perf_counter()
+            self.write(*[":nick%d!user@host PRIVMSG %s :t=%.9f hello" % (
+                generator.randrange(200), generator.choice(self.channels),
+                stamp) for _ in range(traffic.burst)])
+            self.sent += traffic.burst
+            deadline += interval
+            yield from asyncio.sleep(max(0, deadline - loop.time()))
+
+
+class FakeServer(object):
+    """An in-process IRC server, accepting any number of Networks.
+
+    Attributes:
+        sessions (list of Session): The connected Networks.
+        port (int): The port the server listens on, once started.
+    """
+
+    def __init__(self):
+        self.sessions = []
+        self.port = None
+        self.listener = None
+
+    @asyncio.coroutine
+    def listen(self, hostname="127.0.0.1"):
+        """Starts listening on a free port."""
+
+        self.listener = yield from asyncio.get_event_loop().create_server(
+            lambda: Session(self), hostname, 0)
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    def start(self, traffic):
+        """Starts sending traffic to every connected Network."""
+
+        for number, session in enumerate(self.sessions):
+            shape = Traffic(traffic.rate, traffic.burst, traffic.seed + number)
+            session.task = asyncio.async(session.emit(shape))
+
+    def stop(self):
+        """Stops sending traffic.
+
+        Returns:
+            int: The number of PRIVMSG lines sent in total.
+        """
+
+        for session in self.sessions:
+            if session.task: session.task.cancel()
+        return sum(session.sent for session in self.sessions)
+
+
+class FakeClient(asyncio.Protocol):
+    """An IRC client attached to one Network, measuring delivery latency.
+
+    Attributes:
+        network (str): The name of the Network to attach to.
+        received (int): The number of PRIVMSG lines received.
+        latencies (list of float): The latency of each line, in seconds.
+        attached (bool): Indicates if the Network has welcomed the client.
+    """
+
+    def __init__(self, network):
+        self.network = network
+        self.received = 0
+        self.latencies = []
+        self.attached = False
+        self.buffer = b""
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.write(("PASS cosmonaut\r\nNICK nick\r\n"
+                         "USER %s 0 * :real\r\n" % self.network).encode())
+
+    def data_received(self, data):
+        now = time.perf_counter()
+        lines = (self.buffer + data).split(b"\r\n")
+        self.buffer = lines.pop()
+        for line in lines:
+            start = line.find(b" :t=")
+            if start < 0:
+                if b" 001 " in line: self.attached = True
+                continue
+            self.received += 1
+            self.latencies.append(now - float(line[start + 4:].split()[0]))
+
+    def reset(self):
+        """Forgets everything received so far."""
+
+        self.received = 0
+        self.latencies = []
+
+
+class MemoryDatastore(object):
+    """A Datastore that keeps networks and channels in memory.
+
+    It offers the interface of the AsyncDatastore used by the Bouncer, its
+    Networks, and its Clients, without a Redis instance. Every operation
+    returns a Future that has already resolved.
+
+    Attributes:
+        networks (dict): Network names, each with a tuple of its credentials
+            and a dictionary of its channel names and passwords.
+        password (str): The Bouncer password, or ``None``.
+    """
+
+    def __init__(self, networks=None):
+        self.networks = networks or {}
+        self.password = None
+        self.writes = types.SimpleNamespace(flush=lambda: None,
+                                            flush_sync=lambda: None)
+
+    def connect(self):
+        return resolved()
+
+    def get_password(self):
+        return resolved(self.password)
+
+    def set_password(self, password="cosmonaut"):
+        self.password = password
+        return resolved()
+
+    def is_verified(self, password_attempt):
+        return password_attempt == self.password
+
+    def check_password(self, password_attempt):
+        return resolved(password_attempt == self.password)
+
+    def load(self):
+        return resolved({ name : (dict(credentials), dict(channels)) for
+                          name, (credentials, channels)
+                          in self.networks.items() })
+
+    def get_channels(self, network=""):
+        return resolved({ "%s:%s" % (name, channel) : password
+                          for name, (_, channels) in self.networks.items()
+                          if not network or name == network
+                          for channel, password in channels.items() })
+
+    def add_network(self, network, **credentials):
+        credentials["network"] = network
+        self.networks[network] = (credentials, {})
+        return resolved()
+
+    def remove_network(self, network, hard=True):
+        self.networks.pop(network, None)
+        return resolved()
+
+    def add_channel(self, network, channel, password=""):
+        if network in self.networks:
+            self.networks[network][1][channel] = password or None
+        return resolved()
+
+    def remove_channel(self, network, channel):
+        if network in self.networks:
+            self.networks[network][1].pop(channel, None)
+        return resolved()
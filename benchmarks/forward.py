@@ -0,0 +1,88 @@
+#! /usr/bin/env python3
+"""Sputnik Fan-Out Benchmark
+
+This measures the cost of delivering a line from one Network to its Clients as
+the number of Networks and Clients on the Bouncer grows. It compares a scan of
+every connected Client, as `Network.forward` used to perform, against the
+per-Network subscriber index. Run it from the project root, e.g.
+`python3 benchmarks/forward.py`.
+"""
+
+import asyncio
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "sputnik"))
+from client import Client
+from network import Network
+
+
+class Transport(object):
+    """A transport that discards everything written to it."""
+
+    def write(self, data): pass
+    def writelines(self, lines): pass
+    def set_write_buffer_limits(self, high, low): pass
+
+
+class Bouncer(object):
+    """A Bouncer with no Datastore and no listeners."""
+
+    def __init__(self):
+        self.clients = set()
+        self.networks = dict()
+        self.subscribers = dict()
+        self.datastore = None
+        self.archive = None
+
+
+def populate(networks, clients):
+    """Creates a Bouncer with a number of Networks, each with its Clients."""
+
+    bouncer = Bouncer()
+    for number in range(networks):
+        name = "network%d" % number
+        network = Network(bouncer, name, "localhost", 6667,
+                          "nick", "user", "real")
+        bouncer.networks[name] = network
+        network.connection_made(Transport())
+        for _ in range(clients):
+            client = Client(bouncer)
+            client.connection_made(Transport())
+            client.data_received(("USER %s 0 * :real\r\n" % name).encode())
+    return bouncer
+
+
+def scan(network):
+    """Delivers history by scanning every connected Client."""
+
+    network.flushing = False
+    for client in network.bouncer.clients:
+        if client.broker == network and client.ready: client.catch_up()
+
+
+def measure(bouncer, flush, lines=2000):
+    """Returns the time taken to record and deliver lines on one Network."""
+
+    network = bouncer.networks["network0"]
+    start = time.perf_counter()
+    for _ in range(lines):
+        network.chat_history.append(b":a!b@c PRIVMSG #chan :hello\r\n")
+        flush(network)
+    return (time.perf_counter() - start) / lines
+
+
+if __name__ == "__main__":
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    print("%9s %8s %14s %14s" % ("networks", "clients", "scan", "index"))
+    with open(os.devnull, "w") as devnull:
+        for networks in [1, 10, 50, 100]:
+            for clients in [1, 4, 16]:
+                with contextlib.redirect_stdout(devnull):
+                    bouncer = populate(networks, clients)
+                    old = measure(bouncer, scan)
+                    new = measure(bouncer, Network.flush)
+                print("%9d %8d %12.2fus %12.2fus" % (networks, clients,
+                                                     old * 1e6, new * 1e6))
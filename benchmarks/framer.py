@@ -0,0 +1,93 @@
+#! /usr/bin/env python3
+"""Sputnik Line Framer Benchmark
+
+This feeds a synthetic stream of IRC traffic through the LineBuffer using a
+selection of pathological chunkings, and compares it against the string
+concatenation strategy previously used by `Network.data_received`. Run it from
+the project root, e.g. `python3 benchmarks/framer.py`.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "sputnik"))
+from connection import LineBuffer
+
+
+def traffic(lines=20000):
+    """Generates a stream of PRIVMSG traffic of varying line lengths."""
+
+    return "".join(":nick%d!user@host PRIVMSG #channel :%s\r\n"
+                   % (i % 97, "x" * (i % 300)) for i in range(lines)).encode()
+
+
+def chunkings(data):
+    """Yields named chunkings of the stream, from benign to adversarial."""
+
+    yield "whole stream", [data]
+    yield "mss (1460 bytes)", [data[i:i+1460]
+                               for i in range(0, len(data), 1460)]
+    yield "split in crlf", [part + b"\r" for part in data.split(b"\r")[:-1]]
+    yield "prime (7 bytes)", [data[i:i+7] for i in range(0, len(data), 7)]
+    yield "single bytes", [data[i:i+1] for i in range(len(data))]
+
+
+def legacy(chunks):
+    """Frames chunks the way `Network.data_received` used to."""
+
+    count, linebuffer = 0, ""
+    for chunk in chunks:
+        chunk = chunk.decode("latin1")
+        if not chunk.endswith("\r\n"):
+            linebuffer += chunk
+            continue
+        count += len((linebuffer + chunk).rstrip().split("\r\n"))
+        linebuffer = ""
+    return count
+
+
+def held(chunks):
+    """Returns the most complete lines the legacy framer ever held back."""
+
+    most, waiting = 0, 0
+    for chunk in chunks:
+        if chunk.endswith(b"\r\n"): waiting = 0
+        else: waiting += chunk.count(b"\n")
+        most = max(most, waiting)
+    return most
+
+
+def framed(chunks):
+    """Frames chunks using the LineBuffer, decoding each line once."""
+
+    count, linebuffer = 0, LineBuffer()
+    for chunk in chunks:
+        for line in linebuffer.feed(chunk):
+            line.decode()
+            count += 1
+    return count
+
+
+def measure(function, chunks):
+    """Returns the number of lines framed and the elapsed time."""
+
+    start = time.perf_counter()
+    count = function(chunks)
+    return count, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    data = traffic()
+    print("%-18s %12s %12s %12s %10s" % ("chunking", "legacy", "linebuffer",
+                                         "ns/byte", "held"))
+    for name, chunks in chunkings(data):
+        _, old = measure(legacy, chunks)
+        count, new = measure(framed, chunks)
+        assert count == len(data.splitlines()) - (name == "split in crlf")
+        print("%-18s %10.2fms %10.2fms %12.1f %10d" % (
+            name, old * 1000, new * 1000, new * 1e9 / len(data), held(chunks)))
+
+    print("\nheld: complete lines the legacy framer withheld from clients "
+          "while waiting\nfor a chunk to end on a line boundary. The "
+          "LineBuffer never withholds a line.")
@@ -0,0 +1,139 @@
+#! /usr/bin/env python3
+"""Sputnik TLS Handshake Benchmark
+
+This measures what TLS session resumption saves when Networks reconnect. A
+local TLS IRC stand-in welcomes each connection, and Networks are connected to
+it one at a time, then all at once, as after an upstream outage. Each is done
+with full handshakes, and again resuming a session remembered from an earlier
+connection, as the Scheduler does. A certificate and key in one PEM file may be
+given as an argument, e.g. `python3 benchmarks/handshakes.py ecdsa.pem`.
+
+A TLS 1.3 resumption skips certificate verification, but still makes a fresh
+key exchange, while a TLS 1.2 resumption skips both. Older servers may be
+mimicked with `--max-version 1.2`.
+"""
+
+import argparse
+import asyncio
+import os
+import ssl
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "sputnik"))
+import policy
+import tls
+
+CERTIFICATE = os.path.join(os.path.dirname(__file__), "..", "tests",
+                           "keycert.pem")
+
+
+class Server(asyncio.Protocol):
+    """A fake IRC server, which welcomes every connection."""
+
+    def connection_made(self, transport):
+        transport.write(b":irc.example.net 001 nick :Welcome\r\n")
+
+
+class Network(asyncio.Protocol):
+    """A Network, which resolves a Future once it is welcomed."""
+
+    def __init__(self):
+        self.welcomed = asyncio.Future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        if not self.welcomed.done(): self.welcomed.set_result(None)
+
+
+@asyncio.coroutine
+def dial(context, port, resume):
+    """Connects a Network, and returns the seconds until it is welcomed."""
+
+    loop = asyncio.get_event_loop()
+    if not resume: context.session = None
+    start = time.perf_counter()
+    _, network = yield from loop.create_connection(
+        Network, "localhost", port, ssl=context)
+    yield from network.welcomed
+    elapsed = time.perf_counter() - start
+
+    reused = network.transport.get_extra_info("ssl_object").session_reused
+    if resume: tls.remember(network.transport)
+    network.transport.close()
+    return elapsed, reused
+
+
+@asyncio.coroutine
+def sequential(contexts, port, resume, rounds=200):
+    """Returns the median handshake time, and the share of resumptions."""
+
+    context = contexts()
+    yield from dial(context, port, resume)
+    results = []
+    for _ in range(rounds):
+        results.append((yield from dial(context, port, resume)))
+    times = sorted(elapsed for elapsed, _ in results)
+    return times[len(times) // 2], sum(r for _, r in results) / len(results)
+
+
+@asyncio.coroutine
+def outage(contexts, port, resume, networks=200):
+    """Returns the seconds and CPU seconds taken to reconnect every Network.
+
+    Each Network keeps its own context, primed by an earlier connection.
+    """
+
+    contexts = [contexts() for _ in range(networks)]
+    for context in contexts: yield from dial(context, port, True)
+
+    start, cpu = time.perf_counter(), time.process_time()
+    yield from asyncio.gather(*[dial(context, port, resume)
+                                for context in contexts])
+    return time.perf_counter() - start, time.process_time() - cpu
+
+
+def factory(cafile, version):
+    """Returns a function creating client contexts, capped at a version."""
+
+    def create():
+        context = tls.client_context(cafile=cafile)
+        if version == "1.2": context.maximum_version = ssl.TLSVersion.TLSv1_2
+        return context
+    return create
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sputnik TLS benchmark")
+    parser.add_argument("certificate", nargs="?", default=CERTIFICATE,
+                        help="certificate and key, in one PEM file")
+    parser.add_argument("--max-version", choices=["1.2", "1.3"],
+                        default="1.3", help="highest TLS version to offer")
+    options = parser.parse_args()
+    certificate = options.certificate
+    contexts = factory(certificate, options.max_version)
+    print("%8s %8s %12s %8s %14s %12s" % ("loop", "mode", "handshake",
+                                          "resumed", "200 networks", "cpu"))
+
+    for backend in policy.available():
+        policy.install(backend)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(loop.create_server(
+            Server, "127.0.0.1", 0, ssl=tls.server_context(certificate)))
+        port = server.sockets[0].getsockname()[1]
+
+        for mode, resume in [("full", False), ("resumed", True)]:
+            median, reused = loop.run_until_complete(
+                sequential(contexts, port, resume))
+            elapsed, cpu = loop.run_until_complete(
+                outage(contexts, port, resume))
+            print("%8s %8s %10.0fus %7.0f%% %12.1fms %10.1fms" % (
+                backend, mode, median * 1e6, reused * 100, elapsed * 1e3,
+                cpu * 1e3))
+
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
@@ -0,0 +1,217 @@
+#! /usr/bin/env python3
+"""Sputnik Load Benchmark
+
+This runs a complete Bouncer under load, in a single process. A fake IRC server
+sends timed channel traffic to every Network, a swarm of fake IRC clients is
+attached through the Bouncer's own listener, and networks are loaded from an
+in-memory Datastore. It reports delivered lines per second, the network to
+client latency, the growth in resident memory, and the event loop lag.
+
+Results may be saved under `benchmarks/results`, named after the current
+commit, and compared against an earlier run, e.g.
+
+    python3 benchmarks/load.py --save
+    python3 benchmarks/load.py --compare benchmarks/results/1a2b3c4.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "sputnik"))
+sys.path.insert(0, os.path.dirname(__file__))
+os.environ.setdefault("SPUTNIK_RECONNECT_SPACING", "0")
+os.environ.setdefault("PORT", "0")
+from bouncer import Bouncer
+from fakes import FakeClient, FakeServer, MemoryDatastore, Traffic
+import log
+import policy
+
+RESULTS = os.path.join(os.path.dirname(__file__), "results")
+
+
+def rss():
+    """Returns the resident memory of this process, in bytes."""
+
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values, fraction):
+    """Returns a percentile of a list of values, or ``0`` if it is empty."""
+
+    if not values: return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def free_port():
+    """Returns a TCP port that is free to listen on."""
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+@asyncio.coroutine
+def monitor(lags, interval=0.01):
+    """Records how late the event loop wakes from each short sleep."""
+
+    loop = asyncio.get_event_loop()
+    while True:
+        expected = loop.time() + interval
+        yield from asyncio.sleep(interval)
+        lags.append(loop.time() - expected)
+
+
+@asyncio.coroutine
+def settle(condition, timeout=30.0):
+    """Waits until a condition holds, or the timeout passes."""
+
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        yield from asyncio.sleep(0.05)
+
+
+@asyncio.coroutine
+def scenario(bouncer, server, port, options, results):
+    """Attaches the swarm, runs the traffic, and records the results."""
+
+    loop = asyncio.get_event_loop()
+    try:
+        yield from settle(lambda: all(
+            network.state == "registered" and
+            len(network.channels) == options.channels
+            for network in bouncer.networks.values()))
+
+        clients = []
+        for name in sorted(bouncer.networks):
+            for _ in range(options.clients):
+                _, client = yield from loop.create_connection(
+                    lambda: FakeClient(name), "127.0.0.1", port)
+                clients.append(client)
+        yield from settle(lambda: all(client.attached for client in clients))
+        yield from asyncio.sleep(0.5)
+        for client in clients: client.reset()
+
+        lags, memory = [], rss()
+        lag = asyncio.async(monitor(lags))
+        server.start(Traffic(options.rate, options.burst))
+        yield from asyncio.sleep(options.duration)
+        sent = server.stop()
+        yield from asyncio.sleep(0.5)
+        lag.cancel()
+        yield from asyncio.wait([lag])
+
+        latencies = [latency for client in clients
+                     for latency in client.latencies]
+        delivered = sum(client.received for client in clients)
+        results.update({
+            "sent"           : sent,
+            "delivered"      : delivered,
+            "expected"       : sent * options.clients,
+            "lines_per_sec"  : delivered / options.duration,
+            "latency_p50_ms" : percentile(latencies, 0.50) * 1000,
+            "latency_p99_ms" : percentile(latencies, 0.99) * 1000,
+            "rss_growth_mib" : (rss() - memory) / 1048576,
+            "loop_lag_p50_ms": percentile(lags, 0.50) * 1000,
+            "loop_lag_p99_ms": percentile(lags, 0.99) * 1000,
+            "loop_lag_max_ms": max(lags or [0]) * 1000 })
+    finally:
+        loop.stop()
+
+
+def run(options):
+    """Runs the Bouncer under load, and returns the results."""
+
+    backend = policy.install(options.loop)
+    loop = asyncio.get_event_loop()
+    server = FakeServer()
+    loop.run_until_complete(server.listen())
+
+    channels = { "#channel%d" % number : None
+                 for number in range(options.channels) }
+    datastore = MemoryDatastore({ "network%d" % number : (
+        { "network" : "network%d" % number, "hostname" : "127.0.0.1",
+          "port" : server.port, "nickname" : "nick", "username" : "user",
+          "realname" : "real", "password" : None }, dict(channels))
+        for number in range(options.networks) })
+
+    results = { "loop" : backend, "options" : vars(options) }
+    bouncer = Bouncer(datastore=datastore)
+    port = free_port()
+    asyncio.async(scenario(bouncer, server, port, options, results))
+    bouncer.start(hostname="127.0.0.1", port=port)
+    return results
+
+
+def commit():
+    """Returns the current commit, or ``"working"`` outside of git."""
+
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "working"
+
+
+def report(results, baseline=None):
+    """Prints the results, and their change from a baseline."""
+
+    for name, value in sorted(results.items()):
+        if not isinstance(value, (int, float)): continue
+        line = "%-16s %14.3f" % (name, value)
+        if baseline and baseline.get(name):
+            line += " %+9.1f%%" % ((value / baseline[name] - 1) * 100)
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sputnik load benchmark")
+    parser.add_argument("--networks", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=8,
+                        help="clients attached to each network")
+    parser.add_argument("--channels", type=int, default=16,
+                        help="channels joined on each network")
+    parser.add_argument("--rate", type=float, default=1000.0,
+                        help="PRIVMSG lines per second, per network")
+    parser.add_argument("--burst", type=int, default=1,
+                        help="lines sent at once")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--loop", default=None,
+                        help="event loop backend, as SPUTNIK_LOOP")
+    parser.add_argument("--save", action="store_true",
+                        help="save the results under benchmarks/results")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="saved results to compare against")
+    options = parser.parse_args()
+    compare, save = options.compare, options.save
+    del options.compare, options.save
+
+    log.configure(level="WARNING")
+    results = run(options)
+    results["commit"] = commit()
+
+    baseline = None
+    if compare:
+        with open(compare) as saved: baseline = json.load(saved)
+        print("compared against %s" % baseline.get("commit", compare))
+    report(results, baseline)
+
+    if save:
+        os.makedirs(RESULTS, exist_ok=True)
+        path = os.path.join(RESULTS, "%s.json" % results["commit"])
+        with open(path, "w") as saved:
+            json.dump(results, saved, indent=2, sort_keys=True)
+        print("saved %s" % path)
@@ -0,0 +1,104 @@
+#! /usr/bin/env python3
+"""Sputnik Logging Benchmark
+
+This measures Network throughput while logging every line received, comparing
+the `print` per line previously used by `Network.line_received` against the
+queued logging pipeline, with traffic logging both disabled and enabled. Output
+is line-buffered, as it would be to a terminal, and goes either to the null
+device, or to a slow terminal that takes 50us per write. Times are those spent
+on the event loop, with the time taken to drain the log afterwards in brackets.
+A recorded log may be given as an argument, e.g.
+`python3 benchmarks/logger.py freenode.log`.
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "sputnik"))
+sys.path.insert(0, os.path.dirname(__file__))
+from connection import Connection
+from network import Network
+import log
+import traffic
+
+
+class Transport(object):
+    """A transport that discards everything written to it."""
+
+    def write(self, data): pass
+
+
+class Terminal(io.RawIOBase):
+    """An output device that takes a fixed time for every write."""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def writable(self): return True
+
+    def write(self, data):
+        if self.delay: time.sleep(self.delay)
+        return len(data)
+
+
+class Bouncer(object):
+    """A Bouncer with no Datastore, Clients or listeners."""
+
+    def __init__(self):
+        self.subscribers = dict()
+        self.datastore = None
+        self.archive = None
+
+
+class Printing(Network):
+    """A Network that prints every line, as `Network.line_received` used to."""
+
+    def line_received(self, line, encoded=None):
+        print("[N to B]\t%s" % line)
+        Connection.line_received(self, line, encoded)
+
+
+def measure(factory, lines):
+    """Returns the time taken for a Network to receive every line."""
+
+    network = factory(Bouncer(), "freenode", "localhost", 6667,
+                      "nick", "user", "real")
+    network.connection_made(Transport())
+    start = time.perf_counter()
+    for line in lines: network.line_received(line)
+    return time.perf_counter() - start
+
+
+def compare(lines, delay):
+    """Returns the loop and drain times of each variant, on one device."""
+
+    stream = io.TextIOWrapper(io.BufferedWriter(Terminal(delay)),
+                              line_buffering=True)
+    with contextlib.redirect_stdout(stream):
+        results = [("print per line", measure(Printing, lines), 0)]
+
+    for name, directions in [("logging, traffic off", []),
+                             ("logging, traffic on", ["n2b"])]:
+        writer = log.configure(level="INFO", traffic=directions,
+                               stream=stream)
+        elapsed = measure(Network, lines)
+        start = time.perf_counter()
+        writer.stop()
+        results.append((name, elapsed, time.perf_counter() - start))
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    lines = traffic.load(sys.argv[1] if len(sys.argv) > 1 else None)
+    print("%d lines" % len(lines))
+
+    for device, delay in [("null device", 0), ("slow terminal", 50e-6)]:
+        print(device)
+        for name, elapsed, drain in compare(lines, delay):
+            print("  %-22s %10.2fms (%8.2fms) %10.0f lines/s" % (
+                name, elapsed * 1000, drain * 1000, len(lines) / elapsed))
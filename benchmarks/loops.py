@@ -0,0 +1,176 @@
+#! /usr/bin/env python3
+"""Sputnik Event Loop Benchmark
+
+This compares the event loop backends that are installed, over real loopback
+sockets. Line throughput is the rate at which a Network reads a busy-channel
+log from a fake IRC server. Fan-out latency is the time from the server
+writing a line to every one of a Network's Clients receiving it. A recorded
+log may be given as an argument, e.g.
+`python3 benchmarks/loops.py freenode.log`.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "sputnik"))
+sys.path.insert(0, os.path.dirname(__file__))
+from client import Client
+from network import Network
+import policy
+import traffic
+
+
+class Bouncer(object):
+    """A Bouncer with no Datastore and no listeners."""
+
+    def __init__(self):
+        self.clients = set()
+        self.networks = dict()
+        self.subscribers = dict()
+        self.datastore = None
+        self.archive = None
+
+
+class Server(asyncio.Protocol):
+    """A fake IRC server, which writes whatever it is given."""
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+
+class Counting(Network):
+    """A Network that resolves a Future once it has read every line."""
+
+    def line_received(self, line, encoded=None):
+        super().line_received(line, encoded)
+        self.remaining -= 1
+        if not self.remaining: self.done.set_result(None)
+
+
+class Reader(asyncio.Protocol):
+    """An IRC client, which reports each PRIVMSG that reaches it."""
+
+    def __init__(self, gauge):
+        self.gauge = gauge
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        for _ in range(data.count(b"PRIVMSG")): self.gauge.arrived()
+
+
+class Gauge(object):
+    """Resolves a Future once a line has reached every Client."""
+
+    def __init__(self):
+        self.expected = 0
+        self.done = None
+
+    def expect(self, count):
+        self.expected = count
+        self.done = asyncio.Future()
+        return self.done
+
+    def arrived(self):
+        self.expected -= 1
+        if not self.expected and self.done: self.done.set_result(None)
+
+
+@asyncio.coroutine
+def dial(bouncer, factory):
+    """Connects a Network to a new fake IRC server."""
+
+    loop = asyncio.get_event_loop()
+    servers = []
+    listener = yield from loop.create_server(
+        lambda: servers.append(Server()) or servers[-1], "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+
+    network = factory(bouncer, "bench", "127.0.0.1", port,
+                      "nick", "user", "real")
+    bouncer.networks["bench"] = network
+    yield from loop.create_connection(lambda: network, "127.0.0.1", port)
+    while not servers: yield from asyncio.sleep(0.01)
+    return listener, servers[0], network
+
+
+@asyncio.coroutine
+def throughput(lines):
+    """Returns the lines per second a Network reads from the server."""
+
+    bouncer = Bouncer()
+    listener, server, network = yield from dial(bouncer, Counting)
+    network.remaining = len(lines)
+    network.done = asyncio.Future()
+
+    payload = "".join(line + "\r\n" for line in lines).encode()
+    start = time.perf_counter()
+    server.transport.write(payload)
+    yield from network.done
+    elapsed = time.perf_counter() - start
+
+    network.connected = False
+    network.transport.close()
+    listener.close()
+    return len(lines) / elapsed
+
+
+@asyncio.coroutine
+def fan_out(clients, rounds=500):
+    """Returns the median and 99th percentile fan-out latencies."""
+
+    loop = asyncio.get_event_loop()
+    bouncer = Bouncer()
+    listener, server, network = yield from dial(bouncer, Network)
+    server.transport.write(b":irc.example.net 001 nick :Welcome\r\n")
+
+    front = yield from loop.create_server(lambda: Client(bouncer),
+                                          "127.0.0.1", 0)
+    port = front.sockets[0].getsockname()[1]
+    gauge, readers = Gauge(), []
+    for _ in range(clients):
+        _, reader = yield from loop.create_connection(lambda: Reader(gauge),
+                                                      "127.0.0.1", port)
+        reader.transport.write(b"NICK nick\r\nUSER bench 0 * :real\r\n")
+        readers.append(reader)
+    yield from asyncio.sleep(0.2)
+
+    latencies = []
+    for number in range(rounds):
+        done = gauge.expect(clients)
+        start = time.perf_counter()
+        server.transport.write(
+            (":a!b@c PRIVMSG #bench :line %d\r\n" % number).encode())
+        yield from done
+        latencies.append(time.perf_counter() - start)
+
+    for reader in readers: reader.transport.close()
+    network.connected = False
+    network.transport.close()
+    front.close()
+    listener.close()
+    latencies.sort()
+    count = len(latencies)
+    return latencies[count // 2], latencies[count * 99 // 100]
+
+
+if __name__ == "__main__":
+    lines = traffic.load(sys.argv[1] if len(sys.argv) > 1 else None)
+    print("%d lines" % len(lines))
+    print("%8s %14s %8s %12s %12s" % ("loop", "lines/s", "clients",
+                                      "median", "p99"))
+
+    for backend in policy.available():
+        policy.install(backend)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        rate = loop.run_until_complete(throughput(lines))
+        for clients in [1, 10, 100]:
+            median, p99 = loop.run_until_complete(fan_out(clients))
+            print("%8s %14.0f %8d %10.1fus %10.1fus" % (
+                backend, rate, clients, median * 1e6, p99 * 1e6))
+        loop.close()
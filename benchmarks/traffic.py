@@ -0,0 +1,66 @@
+"""Sputnik Benchmark Traffic
+
+This module provides sample IRC traffic for the benchmarks. A recorded log may
+be supplied as a file containing one raw IRC line per line. Otherwise, traffic
+resembling a busy channel is synthesized deterministically, so that results are
+comparable between runs.
+"""
+
+import random
+
+SHAPE = [ (80, ":{nick}!{user}@{host} PRIVMSG #{channel} :{text}"),
+          ( 5, ":{nick}!{user}@{host} JOIN #{channel}"),
+          ( 3, ":{nick}!{user}@{host} PART #{channel} :{text}"),
+          ( 3, ":{nick}!{user}@{host} QUIT :Ping timeout: 240 seconds"),
+          ( 3, ":{nick}!{user}@{host} MODE #{channel} +v {other}"),
+          ( 2, ":{nick}!{user}@{host} NICK {other}"),
+          ( 2, ":services.example.net NOTICE {nick} :{text}"),
+          ( 2, "PING :irc.example.net") ]
+
+WORDS = ("the quick brown fox jumps over lazy dog lorem ipsum dolor sit amet "
+         "asyncio redis bouncer network client channel history").split()
+
+
+def busy_channel(lines=100000, channels=8, nicks=200, seed=2812):
+    """Synthesizes traffic resembling a set of busy channels.
+
+    Args:
+        lines (int, optional): The number of lines to generate.
+        channels (int, optional): The number of distinct channels.
+        nicks (int, optional): The number of distinct nicknames.
+        seed (int, optional): The random seed to generate with.
+
+    Returns:
+        list of str: Raw IRC lines, without line endings.
+    """
+
+    generator = random.Random(seed)
+    templates = [template for weight, template in SHAPE
+                 for _ in range(weight)]
+
+    traffic = []
+    for _ in range(lines):
+        nick = "nick%d" % generator.randrange(nicks)
+        traffic.append(generator.choice(templates).format(
+            nick=nick, user="~" + nick, host="user/%s" % nick,
+            other="nick%d" % generator.randrange(nicks),
+            channel="channel%d" % generator.randrange(channels),
+            text=" ".join(generator.choice(WORDS)
+                          for _ in range(generator.randrange(1, 20)))))
+    return traffic
+
+
+def load(path=None, lines=100000):
+    """Loads a recorded log, or synthesizes one if no path is given.
+
+    Args:
+        path (str, optional): A file of raw IRC lines. Defaults to ``None``.
+        lines (int, optional): The number of lines to synthesize.
+
+    Returns:
+        list of str: Raw IRC lines, without line endings.
+    """
+
+    if not path: return busy_channel(lines)
+    with open(path, encoding="utf-8", errors="replace") as log:
+        return [line.rstrip("\r\n") for line in log if line.strip()]
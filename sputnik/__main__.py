@@ -2,8 +2,31 @@
 """Sputnik Main Runtime
 
 This implements the Sputnik main file, allowing users to run the Sputnik
-bouncer from the project root as a folder. e.g. `python3 sputnik`.
+bouncer from the project root as a folder. e.g. `python3 sputnik`. Setting
+SPUTNIK_WORKERS runs that many Worker processes under a Supervisor, and
+SPUTNIK_LOOP selects the event loop.
 """
 
-from bouncer import Bouncer
-Bouncer().start()
+import os
+import sys
+import log
+import policy
+
+shard = os.getenv("SPUTNIK_SHARD")
+log.configure(stream=sys.stderr if shard else None)
+policy.install()
+
+if shard:  # Started by a Supervisor
+
+    import supervisor
+    supervisor.work(shard, os.getenv("SPUTNIK_SHARD_SOCKET"))
+
+elif int(os.getenv("SPUTNIK_WORKERS", 1)) > 1:
+
+    from supervisor import Supervisor
+    Supervisor(int(os.getenv("SPUTNIK_WORKERS"))).start()
+
+else:
+
+    from bouncer import Bouncer
+    Bouncer().start()
@@ -0,0 +1,648 @@
+"""Sputnik Archive Implementation
+
+This module provides the Sputnik Archive implementation. It is a persistent,
+append-only log of the traffic on each channel, kept on disk so that scrollback
+survives restarts, and may be queried by time without loading whole files.
+"""
+
+import asyncio
+import collections
+import mmap
+import os
+import time
+import urllib.parse
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+def escape(name, safe=""):
+    """Returns a name quoted for use as a single path component.
+
+    Names made only of dots, such as ``..``, are escaped as well, as they
+    would otherwise refer to a directory other than their own.
+
+    Args:
+        name (str): The name of a network, channel, or nickname.
+        safe (str, optional): Characters left unquoted. Defaults to ``""``.
+
+    Returns:
+        str: The quoted name.
+    """
+
+    quoted = urllib.parse.quote(name, safe=safe)
+    return quoted.replace(".", "%2E") if not quoted.strip(".") else quoted
+
+
+def scan(view, position, stop, since, until, limit, match=None):
+    """Reads records from a mapped Segment, starting at a record boundary.
+
+    Args:
+        view (mmap.mmap): The mapped data file.
+        position (int): The offset of the first record to read.
+        stop (int): The offset at which to stop reading.
+        since (int): The earliest timestamp, inclusive.
+        until (int): The latest timestamp, exclusive.
+        limit (int): The maximum number of records returned.
+        match (callable, optional): Selects the lines to return.
+
+    Returns:
+        list of tuple: The timestamps and lines of the records.
+    """
+
+    records = []
+    while position < stop and len(records) < limit:
+        end = view.find(b"\n", position, stop) + 1
+        if not end: break
+        space = view.find(b" ", position, end)
+        timestamp = int(view[position:space])
+        if timestamp >= until: break
+        if timestamp >= since:
+            line = view[space+1:end]
+            if not match or match(line): records.append((timestamp, line))
+        position = end
+    return records
+
+
+class Segment(object):
+    """A single file of an append-only Log, and its sparse index.
+
+    Each record is a line of the form ``<timestamp> <line>\\r\\n``, where the
+    timestamp is in milliseconds. Every ``interval`` bytes, the timestamp and
+    offset of a record are added to the index, which is kept in memory and in
+    a companion file. A query by time finds its place in the index with a
+    binary search, and scans at most ``interval`` bytes to find its first
+    record.
+
+    Records are held in memory until the Segment is flushed, so that each
+    flush is a single write.
+
+    Attributes:
+        path (str): The path of the Segment, without its extension.
+        start (int): The timestamp of the first record.
+        last (int): The timestamp of the newest record.
+        size (int): The number of bytes written to disk.
+        times (array.array): The timestamps of indexed records.
+        offsets (array.array): The offsets of indexed records.
+    """
+
+    def __init__(self, path, start, interval=4096):
+        """Creates an instance of a Segment, loading it if it exists.
+
+        Args:
+            path (str): The path of the Segment, without its extension.
+            start (int): The timestamp of the first record.
+            interval (int, optional): The bytes between index entries.
+                Defaults to ``4096``.
+        """
+
+        self.path = path
+        self.start = start
+        self.interval = interval
+        self.times = array("Q")
+        self.offsets = array("Q")
+        self.pending = []
+        self.indexed = []
+        self.file = None
+        self.unsynced = False
+        self.last = start
+
+        if os.path.exists(path + ".log"):
+            self.size = self.repair()
+            with open(path + ".idx", "ab+") as index:
+                index.seek(0)
+                entries = index.read()
+                entries = array("Q", entries[:len(entries) // 16 * 16])
+            for stamp, offset in zip(entries[::2], entries[1::2]):
+                if offset < self.size:
+                    self.times.append(stamp)
+                    self.offsets.append(offset)
+        else: self.size = 0
+
+        self.length = self.size
+        self.next_index = self.offsets[-1] + interval if self.offsets else 0
+
+    def repair(self):
+        """Truncates a torn record left at the end of the file by a crash.
+
+        This also recovers the timestamp of the newest record.
+
+        Returns:
+            int: The size of the file.
+        """
+
+        with open(self.path + ".log", "rb+") as data:
+            size = data.seek(0, os.SEEK_END)
+            data.seek(max(0, size - 65536))
+            tail = data.read()
+            if tail and not tail.endswith(b"\n"):
+                size -= len(tail) - tail.rfind(b"\n") - 1
+                data.truncate(size)
+                tail = tail[:tail.rfind(b"\n") + 1]
+
+        lines = tail.splitlines()
+        if lines: self.last = int(lines[-1].split(b" ", 1)[0])
+        return size
+
+    def append(self, timestamp, line):
+        """Adds a record, to be written by the next flush.
+
+        Args:
+            timestamp (int): The time of the record, in milliseconds.
+            line (bytes): An encoded line, including its line ending.
+        """
+
+        if self.length >= self.next_index:
+            self.indexed.extend((timestamp, self.length))
+            self.next_index = self.length + self.interval
+
+        self.last = timestamp
+        record = b"".join([str(timestamp).encode(), b" ", line])
+        self.pending.append(record)
+        self.length += len(record)
+
+    def flush(self):
+        """Writes pending records and index entries to disk."""
+
+        if not self.pending: return
+        if not self.file: self.file = open(self.path + ".log", "ab")
+
+        self.file.write(b"".join(self.pending))
+        self.file.flush()
+        if self.indexed:
+            with open(self.path + ".idx", "ab") as index:
+                index.write(array("Q", self.indexed).tobytes())
+            self.times.extend(self.indexed[::2])
+            self.offsets.extend(self.indexed[1::2])
+
+        self.size = self.length
+        self.pending, self.indexed = [], []
+        self.unsynced = True
+
+    def close(self):
+        """Flushes the Segment, and closes its data file."""
+
+        self.flush()
+        if self.file: self.file.close()
+        self.file = None
+
+    def read(self, since, until, limit, match=None):
+        """Returns the first records in a time range, read through mmap.
+
+        Args:
+            since (int): The earliest timestamp, inclusive.
+            until (int): The latest timestamp, exclusive.
+            limit (int): The maximum number of records returned.
+            match (callable, optional): Selects the lines to return.
+
+        Returns:
+            list of tuple: The timestamps and lines of the records.
+        """
+
+        if not self.size or limit <= 0: return []
+        entry = bisect_left(self.times, since) - 1
+        position = self.offsets[entry] if entry >= 0 else 0
+
+        with open(self.path + ".log", "rb") as data, \
+             mmap.mmap(data.fileno(), self.size,
+                       access=mmap.ACCESS_READ) as view:
+            return scan(view, position, self.size, since, until, limit, match)
+
+    def before(self, since, until, limit, match=None):
+        """Returns the last records in a time range, read through mmap.
+
+        The sparse index divides the file into blocks, which are read from the
+        last block before ``until`` backwards, until enough records are found.
+
+        Args:
+            since (int): The earliest timestamp, inclusive.
+            until (int): The latest timestamp, exclusive.
+            limit (int): The maximum number of records returned.
+            match (callable, optional): Selects the lines to return.
+
+        Returns:
+            list of tuple: The timestamps and lines of the records.
+        """
+
+        if not self.size or limit <= 0: return []
+        entry = bisect_left(self.times, until)
+        stop = self.offsets[entry] if entry < len(self.offsets) else self.size
+
+        records = []
+        with open(self.path + ".log", "rb") as data, \
+             mmap.mmap(data.fileno(), self.size,
+                       access=mmap.ACCESS_READ) as view:
+
+            while len(records) < limit:
+                entry -= 1
+                start = self.offsets[entry] if entry >= 0 else 0
+                records[:0] = scan(view, start, stop, since, until,
+                                   float("inf"), match)
+                if not start or self.times[entry] < since: break
+                stop = start
+
+        return records[-limit:] if len(records) > limit else records
+
+    def remove(self):
+        """Deletes the Segment from disk."""
+
+        self.close()
+        for extension in (".log", ".idx"):
+            try: os.remove(self.path + extension)
+            except FileNotFoundError: pass
+
+
+class Log(object):
+    """The append-only log of a single channel or query, split into Segments.
+
+    Records are appended to the newest Segment, which is rotated once it grows
+    too large or too old. On rotation, the Log is compacted, by deleting the
+    oldest Segments once they fall outside the retention period, or once the
+    Log as a whole grows too large.
+
+    Attributes:
+        directory (str): The directory holding the Segments.
+        segments (list of sputnik.Segment): The Segments, oldest first.
+    """
+
+    def __init__(self, directory, max_bytes=8388608, max_age=86400,
+                 retention=2592000, max_total=268435456):
+        """Creates an instance of a Log, loading any existing Segments.
+
+        Args:
+            directory (str): The directory holding the Segments.
+            max_bytes (int, optional): The size at which a Segment is
+                rotated. Defaults to ``8388608``.
+            max_age (int, optional): The age, in seconds, at which a Segment
+                is rotated. Defaults to ``86400``.
+            retention (int, optional): The seconds that records are kept.
+                Defaults to ``2592000``.
+            max_total (int, optional): The maximum size of the Log, in bytes.
+                Defaults to ``268435456``.
+        """
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age * 1000
+        self.retention = retention * 1000
+        self.max_total = max_total
+
+        os.makedirs(directory, exist_ok=True)
+        starts = sorted(int(name[:-4]) for name in os.listdir(directory)
+                        if name.endswith(".log"))
+        self.segments = [Segment(self.path(start), start) for start in starts]
+        self.last = self.segments[-1].last if self.segments else 0
+
+    def path(self, start):
+        return os.path.join(self.directory, "%013d" % start)
+
+    def append(self, timestamp, line):
+        """Appends a record, rotating the newest Segment if needed.
+
+        Timestamps never decrease within a Log, even if the clock does.
+
+        Args:
+            timestamp (int): The time of the record, in milliseconds.
+            line (bytes): An encoded line, including its line ending.
+        """
+
+        timestamp = max(timestamp, self.last)
+        segment = self.segments[-1] if self.segments else None
+        if not segment or segment.length >= self.max_bytes or \
+           timestamp - segment.start >= self.max_age:
+            if segment and segment.start == timestamp: timestamp += 1
+            self.rotate(timestamp)
+
+        self.last = timestamp
+        self.segments[-1].append(timestamp, line)
+
+    def rotate(self, timestamp):
+        """Closes the newest Segment, starts another, and compacts the Log.
+
+        Args:
+            timestamp (int): The time of the first record of the new Segment.
+        """
+
+        if self.segments: self.segments[-1].close()
+        self.segments.append(Segment(self.path(timestamp), timestamp))
+        self.compact(timestamp)
+
+    def compact(self, now):
+        """Deletes the oldest Segments that are expired, or over the limit.
+
+        A Segment has expired once the Segment following it began before the
+        retention period, as every one of its records is then older still.
+
+        Args:
+            now (int): The current time, in milliseconds.
+        """
+
+        total = sum(segment.length for segment in self.segments)
+        while len(self.segments) > 1:
+            oldest, following = self.segments[0], self.segments[1]
+            if following.start >= now - self.retention and \
+               total <= self.max_total: break
+            total -= oldest.length
+            oldest.remove()
+            del self.segments[0]
+
+    def flush(self):
+        """Writes the newest Segment to disk."""
+
+        if self.segments: self.segments[-1].flush()
+
+    def unsynced(self):
+        """Returns the data files written since they were last synchronized.
+
+        Returns:
+            list of str: The paths of the data files.
+        """
+
+        paths = []
+        for segment in self.segments:
+            if segment.unsynced: paths.append(segment.path + ".log")
+            segment.unsynced = False
+        return paths
+
+    def read(self, since=0, until=None, limit=None, match=None):
+        """Returns the first records in a time range, oldest first.
+
+        Only the Segments overlapping the range are read, and within each, the
+        sparse index locates the first record, so a query costs a logarithmic
+        search plus the records it returns.
+
+        Args:
+            since (int, optional): The earliest timestamp, inclusive, in
+                milliseconds. Defaults to ``0``.
+            until (int, optional): The latest timestamp, exclusive, in
+                milliseconds. Defaults to no limit.
+            limit (int, optional): The maximum number of records. Defaults to
+                no limit.
+            match (callable, optional): Selects the lines to return. Defaults
+                to every line.
+
+        Returns:
+            list of tuple: The timestamps and lines of the records.
+        """
+
+        self.flush()
+        until = float("inf") if until is None else until
+        limit = float("inf") if limit is None else limit
+
+        starts = [segment.start for segment in self.segments]
+        first = max(0, bisect_right(starts, since) - 1)
+        records = []
+        for segment in self.segments[first:]:
+            if segment.start >= until or len(records) >= limit: break
+            records.extend(segment.read(since, until, limit - len(records),
+                                        match))
+        return records
+
+    def before(self, until=None, limit=None, since=0, match=None):
+        """Returns the last records in a time range, oldest first.
+
+        Segments are read from the newest backwards, and within each, blocks
+        of the sparse index are read backwards, so a query costs a logarithmic
+        search plus the records it returns, however old the Log is.
+
+        Args:
+            until (int, optional): The latest timestamp, exclusive, in
+                milliseconds. Defaults to no limit.
+            limit (int, optional): The maximum number of records. Defaults to
+                no limit.
+            since (int, optional): The earliest timestamp, inclusive, in
+                milliseconds. Defaults to ``0``.
+            match (callable, optional): Selects the lines to return. Defaults
+                to every line.
+
+        Returns:
+            list of tuple: The timestamps and lines of the records.
+        """
+
+        self.flush()
+        until = float("inf") if until is None else until
+        limit = float("inf") if limit is None else limit
+
+        records = []
+        for segment in reversed(self.segments):
+            if len(records) >= limit or segment.last < since: break
+            if segment.start >= until: continue
+            records[:0] = segment.before(since, until, limit - len(records),
+                                         match)
+        return records
+
+    def close(self):
+        """Flushes and closes the newest Segment."""
+
+        if self.segments: self.segments[-1].close()
+
+
+class Archive(object):
+    """A singleton that keeps an append-only Log for every channel.
+
+    Records are buffered in memory, and written to disk in one batch on an
+    interval. Once written, the files are synchronized to disk in a thread,
+    so that the event loop never waits for the disk. Files are reopened by
+    the thread, so a Segment may be rotated or deleted while it is synced.
+
+    Only the most recently used Logs are held open. Once there are too many,
+    the least recently used is closed, and loaded again when next needed, so
+    that a Log for every query ever seen does not keep a file open forever.
+
+    Attributes:
+        root (str): The directory holding a directory for each network.
+        logs (collections.OrderedDict of sputnik.Log): Logs by network and
+            target name, from the least to the most recently used.
+        interval (float): The seconds between writes to disk.
+        open_logs (int): The number of Logs held open at once.
+        unsynced (list of str): Data files of closed Logs not yet synced.
+    """
+
+    def __init__(self, root, interval=1.0, open_logs=256, **limits):
+        """Creates an instance of an Archive.
+
+        Args:
+            root (str): The directory holding a directory for each network.
+            interval (float, optional): The seconds between writes to disk.
+                Defaults to ``1.0``.
+            open_logs (int, optional): The number of Logs held open at once.
+                Defaults to ``256``.
+            limits (dict): Rotation and retention limits for each Log.
+        """
+
+        self.root = root
+        self.interval = interval
+        self.open_logs = open_logs
+        self.limits = limits
+        self.logs = collections.OrderedDict()
+        self.unsynced = []
+        self.timer = None
+
+    def path(self, network, target):
+        """Returns the directory holding the Log of a channel or query.
+
+        Args:
+            network (str): The name of the network.
+            target (str): The lowercased name of the channel or nickname.
+
+        Returns:
+            str: The path of the directory.
+        """
+
+        return os.path.join(self.root, escape(network),
+                            escape(target, safe="#&+!"))
+
+    def load(self, key):
+        """Opens a Log, closing the least recently used if too many are open.
+
+        Args:
+            key (tuple of str): The network and lowercased target name.
+
+        Returns:
+            sputnik.Log: The Log.
+        """
+
+        while len(self.logs) >= self.open_logs:
+            _, evicted = self.logs.popitem(last=False)
+            evicted.close()
+            self.unsynced.extend(evicted.unsynced())
+        log = self.logs[key] = Log(self.path(*key), **self.limits)
+        return log
+
+    def log(self, network, target):
+        """Returns the Log of a channel or query, creating it if needed.
+
+        Args:
+            network (str): The name of the network.
+            target (str): The name of the channel or nickname.
+
+        Returns:
+            sputnik.Log: The Log.
+        """
+
+        key = (network, target.lower())
+        if key not in self.logs: return self.load(key)
+        self.logs.move_to_end(key)
+        return self.logs[key]
+
+    def find(self, network, target):
+        """Returns the Log of a channel or query, only if it already exists.
+
+        Queries use this rather than ``log``, so that asking after a target
+        never creates anything, in memory or on disk.
+
+        Args:
+            network (str): The name of the network.
+            target (str): The name of the channel or nickname.
+
+        Returns:
+            sputnik.Log: The Log, or ``None`` if nothing was ever recorded.
+        """
+
+        key = (network, target.lower())
+        if key in self.logs: return self.log(network, target)
+        if not os.path.isdir(self.path(*key)): return None
+        return self.load(key)
+
+    def append(self, network, target, line, timestamp=None):
+        """Appends a line to the Log of a channel or query.
+
+        Args:
+            network (str): The name of the network.
+            target (str): The name of the channel or nickname.
+            line (bytes): An encoded line, including its line ending.
+            timestamp (int, optional): The time of the line, in milliseconds.
+                Defaults to now.
+        """
+
+        if timestamp is None: timestamp = int(time.time() * 1000)
+        self.log(network, target).append(timestamp, line)
+        if not self.timer:
+            self.timer = asyncio.get_event_loop().call_later(self.interval,
+                                                             self.flush)
+
+    def read(self, network, target, since=0, until=None, limit=None,
+             match=None):
+        """Returns the first records of a channel or query in a time range.
+
+        Args:
+            network (str): The name of the network.
+            target (str): The name of the channel or nickname.
+            since (int, optional): The earliest timestamp, inclusive, in
+                milliseconds. Defaults to ``0``.
+            until (int, optional): The latest timestamp, exclusive, in
+                milliseconds. Defaults to no limit.
+            limit (int, optional): The maximum number of records. Defaults to
+                no limit.
+            match (callable, optional): Selects the lines to return. Defaults
+                to every line.
+
+        Returns:
+            list of tuple: The timestamps and lines of the records.
+        """
+
+        log = self.find(network, target)
+        return log.read(since, until, limit, match) if log else []
+
+    def before(self, network, target, until=None, limit=None, since=0,
+               match=None):
+        """Returns the last records of a channel or query in a time range.
+
+        Args:
+            network (str): The name of the network.
+            target (str): The name of the channel or nickname.
+            until (int, optional): The latest timestamp, exclusive, in
+                milliseconds. Defaults to no limit.
+            limit (int, optional): The maximum number of records. Defaults to
+                no limit.
+            since (int, optional): The earliest timestamp, inclusive, in
+                milliseconds. Defaults to ``0``.
+            match (callable, optional): Selects the lines to return. Defaults
+                to every line.
+
+        Returns:
+            list of tuple: The timestamps and lines of the records.
+        """
+
+        log = self.find(network, target)
+        return log.before(until, limit, since, match) if log else []
+
+    def flush(self):
+        """Writes every Log to disk, and synchronizes the files in a thread.
+
+        Returns:
+            asyncio.Future: A future that resolves once the files are synced.
+        """
+
+        if self.timer: self.timer.cancel()
+        self.timer = None
+
+        paths, self.unsynced = self.unsynced, []
+        for log in self.logs.values():
+            log.flush()
+            paths.extend(log.unsynced())
+        return asyncio.get_event_loop().run_in_executor(None, self.sync, paths)
+
+    def sync(self, paths):
+        """Synchronizes files to disk. This blocks, so it is run in a thread.
+
+        Args:
+            paths (list of str): The paths of the files.
+        """
+
+        for path in paths:
+            try:
+                descriptor = os.open(path, os.O_RDONLY)
+                try: os.fsync(descriptor)
+                finally: os.close(descriptor)
+            except OSError: pass
+
+    def close(self):
+        """Writes and synchronizes every Log, and closes its files."""
+
+        if self.timer: self.timer.cancel()
+        self.timer = None
+        self.sync(self.unsynced)
+        self.unsynced = []
+        for log in self.logs.values():
+            log.close()
+            self.sync(log.unsynced())
@@ -5,12 +5,39 @@ point, the Bouncer is responsible for bootstrapping the entire program.
 """
 
 import asyncio
+import logging
 import os
 import redis
+import zlib
+from archive import Archive
 from client import Client
-from datastore import Datastore
+from datastore import AsyncDatastore
 from network import Network
+from profiler import Profiler
+from scheduler import Scheduler
 from server import HTTPServer
+from throttle import Limiter
+from tls import server_context
+
+logger = logging.getLogger("sputnik.bouncer")
+
+
+def shard_of(network, count):
+    """Returns the shard that owns a network.
+
+    The name is hashed with CRC-32, rather than ``hash``, so that every
+    process agrees on the owner regardless of hash randomization.
+
+    Args:
+        network (str): The name of a network.
+        count (int): The number of shards.
+
+    Returns:
+        int: The index of the owning shard.
+    """
+
+    return zlib.crc32(network.encode()) % count
+
 
 class Bouncer(object):
     """A singleton that manages connected devices.
@@ -20,47 +47,106 @@ class Bouncer(object):
     Networks by maintaining an authoritative record of each connected device.
 
     Attributes:
+        archive (sputnik.Archive): Scrollback kept on disk, or ``None``.
         clients (set of sputnik.Client): A set of connected Clients.
-        datastore (sputnik.Datastore): A Redis interface.
-        networks (dict of sputnik.Network): A dictionary of connected Networks.
+        datastore (sputnik.AsyncDatastore): A non-blocking Redis interface.
+        logins (sputnik.Limiter): Limits login attempts from each address.
+        networks (dict of sputnik.Network): A dictionary of Networks, whether
+            connected or not. Each Network reports its own ``state``.
+        profiler (sputnik.Profiler): Samples the event loop on request.
+        scheduler (sputnik.Scheduler): Dials and reconnects Networks.
+        shard (tuple of int): The index of this shard and the number of
+            shards, or ``None`` if this Bouncer owns every network.
+        subscribers (dict of set of sputnik.Client): Clients by Network name.
     """
 
-    def __init__(self):
+    def __init__(self, shard=None, datastore=None):
         """Creates an instance of a Bouncer.
 
-        Initializes an empty set and an empty dictionary for later use, then
+        Initializes an empty set and empty dictionaries for later use, then
         reloads previously connected networks from the Datastore.
+
+        Args:
+            shard (tuple of int, optional): The index of this shard and the
+                number of shards. Defaults to ``None``, owning every network.
+            datastore (sputnik.AsyncDatastore, optional): A Datastore to use
+                in place of the local Redis instance. Defaults to ``None``.
         """
 
+        self.shard = shard
         self.clients = set()
         self.networks = dict()
+        self.subscribers = dict()
+        self.logins = Limiter(
+            rate=float(os.getenv("SPUTNIK_LOGIN_RATE", 0.1)),
+            burst=float(os.getenv("SPUTNIK_LOGIN_BURST", 5)))
+        self.profiler = Profiler(
+            interval=float(os.getenv("SPUTNIK_PROFILE_INTERVAL", 0.005)))
+        self.scheduler = Scheduler(
+            base=float(os.getenv("SPUTNIK_RECONNECT_BASE", 1.0)),
+            cap=float(os.getenv("SPUTNIK_RECONNECT_CAP", 300.0)),
+            spacing=float(os.getenv("SPUTNIK_RECONNECT_SPACING", 0.2)),
+            limit=int(os.getenv("SPUTNIK_CONNECT_LIMIT", 10)),
+            timeout=float(os.getenv("SPUTNIK_CONNECT_TIMEOUT", 30.0)))
+
+        archive = os.getenv("SPUTNIK_ARCHIVE")
+        self.archive = None if not archive else Archive(
+            archive,
+            interval=float(os.getenv("SPUTNIK_ARCHIVE_INTERVAL", 1.0)),
+            open_logs=int(os.getenv("SPUTNIK_ARCHIVE_OPEN_LOGS", 256)),
+            max_bytes=int(os.getenv("SPUTNIK_ARCHIVE_SEGMENT_BYTES", 8388608)),
+            max_age=int(os.getenv("SPUTNIK_ARCHIVE_SEGMENT_AGE", 86400)),
+            retention=int(os.getenv("SPUTNIK_ARCHIVE_RETENTION", 2592000)),
+            max_total=int(os.getenv("SPUTNIK_ARCHIVE_MAX_BYTES", 268435456)))
 
-        try: # Attempt a Datastore Connection
+        self.datastore = datastore
+        if not datastore:
+            try: # Attempt a Datastore Connection
 
-            self.datastore = Datastore(hostname="localhost", port="6379")
-            self.datastore.database.ping()
+                self.datastore = AsyncDatastore(hostname="localhost",
+                                                port="6379")
+                self.datastore.sync.database.ping()
+                self.datastore.sync.migrate()
 
-        except redis.ConnectionError: # Continue Without Persistence
+            except redis.ConnectionError: # Continue Without Persistence
 
-            self.datastore = None
-            print("Failed to Connect to a Redis Instance.\n"
-                  "Continuing Without Persistence.")
+                self.datastore = None
+                logger.warning("Failed to Connect to a Redis Instance. "
+                               "Continuing Without Persistence.")
 
         if self.datastore:
+            asyncio.get_event_loop().run_until_complete(self.bootstrap())
 
-            if not self.datastore.get_password():
-                self.datastore.set_password()
+    @asyncio.coroutine
+    def bootstrap(self):
+        """Reloads previously connected networks from the Datastore.
 
-            history = self.datastore.get_networks()
-            for credentials in history.values():
-                self.add_network(**credentials)
+        Every network and its channels are loaded in a single pipelined fetch,
+        then handed to the Scheduler, which connects them a few at a time once
+        the event loop is running. A sharded Bouncer connects only the
+        networks that it owns.
+        """
+
+        started = asyncio.get_event_loop().time()
+        yield from self.datastore.connect()
+        if not (yield from self.datastore.get_password()):
+            yield from self.datastore.set_password()
+
+        history = yield from self.datastore.load()
+        history = { name : entry for name, entry in history.items()
+                    if self.owns(name) }
+        for credentials, channels in history.values():
+            self.connect(credentials, autojoin=channels)
+        logger.info("Loaded %d Networks in %.3fs", len(history),
+                    asyncio.get_event_loop().time() - started)
 
     def start(self, hostname="", port=6667):
         """Starts the IRC and HTTP listen servers.
 
         This creates the IRC server-portion of the Bouncer, allowing it to
-        accept connections from IRC clients. It also starts the HTTP server,
-        enabling browsers to connect to the web interface.
+        accept connections from IRC clients, over TLS if a certificate is
+        configured. It also starts the HTTP server, enabling browsers to
+        connect to the web interface.
 
         Note:
             This is a blocking call.
@@ -74,21 +160,70 @@ class Bouncer(object):
         if hport: port = int(hport)
 
         loop = asyncio.get_event_loop()
-        coro = loop.create_server(lambda: Client(self), hostname, port)
+        coro = loop.create_server(lambda: Client(self), hostname, port,
+                                  ssl=self.listener_context())
         loop.run_until_complete(coro)
         HTTPServer(self).start()
+        self.run()
+
+    def listener_context(self):
+        """Returns the TLS context of the IRC listen server.
+
+        Returns:
+            ssl.SSLContext: A server context, or ``None`` to listen in
+            plaintext, if ``SPUTNIK_TLS_CERT`` is not set.
+        """
+
+        certificate = os.getenv("SPUTNIK_TLS_CERT")
+        return None if not certificate else server_context(
+            certificate, os.getenv("SPUTNIK_TLS_KEY"))
+
+    def run(self):
+        """Runs the event loop until interrupted, then saves pending state.
+
+        Note:
+            This is a blocking call.
+        """
 
+        loop = asyncio.get_event_loop()
         try: loop.run_forever()
         except KeyboardInterrupt: pass
-        finally: loop.close()
+        finally:
+            if self.datastore: self.datastore.writes.flush_sync()
+            if self.archive: self.archive.close()
+            loop.close()
+
+    def owns(self, network):
+        """Checks whether a network belongs to this Bouncer's shard.
+
+        Args:
+            network (str): The name of a network.
+
+        Returns:
+            bool: Whether this Bouncer should connect the network.
+        """
+
+        if not self.shard: return True
+        return shard_of(network, self.shard[1]) == self.shard[0]
+
+    @asyncio.coroutine
+    def change_password(self, password):
+        """Changes the Bouncer password.
+
+        Args:
+            password (str): The new password for the Bouncer.
+        """
+
+        yield from self.datastore.set_password(password)
 
     def add_network(self, network, hostname, port,
                     nickname, username, realname,
-                    password=None, usermode=0):
+                    password=None, usermode=0, tls=False):
         """Connects the Bouncer to an IRC network.
 
         This forms the credentials into a dictionary. It then registers the
-        network in the datastore, and connects to the indicated IRC network.
+        network in the datastore, and schedules a connection to the indicated
+        IRC network, replacing any Network of the same name.
 
         Args:
             network (str): The name of the IRC network to connect to.
@@ -99,6 +234,8 @@ class Bouncer(object):
             realname (str): The real name of the user.
             password (str, optional): Bouncer password. Defaults to ``None``.
             usermode (int, optional): The IRC usermode. Defaults to ``0``.
+            tls (bool, optional): Whether to connect over TLS. Defaults to
+                ``False``.
         """
 
         credentials = { "network"  : network,
@@ -107,13 +244,11 @@ class Bouncer(object):
                         "realname" : realname,
                         "hostname" : hostname,
                         "port"     : port,
-                        "password" : password }
+                        "password" : password,
+                        "tls"      : tls }
 
         if self.datastore: self.datastore.add_network(**credentials)
-        loop = asyncio.get_event_loop()
-        coro = loop.create_connection(lambda: Network(self, **credentials),
-                                      hostname, port)
-        asyncio.async(coro)
+        self.connect(credentials)
 
     def remove_network(self, network):
         """Removes a network from the Bouncer.
@@ -125,7 +260,34 @@ class Bouncer(object):
             network (str): the name of a network.
         """
 
-        if network in self.networks:
-            self.networks[network].connected = False
-            self.networks[network].transport.close()
+        self.disconnect(network)
         if self.datastore: self.datastore.remove_network(network)
+
+    def connect(self, credentials, autojoin=None):
+        """Schedules a connection to a Network, replacing any of the same name.
+
+        Args:
+            credentials (dict): The network credentials.
+            autojoin (dict, optional): Channels and passwords to join, if
+                already known. Defaults to ``None``.
+        """
+
+        self.disconnect(credentials["network"])
+        network = Network(self, **credentials)
+        network.autojoin = autojoin
+        self.networks[network.network] = network
+        self.scheduler.connect(network)
+
+    def disconnect(self, network):
+        """Disconnects and forgets a Network, without reconnecting it.
+
+        Args:
+            network (str): the name of a network.
+        """
+
+        if network not in self.networks: return
+        network = self.networks.pop(network)
+        network.connected = False
+        self.scheduler.cancel(network)
+        if network.transport: network.transport.close()
+        else: network.state = "disconnected"
@@ -0,0 +1,319 @@
+"""Sputnik Channel Implementation
+
+This module provides the Sputnik Channel implementation. It models the state
+of an IRC channel that the Bouncer has joined, which is used to bring attaching
+Clients up to date without replaying every line received since connecting, and
+to answer their NAMES, TOPIC, and WHO queries without asking the IRC network.
+"""
+
+import sys
+from collections import OrderedDict
+
+MODE_PREFIXES = OrderedDict([("q", "~"), ("a", "&"), ("o", "@"), ("h", "%"),
+                             ("v", "+")])
+CHANNEL_MODES = ("beI", "k", "fjlL", "")
+CHANNEL_TYPES = "#&+!"
+
+
+def parse_prefix(value):
+    """Parses the ``PREFIX`` token of an ``RPL_ISUPPORT`` reply.
+
+    Args:
+        value (str): The value of the token, e.g. ``"(ov)@+"``.
+
+    Returns:
+        collections.OrderedDict: The member status modes and their prefixes,
+        from the highest status to the lowest, or ``None`` if malformed.
+    """
+
+    modes, _, prefixes = value[1:].partition(")")
+    if value[:1] != "(" or len(modes) != len(prefixes): return None
+    return OrderedDict(zip(modes, prefixes))
+
+
+def parse_chanmodes(value):
+    """Parses the ``CHANMODES`` token of an ``RPL_ISUPPORT`` reply.
+
+    Args:
+        value (str): The value of the token, e.g. ``"beI,k,l,imnpst"``.
+
+    Returns:
+        tuple of str: The list modes, the modes that always take a parameter,
+        the modes that take one only when set, and the modes that never do.
+    """
+
+    return tuple((value.split(",") + ["", "", ""])[:4])
+
+
+def pack_joins(channels, limit=510):
+    """Packs channels into as few JOIN commands as possible.
+
+    Keys apply to channels in the order they are listed, so channels with keys
+    are listed first, and channels without keys follow them. No command is
+    longer than the limit, in bytes, excluding its line ending.
+
+    Args:
+        channels (dict): Channel names and their keys, or ``None``.
+        limit (int, optional): The maximum length of a command, in bytes.
+            Defaults to ``510``.
+
+    Returns:
+        list of str: JOIN commands, without their line endings.
+    """
+
+    def join(names, keys):
+        command = "JOIN " + ",".join(names)
+        return command + " " + ",".join(keys) if keys else command
+
+    lines, names, keys = [], [], []
+    for name, key in sorted(channels.items(), key=lambda item: not item[1]):
+        more = keys + [key] if key else keys
+        if names and len(join(names + [name], more).encode()) > limit:
+            lines.append(join(names, keys))
+            names, keys, more = [], [], [key] if key else []
+        names, keys = names + [name], more
+
+    if names: lines.append(join(names, keys))
+    return lines
+
+
+class User(object):
+    """What is known of a member of our channels.
+
+    A single User is kept per nickname, however many of our channels it is in.
+    The username and hostname are learned from its JOIN, and the rest only
+    from the replies to a WHO query.
+
+    Attributes:
+        user (str): The username, or ``None`` if unknown.
+        host (str): The hostname, or ``None`` if unknown.
+        server (str): The server it is connected to, or ``None`` if unknown.
+        realname (str): The real name, or ``None`` if unknown.
+        away (bool): Indicates if it was away, as of the last WHO reply.
+    """
+
+    __slots__ = ("user", "host", "server", "realname", "away")
+
+    def __init__(self, user=None, host=None):
+        """Creates an instance of a User.
+
+        Args:
+            user (str, optional): The username. Defaults to ``None``.
+            host (str, optional): The hostname. Defaults to ``None``.
+        """
+
+        self.user = user
+        self.host = host
+        self.server = None
+        self.realname = None
+        self.away = False
+
+
+class Channel(object):
+    """The state of a joined IRC channel.
+
+    A Channel tracks the topic, modes, and members of a channel, as reported
+    by the IRC network, and can render that state as the replies a server
+    would send to a Client that had just joined it, or that queried it. A
+    busy network may see many thousands of members, so Channels keep no
+    per-instance dictionary, and member nicknames are interned, so that each
+    is held once however many channels it appears in.
+
+    Attributes:
+        name (str): The name of the channel.
+        topic (str): The channel topic, or ``None`` if it has none.
+        topic_info (list of str): The topic setter and time, if known.
+        modes (dict): The channel modes, and their parameters or ``None``.
+        members (dict): Member nicknames and their status prefixes.
+        symbol (str): The channel type symbol reported in NAMES replies.
+        synced (bool): Indicates if a NAMES reply has been completed.
+    """
+
+    __slots__ = ("name", "topic", "topic_info", "modes", "members", "symbol",
+                 "synced")
+
+    def __init__(self, name):
+        """Creates an instance of a Channel.
+
+        Args:
+            name (str): The name of the channel.
+        """
+
+        self.name = name
+        self.topic = None
+        self.topic_info = []
+        self.modes = {}
+        self.members = {}
+        self.symbol = "="
+        self.synced = False
+
+    def add_names(self, symbol, names, prefixes=MODE_PREFIXES):
+        """Adds members from a NAMES reply.
+
+        A NAMES reply following a completed one replaces the member list, as
+        the server is describing the channel afresh.
+
+        Args:
+            symbol (str): The channel type symbol.
+            names (str): A space-separated list of prefixed nicknames.
+            prefixes (collections.OrderedDict, optional): The member status
+                modes of the network, and their prefixes. Defaults to
+                ``MODE_PREFIXES``.
+        """
+
+        if self.synced:
+            self.members.clear()
+            self.synced = False
+
+        self.symbol = symbol
+        symbols = "".join(prefixes.values())
+        for name in names.split():
+            nick = name.lstrip(symbols)
+            self.members[sys.intern(nick)] = \
+                sys.intern(name[:len(name) - len(nick)])
+
+    def set_mode(self, modes, args, prefixes=MODE_PREFIXES,
+                 chanmodes=CHANNEL_MODES):
+        """Applies channel mode and member status changes from a MODE command.
+
+        Args:
+            modes (str): The mode string, e.g. ``"+ov-v"``.
+            args (list of str): The mode parameters.
+            prefixes (collections.OrderedDict, optional): The member status
+                modes of the network, and their prefixes. Defaults to
+                ``MODE_PREFIXES``.
+            chanmodes (tuple of str, optional): The channel modes of the
+                network, by type. Defaults to ``CHANNEL_MODES``.
+        """
+
+        args = iter(args)
+        adding = True
+        lists, always, when_set, _ = chanmodes
+        for mode in modes:
+            if mode in "+-": adding = mode == "+"
+            elif mode in prefixes:
+
+                nick = next(args, None)
+                if nick not in self.members: continue
+                prefix = self.members[nick].replace(prefixes[mode], "")
+                if adding:
+                    prefix = "".join(p for p in prefixes.values()
+                                     if p in prefix + prefixes[mode])
+                self.members[nick] = sys.intern(prefix)
+
+            elif mode in lists: next(args, None)
+            elif mode in always or (mode in when_set and adding):
+                argument = next(args, None)
+                if adding: self.modes[mode] = argument
+                else: self.modes.pop(mode, None)
+            elif adding: self.modes[mode] = None
+            else: self.modes.pop(mode, None)
+
+    def mode_params(self):
+        """Renders the channel modes as the parameters of a MODE reply.
+
+        Returns:
+            list of str: The mode string, followed by any mode parameters.
+        """
+
+        modes = sorted(self.modes)
+        return ["+" + "".join(modes)] + [self.modes[mode] for mode in modes
+                                         if self.modes[mode] is not None]
+
+    def topic_replies(self, server, nickname):
+        """Renders the channel topic as the replies to a TOPIC query.
+
+        Args:
+            server (str): The name of the IRC server.
+            nickname (str): The nickname of the Bouncer on the network.
+
+        Returns:
+            list of str: Lines, without their line endings.
+        """
+
+        if self.topic is None:
+            return [":%s 331 %s %s :No topic is set." % (
+                server, nickname, self.name)]
+        lines = [":%s 332 %s %s :%s" % (server, nickname, self.name,
+                                        self.topic)]
+        if self.topic_info:
+            lines.append(":%s 333 %s %s %s" % (server, nickname, self.name,
+                                               " ".join(self.topic_info)))
+        return lines
+
+    def names(self, server, nickname):
+        """Renders the channel members as the replies to a NAMES query.
+
+        Args:
+            server (str): The name of the IRC server.
+            nickname (str): The nickname of the Bouncer on the network.
+
+        Returns:
+            list of str: Lines, without their line endings.
+        """
+
+        lines = []
+        head = ":%s 353 %s %s %s :" % (server, nickname, self.symbol,
+                                       self.name)
+        names = []
+        for nick, prefix in self.members.items():
+            name = prefix + nick
+            if names and len(head) + len(" ".join(names + [name])) > 510:
+                lines.append(head + " ".join(names))
+                names = []
+            names.append(name)
+        if names: lines.append(head + " ".join(names))
+        lines.append(":%s 366 %s %s :End of /NAMES list." % (server, nickname,
+                                                             self.name))
+        return lines
+
+    def who(self, server, nickname, users):
+        """Renders the channel members as the replies to a WHO query.
+
+        Members are only known in full once a WHO reply has described them,
+        and away status is as of that reply, as the network does not tell us
+        when it changes.
+
+        Args:
+            server (str): The name of the IRC server.
+            nickname (str): The nickname of the Bouncer on the network.
+            users (dict): What is known of each member, by nickname.
+
+        Returns:
+            list of str: Lines, without their line endings, or ``None`` if
+            any member is not known in full.
+        """
+
+        lines = []
+        for nick, prefix in self.members.items():
+            user = users.get(nick)
+            if not user or user.realname is None: return None
+            lines.append(":%s 352 %s %s %s %s %s %s %s%s :0 %s" % (
+                server, nickname, self.name, user.user, user.host,
+                user.server, nick, "G" if user.away else "H", prefix[:1],
+                user.realname))
+        lines.append(":%s 315 %s %s :End of /WHO list." % (
+            server, nickname, self.name))
+        return lines
+
+    def snapshot(self, server, nickname, source):
+        """Renders the channel state as the replies to a fresh JOIN.
+
+        Args:
+            server (str): The name of the IRC server.
+            nickname (str): The nickname of the Bouncer on the network.
+            source (str): The full prefix of the Bouncer on the network.
+
+        Returns:
+            list of str: Lines, without their line endings.
+        """
+
+        lines = [":%s JOIN %s" % (source, self.name)]
+        if self.topic is not None:
+            lines.extend(self.topic_replies(server, nickname))
+        lines.extend(self.names(server, nickname))
+
+        if self.modes:
+            lines.append(":%s 324 %s %s %s" % (server, nickname, self.name,
+                                               " ".join(self.mode_params())))
+        return lines
@@ -5,7 +5,60 @@ a Connection, and defines an interface to IRC client applications implementing
 _RFC 2812: https://tools.ietf.org/html/rfc2812 .
 """
 
+import asyncio
+import itertools
+import logging
+import os
+import time
 from connection import Connection
+from log import B2C, C2B
+from message import Message, add_tags, format_time, parse_time
+
+logger = logging.getLogger("sputnik.client")
+
+REGISTRATION = ("CAP", "PASS", "QUIT", "USER")
+CHAT = ("PRIVMSG", "NOTICE")
+COMMANDS = {}
+
+
+def is_chat(line):
+    """Checks whether an encoded line is a PRIVMSG or NOTICE.
+
+    Args:
+        line (bytes): An encoded line.
+
+    Returns:
+        bool: Whether the line is a chat message.
+    """
+
+    return command_of(line) in CHAT
+
+
+def command_of(frame):
+    """Finds the command of an encoded line, without decoding the line.
+
+    The commands clients send are few, so once seen, each is looked up in
+    ``COMMANDS`` by the word that begins the line.
+
+    Args:
+        frame (memoryview): An encoded line, ending in CRLF.
+
+    Returns:
+        str: The command, in upper case.
+    """
+
+    word = bytes(frame[:16]).split(b" ", 1)[0]
+    command = COMMANDS.get(word)
+    if command is not None: return command
+
+    words = bytes(frame).split(b" ", 2)
+    if words[0].startswith(b"@"): del words[0]
+    if words and words[0].startswith(b":"): del words[0]
+    command = words[0].split(b" ", 1)[0] if words else b""
+    command = command.rstrip(b"\r\n").upper().decode("latin1")
+    if len(word) < 16 and word[:1] not in b"@:" and len(COMMANDS) < 256:
+        COMMANDS[word] = command
+    return command
 
 
 class Client(Connection):
@@ -16,13 +69,38 @@ class Client(Connection):
     does not implement an actual IRC client, as defined in
     _RFC 2812: https://tools.ietf.org/html/rfc2812 .
 
+    A Client may negotiate the IRCv3 ``server-time``, ``batch``, and
+    ``draft/chathistory`` capabilities. A Client with ``draft/chathistory``
+    is not sent the chat history when it attaches, and instead pages through
+    the Archive on demand with the CHATHISTORY command.
+
+    When the Bouncer has a Datastore, a Client must send the Bouncer password
+    with PASS before it is attached, and anything but registration is ignored
+    until then. Attempts are limited per address, and checked off the event
+    loop, so that guessing passwords costs an attacker time, and not us CPU.
+    The password already verified is recognized without either. Clients
+    relayed by a Supervisor arrive on a Unix socket, and are limited by the
+    address named in the PROXY header that precedes their first line.
+
     Attributes:
+        authenticated (bool): Indicates if the Client may be attached.
+        authenticating (bool): Indicates if a password is being checked.
         bouncer (sputnik.Bouncer): A reference to the Bouncer singleton.
         broker (sputnik.Network): The connected Network instance.
+        caps (set of str): The IRCv3 capabilities the Client has enabled.
+        cursor (int): The next line of the Network history to be sent.
+        negotiating (bool): Indicates if capability negotiation is underway.
         network (str): The name of the IRC network to connect to.
+        overflow (str): The slow Client policy, ``"drop"`` or ``"disconnect"``.
+        paused (bool): Indicates if the transport has asked us to stop writing.
+        peer (str): The address the Client connected from, or ``None``.
+        proxied (bool): Indicates if a PROXY header may still be received.
         ready (bool): Indicates if the Client has connected to a Network.
+        serial (int): Identifies the Client in metrics.
     """
 
+    serials = itertools.count(1)
+
     def __init__(self, bouncer):
         """Creates an instance of a Client.
 
@@ -36,88 +114,577 @@ class Client(Connection):
         """
 
         self.bouncer = bouncer
+        self.serial = next(self.serials)
         self.network = None
         self.broker = None
+        self.cursor = 0
+        self.paused = False
+        self.overflow = os.getenv("SPUTNIK_SLOW_CLIENTS", "drop")
+        self.history_limit = int(os.getenv("SPUTNIK_CHATHISTORY_LIMIT", 100))
+        self.caps = set()
+        self.negotiating = False
+        self.batches = 0
+        self.authenticating = False
+        self.rejected = False
+        self.authenticated = not bouncer.datastore or \
+            os.getenv("SPUTNIK_CLIENT_AUTH", "1") == "0"
 
     def connection_made(self, transport):
         """Registers the connected Client with the Bouncer.
 
         Adds the Client to the set of connected Clients in the Bouncer and
-        saves the transport for later use.
+        saves the transport for later use. The write buffer limits of the
+        transport determine when a slow Client is paused.
         """
 
-        print("Client Connected to Bouncer")
+        logger.info("Client Connected to Bouncer")
         self.bouncer.clients.add(self)
-        self.transport = transport
+        super().connection_made(transport)
         self.ready = False
 
+        peer = transport.get_extra_info("peername")
+        self.peer = peer[0] if isinstance(peer, tuple) else None
+        self.proxied = self.peer is None
+
+        transport.set_write_buffer_limits(
+            high=int(os.getenv("SPUTNIK_CLIENT_HIGH_WATER", 65536)),
+            low=int(os.getenv("SPUTNIK_CLIENT_LOW_WATER", 16384)))
+
+    def pause_writing(self):
+        """Stops sending history once the transport buffer is full.
+
+        While paused, the Client falls behind on the Network history rather
+        than growing the transport buffer without bound.
+        """
+
+        self.paused = True
+
+    def resume_writing(self):
+        """Resumes sending history once the transport buffer has drained."""
+
+        self.paused = False
+        if self.ready: self.catch_up()
+
     def connection_lost(self, exc):
         """Unregister the connected Client from the Bouncer.
 
-        Removes the Client from the set of connected Clients in the Bouncer
-        before the connection is terminated. After this point, there should be
-        no remaining references to this instance of the Client.
+        Removes the Client from the set of connected Clients in the Bouncer,
+        and from the subscribers of its Network, before the connection is
+        terminated. After this point, there should be no remaining references
+        to this instance of the Client.
         """
 
-        print("Client Disconnected from Bouncer")
+        logger.info("Client Disconnected from Bouncer")
         self.bouncer.clients.remove(self)
+        self.unsubscribe()
 
     def data_received(self, data):
         """Handles incoming messages from connected IRC clients.
 
         Messages coming from IRC clients are potentially batched, and need to
-        be parsed into individual lines before any other operation may occur.
-        Afterwards, we split lines according to the IRC message format and then
-        perform actions as appropriate.
+        be framed into individual lines before any other operation may occur.
+        Lines split across reads are reassembled, and each line is either
+        relayed to the Network untouched, or decoded and dispatched to its
+        handler. Once the Client has selected a Network, finished negotiating
+        capabilities, and authenticated, it is attached to the Network. A
+        Client that registers without a password is rejected.
+        """
+
+        frames = self.linebuffer.frames(data)
+        if self.proxied and frames: frames = self.unproxy(frames)
+        self.bytes_in += len(data)
+        self.lines_in += len(frames)
+        relayed = []
+        for frame in frames:
+            if self.relayable(frame): relayed.append(frame)
+            else:
+                if relayed: self.relay(relayed)
+                relayed = []
+                self.line_received(self.decode(frame[:-2]), frame)
+        if relayed: self.relay(relayed)
+
+        if self.broker and not self.ready and not self.negotiating:
+            if self.authenticated: self.attach()
+            elif not self.authenticating: self.reject("Password Required")
+
+    def unproxy(self, frames):
+        """Takes the address of a relayed Client from its PROXY header.
+
+        The header is trusted only from a Unix socket, where a Supervisor is
+        the only peer, and only ahead of the first line.
+
+        Args:
+            frames (list of memoryview): The first lines received.
+
+        Returns:
+            list of memoryview: The lines that follow any PROXY header.
+        """
+
+        self.proxied = False
+        words = bytes(frames[0]).split()
+        if not words or words[0] != b"PROXY": return frames
+        if len(words) > 2: self.peer = words[2].decode("ascii", "replace")
+        return frames[1:]
+
+    def relayable(self, frame):
+        """Checks whether a line may be relayed to the Network untouched.
+
+        Most lines a Client sends are meant for the Network as they are, so
+        they are queued exactly as received, without being decoded, parsed,
+        or encoded again. Lines with a handler still take the full path, as
+        do chat messages when there is an Archive to record them in.
+
+        Args:
+            frame (memoryview): An encoded line, ending in CRLF.
+
+        Returns:
+            bool: Whether the line may be relayed.
+        """
+
+        broker = self.broker
+        if not (self.authenticated and broker and broker.transport):
+            return False
+        command = command_of(frame)
+        return command not in self.dispatch or \
+            (command in CHAT and not self.bouncer.archive)
+
+    def relay(self, frames):
+        """Queues lines on the Network, exactly as they were received.
+
+        Args:
+            frames (list of memoryview): Encoded lines, ending in CRLF.
+        """
+
+        self.broker.relay(frames)
+        if C2B.isEnabledFor(logging.DEBUG):
+            for frame in frames:
+                C2B.debug("[C to B]\t%s\t%s", self.network,
+                          self.decode(frame[:-2]),
+                          extra={ "network" : self.network })
+
+    def line_received(self, line, encoded=None):
+        """Ignores all but registration commands, until authenticated.
+
+        Args:
+            line (str): A decoded line, without its line ending.
+            encoded (memoryview, optional): The line as received, ending in
+                CRLF. Defaults to ``None``.
+        """
+
+        if self.authenticated: return super().line_received(line, encoded)
+        if self.rejected: return
+        message = Message(line, encoded)
+        if message.command in REGISTRATION:
+            self.dispatch[message.command](self, message)
+
+    def address(self):
+        """Returns the address the Client connected from, to limit logins."""
+
+        return self.peer or "local"
+
+    def irc_PASS(self, message):
+        """Checks the Bouncer password, rather than forwarding it."""
+
+        if self.authenticated or self.authenticating or not message.params:
+            return
+        password, address = message.params[0], self.address()
+        if not self.bouncer.datastore.is_verified(password) and \
+           not self.bouncer.logins.allow(address):
+            logger.warning("Refused Login from %s: Too Many Attempts", address)
+            return self.reject("Too Many Attempts")
+        self.authenticating = True
+        asyncio.async(self.authenticate(password))
+
+    @asyncio.coroutine
+    def authenticate(self, password):
+        """Checks a password, then attaches or rejects the Client.
+
+        Args:
+            password (str): The password sent by the Client.
+        """
+
+        matched = yield from self.bouncer.datastore.check_password(password)
+        self.authenticating = False
+        if self not in self.bouncer.clients: return
+        if not matched:
+            logger.warning("Refused Login from %s: Incorrect Password",
+                           self.address())
+            return self.reject("Password Incorrect")
+        self.authenticated = True
+        self.subscribe()
+        if self.broker and not self.ready and not self.negotiating:
+            self.attach()
+
+    def reject(self, reason):
+        """Tells the Client why its login failed, and disconnects it.
+
+        Args:
+            reason (str): The reason the login failed.
+        """
+
+        if self.rejected: return
+        self.rejected = True
+        self.send(":sputnik 464 *", ":" + reason)
+        self.transport.close()
+
+    def attach(self):
+        """Sends a snapshot of the Network state, then the chat history.
+
+        The snapshot is sent in a single write. It stands in for every other
+        line of the history, such as the registration burst, JOINs, and NAMES
+        replies, so only the chat messages of the history are replayed after
+        it. A Client that pages through the Archive itself is told how many
+        lines it may request at once, and is only sent lines received from
+        now on.
+        """
+
+        snapshot = self.broker.snapshot()
+        if "draft/chathistory" in self.caps:
+            snapshot += self.normalize(
+                ":sputnik 005 %s CHATHISTORY=%d :are supported by this server"
+                % (self.broker.nickname, self.history_limit)).encode()
+            self.cursor = self.broker.chat_history.next
+
+        self.transport.write(snapshot)
+        self.lines_out += snapshot.count(b"\n")
+        self.bytes_out += len(snapshot)
+        self.ready = True
+        self.catch_up(chat_only=True)
+
+    def capabilities(self):
+        """Lists the IRCv3 capabilities that the Client may enable.
+
+        Returns:
+            list of str: The capability names.
+        """
+
+        caps = ["batch", "server-time"]
+        if self.bouncer.archive: caps.append("draft/chathistory")
+        return caps
+
+    def irc_CAP(self, message):
+        """Negotiates IRCv3 capabilities, without involving the Network.
+
+        Attaching to a Network is held back from the first ``CAP LS`` or
+        ``CAP REQ`` until ``CAP END``, as the capabilities affect how the
+        Client is attached.
+        """
+
+        params = message.params
+        subcommand = params[0].upper() if params else ""
+        if subcommand == "LS":
+            self.negotiating = True
+            self.send(":sputnik CAP * LS", ":" + " ".join(self.capabilities()))
+        elif subcommand == "LIST":
+            self.send(":sputnik CAP * LIST", ":" + " ".join(sorted(self.caps)))
+        elif subcommand == "REQ":
+
+            self.negotiating = True
+            requested = params[-1].split() if len(params) > 1 else []
+            supported = self.capabilities()
+            if all(cap.lstrip("-") in supported for cap in requested):
+                for cap in requested:
+                    if cap.startswith("-"): self.caps.discard(cap[1:])
+                    else: self.caps.add(cap)
+                self.send(":sputnik CAP * ACK", ":" + " ".join(requested))
+            else: self.send(":sputnik CAP * NAK", ":" + " ".join(requested))
+
+        elif subcommand == "END": self.negotiating = False
+
+    def irc_CHATHISTORY(self, message):
+        """Serves scrollback for a channel or query from the Archive.
+
+        The ``LATEST``, ``BEFORE`` and ``AFTER`` subcommands are supported,
+        with ``timestamp=`` references. Chat messages are sent oldest first,
+        wrapped in a ``chathistory`` batch if the Client supports batches.
+        """
+
+        archive = self.bouncer.archive
+        if not archive or "draft/chathistory" not in self.caps:
+            return self.forward(message.line)
+
+        params = message.params
+        if len(params) < 4:
+            return self.fail("NEED_MORE_PARAMS", "Missing parameters",
+                             *params[:1])
+
+        subcommand, target, reference = params[0].upper(), params[1], params[2]
+        try:
+            limit = min(int(params[3]), self.history_limit)
+            if reference == "*" and subcommand == "LATEST": stamp = None
+            elif reference.startswith("timestamp="):
+                stamp = parse_time(reference[len("timestamp="):])
+            else: raise ValueError(reference)
+        except ValueError:
+            return self.fail("INVALID_PARAMS", "Invalid reference or limit",
+                             subcommand)
+
+        if subcommand == "LATEST":
+            records = archive.before(self.network, target, limit=limit,
+                                     since=stamp + 1 if stamp else 0,
+                                     match=is_chat)
+        elif subcommand == "BEFORE":
+            records = archive.before(self.network, target, until=stamp,
+                                     limit=limit, match=is_chat)
+        elif subcommand == "AFTER":
+            records = archive.read(self.network, target, since=stamp + 1,
+                                   limit=limit, match=is_chat)
+        else:
+            return self.fail("INVALID_PARAMS", "Unsupported subcommand",
+                             subcommand)
+
+        self.replay(target, records)
+
+    def replay(self, target, records):
+        """Writes archived records to the Client in a single call.
+
+        Args:
+            target (str): The channel or nickname the records belong to.
+            records (list of tuple): The timestamps and lines of the records.
+        """
+
+        tags, lines = [], []
+        if "batch" in self.caps:
+            self.batches += 1
+            batch = "%x" % self.batches
+            tags.append(b"batch=" + batch.encode())
+            lines.append(self.normalize(":sputnik BATCH +%s chathistory %s"
+                                        % (batch, target)).encode())
+
+        for stamp, line in records:
+            line_tags = list(tags)
+            if "server-time" in self.caps:
+                line_tags.append(b"time=" + format_time(stamp).encode())
+            lines.append(add_tags(line, b";".join(line_tags))
+                         if line_tags else line)
+
+        if "batch" in self.caps:
+            lines.append(self.normalize(":sputnik BATCH -%s" % batch).encode())
+        data = b"".join(lines)
+        self.transport.write(data)
+        self.lines_out += len(lines)
+        self.bytes_out += len(data)
+
+    def fail(self, code, description, *context):
+        """Sends a standard FAIL reply to a CHATHISTORY command.
+
+        Args:
+            code (str): The error code.
+            description (str): A description of the error.
+            context (list of str): Any parameters giving context.
+        """
+
+        self.send(*[":sputnik FAIL CHATHISTORY", code] + list(context) +
+                   [":" + description])
+
+    def irc_QUIT(self, message):
+        """Suppresses the QUIT command, keeping the Network connected."""
+
+        pass
+
+    def irc_USER(self, message):
+        """Attaches the Client to the Network named by its username.
+
+        The Client is indexed under the Network name, so that the Network only
+        visits its own subscribers when delivering lines.
+        """
+
+        if not message.params: return
+        self.unsubscribe()
+        self.network = message.params[0]
+        if self.network not in self.bouncer.networks:
+            self.send("This Network Does Not Exist")
+        else:
+            self.broker = self.bouncer.networks[self.network]
+            self.cursor = self.broker.chat_history.first
+            self.subscribe()
+
+    def subscribe(self):
+        """Indexes the Client under its Network, once it may be attached.
+
+        Only an authenticated Client of an existing Network is indexed, so
+        that the subscribers cannot be grown by anyone who merely connects.
         """
 
-        for line in self.decode(data).rstrip().split("\r\n"):
-            l = line.split(" ", 1)
+        if self.authenticated and self.broker:
+            self.bouncer.subscribers.setdefault(self.network, set()).add(self)
 
-            if   l[0] == "QUIT": pass  # Suppress the QUIT Command
-            elif l[0] == "USER":
+    def unsubscribe(self):
+        """Removes the Client from the index, and any index left empty."""
 
-                self.network = l[1].split(" ")[0]
-                if self.network not in self.bouncer.networks:
-                    self.send("This Network Does Not Exist")
-                else: self.broker = self.bouncer.networks[self.network]
+        subscribers = self.bouncer.subscribers.get(self.network)
+        if subscribers is None: return
+        subscribers.discard(self)
+        if not subscribers: del self.bouncer.subscribers[self.network]
 
-            elif l[0] == "JOIN":
+    def irc_JOIN(self, message):
+        """Saves joined channels and their keys, then forwards the JOIN."""
 
-                for channel in l[1].split(","):
-                    channel = channel.split(" ")
-                    password = channel[1] if len(channel) > 1 else None
-                    if self.bouncer.datastore:
-                        self.bouncer.datastore.add_channel(
-                            self.network, channel[0], password)
-                self.forward(line)
-                self.forward("WHO", channel[0])
+        params = message.params
+        channels = params[0].split(",") if params else []
+        passwords = params[1].split(",") if len(params) > 1 else []
 
-            elif l[0] == "PART":
+        if self.bouncer.datastore:
+            for channel, password in zip(channels, passwords + [None] *
+                                         (len(channels) - len(passwords))):
+                self.bouncer.datastore.add_channel(
+                    self.network, channel, password)
 
-                if self.bouncer.datastore:
-                    self.bouncer.datastore.remove_channel(
-                        self.network, l[1].split(" ")[0])
-                self.forward(line)
+        self.forward(message.line)
+
+    def irc_PRIVMSG(self, message):
+        """Forwards a chat message, and archives it.
+
+        The Network does not echo our own messages back to us, so they are
+        archived as they are sent, in order for scrollback to include them.
+        """
+
+        self.forward(message.line)
+        if self.broker and len(message.params) > 1:
+            line = ":%s %s %s :%s" % (self.broker.source, message.command,
+                                      message.params[0], message.params[-1])
+            self.broker.archive(self.normalize(line).encode(),
+                                int(time.time() * 1000),
+                                *message.params[0].split(","))
+
+    irc_NOTICE = irc_PRIVMSG
+
+    def irc_PART(self, message):
+        """Forgets parted channels, then forwards the PART."""
+
+        if self.bouncer.datastore and message.params:
+            for channel in message.params[0].split(","):
+                self.bouncer.datastore.remove_channel(self.network, channel)
+        self.forward(message.line)
+
+    def joined(self, message):
+        """Looks up the joined channel that a query is about.
+
+        Only a query naming a single channel, with no further parameters, may
+        be answered by the Bouncer.
+
+        Args:
+            message (sputnik.Message): A NAMES, TOPIC, or WHO query.
+
+        Returns:
+            sputnik.Channel: The channel, or ``None`` if the query must be
+            forwarded to the Network.
+        """
+
+        if not self.broker or len(message.params) != 1: return None
+        return self.broker.channels.get(message.params[0].lower())
+
+    def reply(self, lines):
+        """Answers a query from the Network state, in a single write.
+
+        Args:
+            lines (list of str): Lines, without their line endings.
+        """
+
+        encoded = "".join(self.normalize(line) for line in lines).encode()
+        self.transport.write(encoded)
+        self.lines_out += len(lines)
+        self.bytes_out += len(encoded)
+
+    def irc_NAMES(self, message):
+        """Answers NAMES for one of our channels, from the Network state."""
+
+        channel = self.joined(message)
+        if not channel or not channel.synced: return self.forward(message.line)
+        self.reply(channel.names(self.broker.server, self.broker.nickname))
+
+    def irc_TOPIC(self, message):
+        """Answers a query for the topic of one of our channels.
+
+        A TOPIC that sets the topic is forwarded to the Network, as is a query
+        for a channel we have not joined.
+        """
+
+        channel = self.joined(message)
+        if not channel: return self.forward(message.line)
+        self.reply(channel.topic_replies(self.broker.server,
+                                         self.broker.nickname))
+
+    def irc_WHO(self, message):
+        """Answers WHO for one of our channels, once its members are known.
+
+        Until a WHO reply from the Network has described every member of the
+        channel, the query is forwarded, and the replies are remembered.
+        """
+
+        channel = self.joined(message)
+        lines = channel and channel.synced and channel.who(
+            self.broker.server, self.broker.nickname, self.broker.users)
+        if not lines: return self.forward(message.line)
+        self.reply(lines)
+
+    def unhandled(self, message):
+        """Forwards any other message to the Network unchanged."""
+
+        self.forward(message.line)
+
+    def catch_up(self, chat_only=False):
+        """Sends the Client any Network history it has yet to receive.
+
+        Each Client keeps its own cursor into the history of its Network, so
+        several Clients may be attached to one Network, and each receives every
+        line exactly once. Lines are joined straight from the history buffer
+        into a single write, without being encoded again, unless the Client has
+        enabled ``server-time``, in which case each line is tagged with its
+        time. The tagged lines are kept by the Network, and shared by every
+        such Client. Joining copies the views of the history, which some
+        transports would otherwise hold on to after ``writelines`` returns.
+
+        A Client that falls so far behind that its unsent lines are evicted
+        from the history has passed its limit. Under the ``"drop"`` policy it
+        resumes from the oldest line still retained, and under the
+        ``"disconnect"`` policy its connection is closed.
+
+        Args:
+            chat_only (bool, optional): Whether to send only chat messages,
+                as when attaching. Defaults to ``False``.
+        """
 
-            else: self.forward(line)
+        history = self.broker.chat_history
+        if self.cursor < history.first and self.overflow == "disconnect":
+            logger.warning("Disconnecting Slow Client from %s", self.network)
+            self.transport.close()
+            return
+        if self.paused: return
 
-        if self.broker and not self.ready:
-            for line in self.broker.server_log: self.send(line)
-            self.ready = True
+        cursor = self.cursor
+        lines, self.cursor = history.read(cursor)
+        if not lines: return
+        if chat_only: chat = [command_of(line) in CHAT for line in lines]
+        if "server-time" in self.caps:
+            lines = self.broker.stamp(cursor, lines)
+        if chat_only:
+            lines = [line for line, keep in zip(lines, chat) if keep]
+            if not lines: return
+        data = b"".join(lines)
+        self.transport.write(data)
+        self.lines_out += len(lines)
+        self.bytes_out += len(data)
+        if B2C.isEnabledFor(logging.DEBUG):
+            for line in lines:
+                B2C.debug("[B to C]\t%s\t%s", self.network,
+                          self.decode(line).rstrip(),
+                          extra={ "network" : self.network })
 
     def forward(self, *args):
         """Writes a message to the Network.
 
         Because the Client represents an instance of a connection from an IRC
-        client, we instead need to write to the transport associated with the
-        connected network.
+        client, we instead need to queue the message on the connected network,
+        where it is sent ahead of any bulk traffic.
 
         Args:
             args (list of str): A list of strings to concatenate.
         """
 
         message = self.normalize(" ".join(args))
-        if self.broker:
-            self.broker.transport.write(message.encode())
-            print("[C to B]\t%s" % message, end="")
+        if self.broker and self.broker.transport:
+            self.broker.send(message)
+            if C2B.isEnabledFor(logging.DEBUG):
+                C2B.debug("[C to B]\t%s\t%s", self.network, message.rstrip(),
+                          extra={ "network" : self.network })
@@ -6,6 +6,127 @@ transport-level interactions, such as message encoding and message passing.
 """
 
 import asyncio
+from message import Message
+
+MAX_LINE_LENGTH = 8191 + 512  # IRCv3 Message Tags Plus an RFC 2812 Message
+
+
+class LineBuffer(object):
+    """An incremental framer that splits a byte stream into IRC lines.
+
+    TCP makes no promises about where one segment ends and the next begins,
+    so a single line may arrive split across several chunks, and a single
+    chunk may hold many lines. The LineBuffer holds on to the trailing partial
+    line of each chunk and emits complete lines as soon as their terminator
+    arrives. Each byte is searched and copied a constant number of times, so
+    the total cost is proportional to the number of bytes received,
+    regardless of how the stream was chunked.
+
+    Attributes:
+        buffer (bytearray): Bytes received that do not yet form a line.
+        limit (int): The maximum length of a line, excluding its terminator.
+        discarding (bool): Indicates if an overlong line is being dropped.
+    """
+
+    def __init__(self, limit=MAX_LINE_LENGTH):
+        """Creates an instance of a LineBuffer.
+
+        Args:
+            limit (int, optional): The maximum line length. Lines longer than
+                this are discarded. Defaults to ``MAX_LINE_LENGTH``.
+        """
+
+        self.buffer = bytearray()
+        self.limit = limit
+        self.discarding = False
+
+    def feed(self, data):
+        """Appends a chunk of data and returns the lines it completed.
+
+        Lines are split on LF, and a trailing CR is stripped, which tolerates
+        servers that terminate lines with a bare LF. Lines exceeding the limit
+        are dropped in their entirety rather than truncated, since a truncated
+        command is more dangerous than a missing one. Empty lines are ignored,
+        as permitted by the RFC.
+
+        Args:
+            data (bytes): A chunk of data read from the transport.
+
+        Returns:
+            list of bytes: Complete lines, without their line endings.
+        """
+
+        buffer = self.buffer
+        end = data.rfind(b"\n")
+
+        if end < 0: lines = []
+        else:
+
+            chunk = bytes(buffer) + data[:end] if buffer else data[:end]
+            lines = chunk.split(b"\n")
+            if self.discarding:
+                self.discarding = False
+                lines[0] = b""
+            lines = [line for line in (raw.rstrip(b"\r") for raw in lines)
+                     if 0 < len(line) <= self.limit]
+
+            del buffer[:]
+            data = data[end + 1:]
+
+        buffer.extend(data)
+        if len(buffer) > self.limit:
+            del buffer[:]
+            self.discarding = True
+
+        return lines
+
+    def frames(self, data):
+        """Appends a chunk of data and returns the raw lines it completed.
+
+        Lines are framed exactly as by ``feed``, but each is returned as a
+        view of the received data that includes its CRLF ending, so that it
+        may be written on without being copied. Only lines that arrived with
+        some other ending are copied, in order to end them in CRLF.
+
+        Args:
+            data (bytes): A chunk of data read from the transport.
+
+        Returns:
+            list of memoryview: Complete lines, each ending in CRLF.
+        """
+
+        buffer, frames = self.buffer, []
+        end = data.rfind(b"\n")
+
+        if end >= 0:
+
+            last = len(buffer) + end
+            chunk = bytes(buffer) + data[:end + 1] if buffer else data
+            view, start = memoryview(chunk), 0
+            if self.discarding:
+                self.discarding = False
+                start = chunk.index(b"\n") + 1
+
+            while start <= last:
+                stop = chunk.index(b"\n", start)
+                content = stop
+                while content > start and chunk[content - 1] == 13:
+                    content -= 1
+                if 0 < content - start <= self.limit:
+                    frames.append(view[start:stop + 1] if stop - content == 1
+                                  else memoryview(chunk[start:content] +
+                                                  b"\r\n"))
+                start = stop + 1
+
+            del buffer[:]
+            data = data[end + 1:]
+
+        buffer.extend(data)
+        if len(buffer) > self.limit:
+            del buffer[:]
+            self.discarding = True
+
+        return frames
 
 
 class Connection(asyncio.Protocol):
@@ -14,8 +135,109 @@ class Connection(asyncio.Protocol):
     A Connection is a base class that represents an instance of a network
     connection. The Connection implements commonly used actions that may be
     performed on messages.
+
+    Incoming lines are routed through a dispatch table that maps each command
+    to a handler. Subclasses declare handlers as methods named after the
+    command they handle, e.g. ``irc_PRIVMSG`` or ``irc_001``, and lines with
+    no handler are passed to ``unhandled``. The table is compiled once per
+    class, so routing a line costs a single dictionary lookup.
+
+    Attributes:
+        bytes_in (int): The number of bytes received.
+        bytes_out (int): The number of bytes written.
+        dispatch (dict): The compiled dispatch table for this class.
+        linebuffer (sputnik.LineBuffer): Frames incoming data into lines.
+        lines_in (int): The number of lines received.
+        lines_out (int): The number of lines written.
+        transport (asyncio.Transport): The underlying transport.
     """
 
+    lines_in = bytes_in = lines_out = bytes_out = 0
+
+    def connection_made(self, transport):
+        """Saves the transport and prepares to receive lines.
+
+        Args:
+            transport (asyncio.Transport): The underlying transport.
+        """
+
+        self.transport = transport
+        self.linebuffer = LineBuffer()
+        self.dispatch = self.handlers()
+
+    def data_received(self, data):
+        """Frames incoming data into lines and handles each line in turn.
+
+        Each complete line is decoded exactly once before it is passed on to
+        ``line_received``, which subclasses are expected to implement.
+
+        Args:
+            data (bytes): A chunk of data read from the transport.
+        """
+
+        lines = self.linebuffer.feed(data)
+        self.bytes_in += len(data)
+        self.lines_in += len(lines)
+        for line in lines:
+            self.line_received(self.decode(line))
+
+    @classmethod
+    def handlers(cls):
+        """Returns the dispatch table for this class, compiling it if needed.
+
+        Returns:
+            dict: A dictionary of the form ``{ "<COMMAND>" : <handler> }``.
+        """
+
+        if "_handlers" not in cls.__dict__:
+            cls._handlers = { name[4:].upper() : getattr(cls, name)
+                              for name in dir(cls) if name.startswith("irc_") }
+        return cls._handlers
+
+    @classmethod
+    def hook(cls, command, callback):
+        """Registers a plugin callback for a command.
+
+        The callback is invoked as ``callback(connection, message)`` before the
+        existing handler for the command. If the callback returns ``True``, the
+        message is considered consumed and the existing handler is skipped.
+
+        Args:
+            command (str): The command to hook, e.g. ``"PRIVMSG"``.
+            callback (callable): The function to invoke.
+        """
+
+        handlers = cls.handlers()
+        command = command.upper()
+        handler = handlers.get(command, cls.unhandled)
+
+        def hooked(self, message):
+            if not callback(self, message): handler(self, message)
+        handlers[command] = hooked
+
+    def line_received(self, line, encoded=None):
+        """Routes a single decoded line to the handler for its command.
+
+        Args:
+            line (str): A decoded line, without its line ending.
+            encoded (memoryview, optional): The line as received, ending in
+                CRLF, for handlers that pass it on. Defaults to ``None``.
+        """
+
+        message = Message(line, encoded)
+        handler = self.dispatch.get(message.command)
+        if handler: handler(self, message)
+        else: self.unhandled(message)
+
+    def unhandled(self, message):
+        """Handles a message with no registered handler.
+
+        Args:
+            message (sputnik.Message): The message to handle.
+        """
+
+        pass
+
     def decode(self, line):
         """Attempts to decode a line as UTF-8, with fallback to Latin-1.
 
@@ -24,15 +246,16 @@ class Connection(asyncio.Protocol):
         and provide a fallback to Latin-1 when needed.
 
         Args:
-            line (str): A byte-string message to decode.
+            line (bytes): A byte-string message to decode, or a memoryview of
+                one.
 
         Returns:
             str: A decoded message.
         """
 
-        try: return line.decode()
+        try: return str(line, "utf-8")
         except UnicodeDecodeError:
-            return line.decode("latin1")
+            return str(line, "latin1")
 
     def normalize(self, line, ending="\r\n"):
         """Ensures that a line is terminated with the correct line endings.
@@ -63,5 +286,7 @@ class Connection(asyncio.Protocol):
             args (list of str): A list of strings to concatenate.
         """
 
-        message = self.normalize(" ".join(args))
-        self.transport.write(message.encode())
+        encoded = self.normalize(" ".join(args)).encode()
+        self.transport.write(encoded)
+        self.lines_out += 1
+        self.bytes_out += len(encoded)
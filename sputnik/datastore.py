@@ -4,12 +4,64 @@ This module provides the Sputnik Datastore implementation. It implements a thin
 wrapper around Redis, which is required in order to persist data across Bouncer
 restarts or network disconnections. This functionality is required due to the
 ephemeral filesystems typical to most Platform-as-a-Service Providers (PaaS).
+
+Data is laid out so that every lookup is a single command, and nothing ever
+needs to scan the keyspace:
+
+- ``networks`` is a set of the names of all saved networks.
+- ``network:<network>`` is a hash of the credentials of a network.
+- ``channels:<network>`` is a hash of each saved channel to its password.
+- ``password=bouncer:password`` holds the encrypted Bouncer password.
 """
 
+import asyncio
 import bcrypt
+import concurrent.futures
+import hmac
 import json
+import logging
 import os
 import redis
+import metrics
+import urllib.parse
+from resp import RedisProtocol
+
+logger = logging.getLogger("sputnik.datastore")
+
+
+def redis_url(hostname, port):
+    """Returns the URL of the Redis instance to connect to.
+
+    The ``REDISTOGO_URL`` environment variable takes precedence over the given
+    hostname and port, as is customary on Platform-as-a-Service Providers.
+
+    Args:
+        hostname (str): A hostname for a Redis instance.
+        port (int): A port for a Redis instance.
+
+    Returns:
+        str: A URL of the form ``redis://[:password@]hostname:port[/db]``.
+    """
+
+    return os.getenv("REDISTOGO_URL", "redis://%s:%s" % (hostname, port))
+
+
+def from_hash(fields):
+    """Converts a credentials hash read from Redis back into credentials.
+
+    Args:
+        fields (dict): The hash, with field names and values as bytes.
+
+    Returns:
+        dict: The network credentials.
+    """
+
+    credentials = { key.decode() : value.decode()
+                    for key, value in fields.items() }
+    credentials["port"] = int(credentials["port"])
+    credentials["password"] = credentials.get("password") or None
+    credentials["tls"] = credentials.get("tls") == "1"
+    return credentials
 
 
 class Datastore(object):
@@ -33,8 +85,8 @@ class Datastore(object):
             port (int): A port for a Redis instance.
         """
 
-        if hostname and port: redis_url = "redis://%s:%s" % (hostname, port)
-        self.database = redis.from_url(os.getenv("REDISTOGO_URL", redis_url))
+        self.url = redis_url(hostname, port)
+        self.database = redis.from_url(self.url)
 
     def get_networks(self):
         """Retrieves all connected networks from Redis.
@@ -47,11 +99,12 @@ class Datastore(object):
             dict: A dictionary of network credentials.
         """
 
-        networks = {}
-        for key in self.database.keys("network=*"):
-            val = json.loads(self.database.get(key).decode())
-            networks[key.decode().split("=")[1]] = val
-        return networks
+        names = sorted(name.decode() for name in
+                       self.database.smembers("networks"))
+        pipeline = self.database.pipeline(transaction=False)
+        for name in names: pipeline.hgetall("network:" + name)
+        return { name : from_hash(fields) for name, fields in
+                 zip(names, pipeline.execute()) if fields }
 
     def get_channels(self, network=""):
         """Retrieves all connected channels from Redis.
@@ -68,10 +121,16 @@ class Datastore(object):
             dict: A dictionary of channel credentials.
         """
 
+        names = [network] if network else sorted(
+            name.decode() for name in self.database.smembers("networks"))
+        pipeline = self.database.pipeline(transaction=False)
+        for name in names: pipeline.hgetall("channels:" + name)
+
         channels = {}
-        for key in self.database.keys("".join(["channel=", network, "*"])):
-            password = self.database.get(key).decode() or None
-            channels[key.decode().split("=")[1]] = password
+        for name, fields in zip(names, pipeline.execute()):
+            for channel, password in fields.items():
+                key = "".join([name, ":", channel.decode()])
+                channels[key] = password.decode() or None
         return channels
 
     def get_password(self):
@@ -110,7 +169,7 @@ class Datastore(object):
 
     def add_network(self, network, hostname, port,
                     nickname, username, realname,
-                    password=None, usermode=0):
+                    password=None, usermode=0, tls=False):
         """Adds a network to the Redis instance.
 
         Args:
@@ -122,6 +181,8 @@ class Datastore(object):
             realname (str): The real name of the user.
             password (str, optional): Bouncer password. Defaults to ``None``.
             usermode (int, optional): The IRC usermode. Defaults to ``0``.
+            tls (bool, optional): Whether to connect over TLS. Defaults to
+                ``False``.
         """
 
         credentials = { "network"  : network,
@@ -130,10 +191,13 @@ class Datastore(object):
                         "realname" : realname,
                         "hostname" : hostname,
                         "port"     : port,
-                        "password" : password }
+                        "password" : password or "",
+                        "tls"      : "1" if tls else "" }
 
-        key = "".join(["network=", network])
-        self.database.set(key, json.dumps(credentials))
+        pipeline = self.database.pipeline()
+        pipeline.hmset("network:" + network, credentials)
+        pipeline.sadd("networks", network)
+        pipeline.execute()
 
     def remove_network(self, network, hard=True):
         """Removes a network from Redis.
@@ -143,13 +207,12 @@ class Datastore(object):
             hard (bool): When True, clears all associated channels.
         """
 
-        key = "".join(["network=", network])
-        self.database.delete(key)
+        pipeline = self.database.pipeline()
+        pipeline.delete("network:" + network)
         if hard:
-            channels = self.get_channels(network)
-            for channel in channels.keys():
-                info = channel.split(":")
-                self.remove_channel(info[0], info[1])
+            pipeline.delete("channels:" + network)
+            pipeline.srem("networks", network)
+        pipeline.execute()
 
     def add_channel(self, network, channel, password=""):
         """Adds a channel to the Redis.
@@ -160,8 +223,10 @@ class Datastore(object):
             password (str, optional): The channel password. Defaults to ``""``.
         """
 
-        key = "".join(["channel=", network, ":", channel])
-        self.database.set(key, password or "")
+        pipeline = self.database.pipeline()
+        pipeline.hset("channels:" + network, channel, password or "")
+        pipeline.sadd("networks", network)
+        pipeline.execute()
 
     def remove_channel(self, network, channel):
         """Removes a channel from Redis.
@@ -171,5 +236,572 @@ class Datastore(object):
             channel (str): The name of a channel.
         """
 
-        key = "".join(["channel=", network, ":", channel])
-        self.database.delete(key)
+        self.database.hdel("channels:" + network, channel)
+
+    def migrate(self):
+        """Converts data saved under the original key scheme, if any.
+
+        Earlier versions saved each network as ``network=<network>`` holding a
+        JSON document, and each channel as ``channel=<network>:<channel>``
+        holding its password. These are rewritten into the current layout and
+        deleted. A version marker ensures that the keyspace is only scanned on
+        the first start after upgrading.
+        """
+
+        if self.database.get("datastore:version") == b"2": return
+
+        for key in self.database.scan_iter("network=*"):
+            credentials = json.loads(self.database.get(key).decode())
+            self.add_network(**credentials)
+            self.database.delete(key)
+
+        for key in self.database.scan_iter("channel=*"):
+            network, channel = key.decode()[8:].split(":", 1)
+            self.add_channel(network, channel,
+                             self.database.get(key).decode())
+            self.database.delete(key)
+
+        self.database.set("datastore:version", 2)
+
+
+class WriteBehind(object):
+    """A buffer that collapses and batches channel writes.
+
+    Clients save and forget channels as they join and part them, which can
+    produce a storm of single-key writes when a Client joins many channels at
+    once, or a script cycles through them. The WriteBehind holds these writes
+    briefly, keeping only the latest operation on each channel, and writes
+    them in a single transaction once a timer expires or enough have built up.
+
+    Should the connection to Redis be lost, a batch is returned to the pending
+    writes, unless a channel has been written again since, and its writes are
+    retried by the next flush.
+
+    Attributes:
+        datastore (sputnik.AsyncDatastore): The Datastore to write to.
+        interval (float): The maximum time, in seconds, to hold a write.
+        limit (int): The number of pending writes that forces a flush.
+        pending (dict): The password of each pending channel, or ``None``
+            for a channel that is to be removed, keyed by network and channel.
+        writing (list of dict): Batches written, but not yet acknowledged.
+    """
+
+    def __init__(self, datastore, interval=1.0, limit=100):
+        """Creates an instance of a WriteBehind.
+
+        Args:
+            datastore (sputnik.AsyncDatastore): The Datastore to write to.
+            interval (float, optional): The maximum time to hold a write.
+                Defaults to ``1.0``.
+            limit (int, optional): The number of pending writes that forces a
+                flush. Defaults to ``100``.
+        """
+
+        self.datastore = datastore
+        self.interval = interval
+        self.limit = limit
+        self.pending = {}
+        self.writing = []
+        self.timer = None
+        self.flushed = None
+
+    def __len__(self):
+        return len(self.pending)
+
+    def write(self, network, channel, password):
+        """Holds a write to a channel, replacing any earlier pending write.
+
+        Args:
+            network (str): The name of a network.
+            channel (str): The name of a channel.
+            password (str): The channel password, or ``None`` to remove it.
+
+        Returns:
+            asyncio.Future: A future that resolves once the write is flushed.
+        """
+
+        loop = asyncio.get_event_loop()
+        if self.flushed is None: self.flushed = asyncio.Future(loop=loop)
+        flushed = self.flushed
+
+        self.pending[(network, channel)] = password
+        if len(self.pending) >= self.limit: self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.interval, self.flush)
+        return flushed
+
+    def discard(self, network):
+        """Drops pending writes to the channels of a network.
+
+        Args:
+            network (str): The name of a network.
+        """
+
+        for batch in [self.pending] + self.writing:
+            for key in [key for key in batch if key[0] == network]:
+                del batch[key]
+
+    def take(self):
+        """Takes the pending writes, to be written as a single batch.
+
+        Returns:
+            dict: The pending writes, keyed by network and channel.
+        """
+
+        if self.timer: self.timer.cancel()
+        self.timer = None
+        pending, self.pending = self.pending, {}
+        return pending
+
+    def restore(self, batch, flushed):
+        """Returns a batch that could not be written to the pending writes.
+
+        A channel written again since the batch was taken keeps its newer
+        write. The future for the batch resolves once the next flush does.
+
+        Args:
+            batch (dict): The writes, keyed by network and channel.
+            flushed (asyncio.Future): The future for the batch.
+        """
+
+        for key, password in batch.items():
+            self.pending.setdefault(key, password)
+
+        if self.flushed is None: self.flushed = flushed
+        else:
+            def chain(future):
+                if flushed.done(): return
+                if future.exception():
+                    flushed.set_exception(future.exception())
+                else: flushed.set_result(None)
+            self.flushed.add_done_callback(chain)
+
+    @staticmethod
+    def commands(batch):
+        """Returns the commands that make a batch of writes.
+
+        Args:
+            batch (dict): The writes, keyed by network and channel.
+
+        Returns:
+            list of tuple: Redis commands, each a tuple of its arguments.
+        """
+
+        commands = []
+        for (network, channel), password in sorted(batch.items()):
+            key = "channels:" + network
+            if password is None: commands.append(("HDEL", key, channel))
+            else: commands.append(("HSET", key, channel, password))
+        for network in sorted(set(network for network, _ in batch)):
+            commands.append(("SADD", "networks", network))
+        return commands
+
+    def flush(self):
+        """Writes every pending write in a single pipelined transaction.
+
+        The batch is held until Redis acknowledges the transaction, and is
+        restored to the pending writes should the connection be lost first.
+
+        Returns:
+            asyncio.Future: A future that resolves once the writes complete.
+        """
+
+        flushed, self.flushed = self.flushed, None
+        batch = self.take()
+        if not batch:
+            if flushed and not flushed.done(): flushed.set_result(None)
+            return flushed
+
+        self.writing.append(batch)
+        replies = [self.datastore.execute("MULTI")]
+        replies.extend(self.datastore.execute(*command)
+                       for command in self.commands(batch))
+        replies.append(self.datastore.execute("EXEC"))
+
+        def done(replies):
+            self.writing.remove(batch)
+            reply = replies.result()[-1]
+            if isinstance(reply, ConnectionError):
+                self.restore(batch, flushed)
+            elif flushed.done(): return
+            elif isinstance(reply, Exception): flushed.set_exception(reply)
+            else: flushed.set_result(None)
+        replies = asyncio.gather(*replies, return_exceptions=True)
+        replies.add_done_callback(done)
+        return flushed
+
+    def flush_sync(self):
+        """Writes every pending write, blocking until they are complete.
+
+        This is used on shutdown, once the event loop has stopped, so that no
+        saved or forgotten channel is lost.
+        """
+
+        self.flushed = None
+        commands = self.commands(self.take())
+        if not commands: return
+
+        pipeline = self.datastore.sync.database.pipeline()
+        for command in commands: pipeline.execute_command(*command)
+        pipeline.execute()
+
+
+class AsyncDatastore(object):
+    """A non-blocking counterpart to the Datastore.
+
+    The AsyncDatastore offers the same operations as the Datastore, but talks
+    to Redis through asyncio, so that a Redis round trip never stalls traffic
+    for the connected Networks and Clients. Every command issued during one
+    iteration of the event loop is pipelined into a single round trip.
+
+    Operations that need a single command return the Future for its reply,
+    so writes may either be waited upon or left to complete in the background.
+    Operations that need several commands are coroutines. The blocking
+    Datastore remains available as the ``sync`` attribute, for use before the
+    event loop is running.
+
+    Channel writes are held by a WriteBehind, and made in batches. Reading
+    channels flushes any pending writes first, so reads always observe them.
+
+    The encrypted Bouncer password is cached once read, and password hashing
+    runs on a small thread pool, so that logins never stall the event loop.
+
+    Should the connection to Redis be lost, commands fail with a
+    ConnectionError until it has been made again, which is retried with
+    exponential backoff. Channel writes are held meanwhile, and flushed once
+    the connection is made again.
+
+    Attributes:
+        attempts (int): The consecutive failed attempts to reconnect.
+        connection (sputnik.RedisProtocol): The connection to Redis.
+        executor (concurrent.futures.Executor): Hashes passwords.
+        hashed (str): The cached encrypted Bouncer password, or ``None``.
+        sync (sputnik.Datastore): A blocking Datastore for the same instance.
+        writes (sputnik.WriteBehind): Pending channel writes.
+    """
+
+    def __init__(self, hostname, port):
+        """Creates an instance of an AsyncDatastore.
+
+        The connection itself is made by ``connect``.
+
+        Args:
+            hostname (str): A hostname for a Redis instance.
+            port (int): A port for a Redis instance.
+        """
+
+        self.sync = Datastore(hostname, port)
+        self.connection = RedisProtocol(self.lost)
+        self.attempts = 0
+        self.writes = WriteBehind(
+            self, interval=float(os.getenv("SPUTNIK_SAVE_INTERVAL", 1.0)),
+            limit=int(os.getenv("SPUTNIK_SAVE_BATCH", 100)))
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=int(os.getenv("SPUTNIK_HASH_WORKERS", 2)))
+        self.hashed = None
+        self.verified = None
+        self.secret = os.urandom(32)
+
+    @asyncio.coroutine
+    def connect(self):
+        """Connects to Redis, authenticating and selecting the database.
+
+        A lost connection is replaced once the new one is made, so that until
+        then, commands keep failing rather than waiting on it.
+        """
+
+        url = urllib.parse.urlparse(self.sync.url)
+        loop = asyncio.get_event_loop()
+        connection = self.connection
+        if connection.closed: connection = RedisProtocol()
+        yield from loop.create_connection(lambda: connection,
+                                          url.hostname or "localhost",
+                                          url.port or 6379)
+        connection.lost = self.lost
+        self.connection = connection
+        if url.password: yield from self.execute("AUTH", url.password)
+        if url.path.strip("/"):
+            yield from self.execute("SELECT", url.path.strip("/"))
+
+    def lost(self, exc):
+        """Reconnects to Redis once the connection is lost.
+
+        Args:
+            exc (Exception): The reason the connection was lost, or ``None``.
+        """
+
+        logger.warning("Lost Redis Connection: %s", exc)
+        asyncio.async(self.reconnect())
+
+    @asyncio.coroutine
+    def reconnect(self, base=0.5, cap=30.0):
+        """Connects to Redis again, backing off exponentially between tries.
+
+        Args:
+            base (float, optional): The seconds before the first attempt.
+                Defaults to ``0.5``.
+            cap (float, optional): The most seconds between attempts.
+                Defaults to ``30.0``.
+        """
+
+        self.attempts = 0
+        while True:
+            yield from asyncio.sleep(min(cap, base * 2 ** self.attempts))
+            try: yield from self.connect()
+            except OSError as exc:
+                self.attempts += 1
+                logger.warning("Redis Reconnect Failed: %s", exc)
+                continue
+            logger.info("Reconnected to Redis")
+            self.attempts = 0
+            if self.writes: self.writes.flush()
+            return
+
+    def execute(self, *args):
+        """Issues a Redis command in the next pipelined write.
+
+        Args:
+            args (list): The command name and its arguments.
+
+        Returns:
+            asyncio.Future: A future that resolves to the reply.
+        """
+
+        future = self.connection.execute(*args)
+        metrics.time_command(args[0], future)
+        return future
+
+    @asyncio.coroutine
+    def get_networks(self):
+        """Retrieves all connected networks from Redis.
+
+        Returns:
+            dict: A dictionary of network credentials.
+        """
+
+        names = yield from self.execute("SMEMBERS", "networks")
+        names = sorted(name.decode() for name in names)
+        replies = yield from asyncio.gather(*[
+            self.execute("HGETALL", "network:" + name) for name in names])
+        return { name : from_hash(dict(zip(reply[::2], reply[1::2])))
+                 for name, reply in zip(names, replies) if reply }
+
+    @asyncio.coroutine
+    def load(self):
+        """Retrieves every network and its channels from Redis at once.
+
+        After the set of network names is read, the credentials and channels
+        of every network are requested in the same iteration of the event
+        loop, so loading any number of networks takes two round trips.
+
+        Returns:
+            dict: Network names, each with a tuple of its credentials and a
+            dictionary of its channel names and passwords.
+        """
+
+        if self.writes: self.writes.flush()
+        names = yield from self.execute("SMEMBERS", "networks")
+        names = sorted(name.decode() for name in names)
+        replies = yield from asyncio.gather(*[
+            self.execute("HGETALL", prefix + name)
+            for name in names for prefix in ("network:", "channels:")])
+
+        networks = {}
+        for name, credentials, channels in zip(names, replies[::2],
+                                               replies[1::2]):
+            if not credentials: continue
+            networks[name] = (
+                from_hash(dict(zip(credentials[::2], credentials[1::2]))),
+                { channel.decode() : password.decode() or None for
+                  channel, password in zip(channels[::2], channels[1::2]) })
+        return networks
+
+    @asyncio.coroutine
+    def get_channels(self, network=""):
+        """Retrieves all connected channels from Redis.
+
+        Args:
+            network (str, optional): The name of a network. Defaults to ``""``.
+
+        Returns:
+            dict: A dictionary of channel credentials.
+        """
+
+        if self.writes: self.writes.flush()
+        if network: names = [network]
+        else:
+            names = yield from self.execute("SMEMBERS", "networks")
+            names = sorted(name.decode() for name in names)
+        replies = yield from asyncio.gather(*[
+            self.execute("HGETALL", "channels:" + name) for name in names])
+
+        channels = {}
+        for name, reply in zip(names, replies):
+            for channel, password in zip(reply[::2], reply[1::2]):
+                key = "".join([name, ":", channel.decode()])
+                channels[key] = password.decode() or None
+        return channels
+
+    @asyncio.coroutine
+    def get_password(self):
+        """Retrieves the Bouncer password, from Redis only the first time.
+
+        Returns:
+            str: The encrypted Bouncer password.
+        """
+
+        if self.hashed is None:
+            password = yield from self.execute("GET",
+                                               "password=bouncer:password")
+            self.hashed = password.decode() if password else None
+        return self.hashed
+
+    def forget_password(self):
+        """Discards the cached password, once another process changes it."""
+
+        self.hashed = None
+        self.verified = None
+
+    def digest(self, password):
+        """Returns a keyed digest of a password, to remember it as verified."""
+
+        return hmac.new(self.secret, password.encode(), "sha256").digest()
+
+    def is_verified(self, password_attempt):
+        """Checks whether an attempt matches a password already verified.
+
+        This costs a single HMAC, so it may be checked before deciding to
+        spend a bcrypt hash on an attempt.
+
+        Args:
+            password_attempt (str): The password attempt.
+
+        Returns:
+            bool: Whether the attempt is known to match.
+        """
+
+        return bool(self.verified) and hmac.compare_digest(
+            self.digest(password_attempt), self.verified)
+
+    @asyncio.coroutine
+    def set_password(self, password="cosmonaut"):
+        """Saves a new Bouncer password to Redis.
+
+        The password is hashed by the executor, rather than the event loop.
+
+        Args:
+            password (str, optional): The new password for the Bouncer.
+        """
+
+        loop = asyncio.get_event_loop()
+        hashed = yield from loop.run_in_executor(
+            self.executor, bcrypt.hashpw, password.encode(), bcrypt.gensalt())
+        yield from self.execute("SET", "password=bouncer:password", hashed)
+        self.hashed = hashed.decode()
+        self.verified = None
+
+    @asyncio.coroutine
+    def check_password(self, password_attempt):
+        """Checks a password attempt against the Bouncer password.
+
+        Bcrypt is deliberately slow, so each attempt is hashed by the
+        executor, leaving the event loop free to relay traffic. Once an
+        attempt succeeds, a keyed digest of it is remembered, so that later
+        logins with the same password need no hashing at all, until the
+        password changes.
+
+        Args:
+            password_attempt (str): The password attempt.
+
+        Returns:
+            bool: Whether the password matched.
+        """
+
+        if self.is_verified(password_attempt): return True
+        password = yield from self.get_password()
+        if not password: return False
+        loop = asyncio.get_event_loop()
+        attempt = yield from loop.run_in_executor(
+            self.executor, bcrypt.hashpw, password_attempt.encode(),
+            password.encode())
+        matched = hmac.compare_digest(attempt, password.encode())
+        if matched and password == self.hashed:
+            self.verified = self.digest(password_attempt)
+        return matched
+
+    def add_network(self, network, hostname, port,
+                    nickname, username, realname,
+                    password=None, usermode=0, tls=False):
+        """Adds a network to the Redis instance.
+
+        Args:
+            network (str): The name of the IRC network to connect to.
+            hostname (str): The hostname of the IRC network to connect to.
+            port (int): The port to connect using.
+            nickname (str): The IRC nickname to use when connecting.
+            username (str): The IRC ident to use when connecting.
+            realname (str): The real name of the user.
+            password (str, optional): Bouncer password. Defaults to ``None``.
+            usermode (int, optional): The IRC usermode. Defaults to ``0``.
+            tls (bool, optional): Whether to connect over TLS. Defaults to
+                ``False``.
+
+        Returns:
+            asyncio.Future: A future that resolves once the write completes.
+        """
+
+        credentials = [ "network",  network,
+                        "nickname", nickname,
+                        "username", username,
+                        "realname", realname,
+                        "hostname", hostname,
+                        "port",     port,
+                        "password", password or "",
+                        "tls",      "1" if tls else "" ]
+
+        self.execute("SADD", "networks", network)
+        return self.execute("HMSET", "network:" + network, *credentials)
+
+    def remove_network(self, network, hard=True):
+        """Removes a network from Redis.
+
+        Args:
+            network (str): The name of a network to remove.
+            hard (bool): When True, clears all associated channels.
+
+        Returns:
+            asyncio.Future: A future that resolves once the writes complete.
+        """
+
+        if hard:
+            self.writes.discard(network)
+            self.execute("DEL", "channels:" + network)
+            self.execute("SREM", "networks", network)
+        return self.execute("DEL", "network:" + network)
+
+    def add_channel(self, network, channel, password=""):
+        """Adds a channel to the Redis, once pending writes are flushed.
+
+        Args:
+            network (str): The name of a network.
+            channel (str): The name of a channel.
+            password (str, optional): The channel password. Defaults to ``""``.
+
+        Returns:
+            asyncio.Future: A future that resolves once the write is flushed.
+        """
+
+        return self.writes.write(network, channel, password or "")
+
+    def remove_channel(self, network, channel):
+        """Removes a channel from Redis, once pending writes are flushed.
+
+        Args:
+            network (str): The name of a network.
+            channel (str): The name of a channel.
+
+        Returns:
+            asyncio.Future: A future that resolves once the write is flushed.
+        """
+
+        return self.writes.write(network, channel, None)
@@ -3,10 +3,45 @@
 This module provides Tornado Request Handlers for the Sputnik Web Interface.
 """
 
+import asyncio
+import metrics
+import time
+import tornado.gen
+import tornado.platform.asyncio
 import tornado.web
 import os
 
 
+def parse_address(address):
+    """Splits a network address into its hostname, port, and use of TLS.
+
+    As is customary for IRC, a port prefixed with ``+`` is reached over TLS,
+    e.g. ``irc.example.net:+6697``.
+
+    Args:
+        address (str): An address of the form ``hostname:[+]port``.
+
+    Returns:
+        tuple: The hostname, the port, and whether to connect over TLS.
+    """
+
+    hostname, port = address.rsplit(":", 1)
+    return hostname, port.lstrip("+"), port.startswith("+")
+
+
+def wait(coroutine):
+    """Wraps an asyncio coroutine, so that a Tornado coroutine may yield it.
+
+    Args:
+        coroutine (coroutine): An asyncio coroutine.
+
+    Returns:
+        tornado.concurrent.Future: A future that resolves to its result.
+    """
+
+    return tornado.platform.asyncio.to_tornado_future(asyncio.async(coroutine))
+
+
 class BaseHandler(tornado.web.RequestHandler):
     """A base handler that stores the Bouncer singleton."""
 
@@ -86,7 +121,7 @@ class EditHandler(BaseHandler):
         realname = self.get_argument("realname")
         ident = self.get_argument("ident")
         password = self.get_argument("password")
-        hostname, port = network_address.split(":")
+        hostname, port, tls = parse_address(network_address)
 
         self.bouncer.add_network(network=network_name,
                                  hostname=hostname,
@@ -94,11 +129,37 @@ class EditHandler(BaseHandler):
                                  nickname=nickname,
                                  realname=realname,
                                  username=ident,
-                                 password=password)
+                                 password=password,
+                                 tls=tls)
 
         self.redirect("/")
 
 
+class ChannelsHandler(BaseHandler):
+    """The RequestHandler that serves the channels page of a network.
+
+    The channels page lists the channels joined on a network, with their
+    topics and members, as tracked by the Network, so showing it involves no
+    requests to the IRC network. Networks owned by the Workers of a
+    Supervisor report their channels without their members.
+    """
+
+    @tornado.web.authenticated
+    @tornado.web.addslash
+    def get(self, network_name):
+        """Renders the channels page.
+
+        Args:
+            network_name (str): Network name of the network to show.
+        """
+
+        network = self.bouncer.networks[network_name]
+        channels = network.roster() if hasattr(network, "roster") \
+            else network.channels
+        self.render("channels.html", network=network, channels=channels,
+                    **self.env)
+
+
 class DeleteHandler(BaseHandler):
     """The RequestHandler that handles delete network requests."""
 
@@ -148,7 +209,7 @@ class AddHandler(BaseHandler):
         nickname = self.get_argument("nickname")
         ident = self.get_argument("ident")
         password = self.get_argument("password")
-        hostname, port = network_address.split(":")
+        hostname, port, tls = parse_address(network_address)
 
         if network_name not in self.bouncer.networks:
             self.bouncer.add_network(network=network_name,
@@ -157,11 +218,65 @@ class AddHandler(BaseHandler):
                                      nickname=nickname,
                                      username=ident,
                                      realname=ident,
-                                     password=password)
+                                     password=password,
+                                     tls=tls)
 
         self.redirect("/")
 
 
+class MetricsHandler(BaseHandler):
+    """The RequestHandler that serves metrics to Prometheus.
+
+    Metrics are served without authentication, so that they may be scraped.
+    """
+
+    def get(self):
+        """Renders every metric in the Prometheus text format."""
+
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.write(metrics.render(self.bouncer))
+
+
+class ProfileHandler(BaseHandler):
+    """The RequestHandler that serves the profiler page.
+
+    The profiler page starts and stops the sampling profiler, and shows the
+    functions it has most often seen running.
+    """
+
+    @tornado.web.authenticated
+    @tornado.web.addslash
+    def get(self):
+        """Renders the profiler page."""
+
+        self.render("profile.html", profiler=self.bouncer.profiler,
+                    **self.env)
+
+    @tornado.web.authenticated
+    @tornado.web.addslash
+    def post(self):
+        """Handles requests to start or stop the profiler."""
+
+        if self.get_argument("action") == "start":
+            self.bouncer.profiler.start()
+        else: self.bouncer.profiler.stop()
+        self.redirect("/profile/")
+
+
+class ProfileDownloadHandler(BaseHandler):
+    """The RequestHandler that serves the profile as collapsed stacks."""
+
+    @tornado.web.authenticated
+    def get(self):
+        """Sends the samples taken so far, for rendering as a flame graph."""
+
+        name = time.strftime("sputnik-%Y%m%d-%H%M%S.collapsed")
+        self.set_header("Content-Type", "text/plain")
+        self.set_header("Content-Disposition",
+                        "attachment; filename=%s" % name)
+        self.write(self.bouncer.profiler.collapsed())
+
+
 class LoginHandler(BaseHandler):
     """The RequestHandler that serves the login page.
 
@@ -179,15 +294,21 @@ class LoginHandler(BaseHandler):
         self.render("login.html",  **self.env)
 
     @tornado.web.addslash
+    @tornado.gen.coroutine
     def post(self):
         """Handles login requests.
 
         Checks the password against the stored password and authenticates.
+        Attempts are limited per address, and the password is checked off the
+        event loop.
         """
 
         password = self.get_argument("password")
+        datastore = self.bouncer.datastore
 
-        if self.bouncer.datastore.check_password(password):
+        if (datastore.is_verified(password) or
+            self.bouncer.logins.allow(self.request.remote_ip)) and \
+           (yield wait(datastore.check_password(password))):
             self.set_secure_cookie("user", "securestringneeded")
 
         self.redirect("/")
@@ -229,6 +350,7 @@ class SettingsHandler(BaseHandler):
 
     @tornado.web.authenticated
     @tornado.web.addslash
+    @tornado.gen.coroutine
     def post(self):
         """Handles settings requests.
 
@@ -240,7 +362,9 @@ class SettingsHandler(BaseHandler):
         new_1 = self.get_argument("new-password-1")
         new_2 = self.get_argument("new-password-2")
 
-        if self.bouncer.datastore.check_password(current) and new_1 == new_2:
-            self.bouncer.datastore.set_password(new_1)
+        if new_1 == new_2 and \
+           self.bouncer.logins.allow(self.request.remote_ip) and \
+           (yield wait(self.bouncer.datastore.check_password(current))):
+            yield wait(self.bouncer.change_password(new_1))
 
         self.render("settings.html",  **self.env)
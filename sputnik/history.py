@@ -0,0 +1,128 @@
+"""Sputnik History Implementation
+
+This module provides the Sputnik History implementation. It is a bounded ring
+buffer of encoded lines, used to hold recent traffic from an IRC network so
+that it may be replayed to Clients that were not attached when it arrived.
+"""
+
+from array import array
+
+
+class History(object):
+    """A bounded, memory-compact ring buffer of encoded lines.
+
+    Lines are copied into a single preallocated bytearray, and their offsets
+    are recorded in preallocated arrays, so the memory used by a History never
+    grows after it is created. When either the line limit or the byte limit is
+    reached, the oldest lines are evicted to make room.
+
+    Every line is identified by a sequence number, which increases by one for
+    each line appended, and carries the time at which it was appended. Readers
+    keep their own cursor, which is the sequence number of the next line they
+    have yet to read, so any number of readers may consume the same History
+    independently of one another.
+
+    Attributes:
+        first (int): The sequence number of the oldest retained line.
+        next (int): The sequence number of the next line to be appended.
+        max_lines (int): The maximum number of lines retained.
+        max_bytes (int): The maximum number of bytes retained.
+    """
+
+    def __init__(self, max_lines=1024, max_bytes=262144):
+        """Creates an instance of a History.
+
+        Args:
+            max_lines (int, optional): The maximum number of lines retained.
+                Defaults to ``1024``.
+            max_bytes (int, optional): The maximum number of bytes retained.
+                Defaults to ``262144``.
+        """
+
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.first = 0
+        self.next = 0
+
+        self.head = 0
+        self.data = bytearray(max_bytes)
+        self.view = memoryview(self.data)
+        self.starts = array("L", [0]) * max_lines
+        self.ends = array("L", [0]) * max_lines
+        self.times = array("Q", [0]) * max_lines
+
+    def __len__(self):
+        return self.next - self.first
+
+    def append(self, line, timestamp=0):
+        """Appends an encoded line, evicting the oldest lines if needed.
+
+        Lines are never split across the end of the buffer. If a line does not
+        fit before the end, the remaining space is left unused and the line is
+        written at the start instead. Lines longer than the byte limit cannot
+        be stored, and are ignored.
+
+        Args:
+            line (bytes): An encoded line, including its line ending.
+            timestamp (int, optional): The time of the line, in milliseconds.
+                Defaults to ``0``.
+        """
+
+        size = len(line)
+        if size > self.max_bytes: return
+
+        if self.next - self.first == self.max_lines: self.first += 1
+
+        # The region being claimed runs from the head to the end of the line,
+        # including any space skipped over at the end of the buffer.
+        if self.head + size <= self.max_bytes: start, span = self.head, size
+        else: start, span = 0, self.max_bytes - self.head + size
+
+        while self.first < self.next:
+            distance = (self.starts[self.first % self.max_lines] -
+                        self.head) % self.max_bytes
+            if distance >= span: break
+            self.first += 1
+
+        slot = self.next % self.max_lines
+        self.data[start:start+size] = line
+        self.starts[slot] = start
+        self.ends[slot] = start + size
+        self.times[slot] = timestamp
+        self.head = start + size
+        self.next += 1
+
+    def read(self, cursor):
+        """Returns all lines from a cursor onwards, without copying them.
+
+        If the cursor refers to lines that have already been evicted, reading
+        resumes from the oldest line still retained. The returned views refer
+        directly to the underlying buffer, and are only valid until the next
+        call to ``append``.
+
+        Args:
+            cursor (int): The sequence number of the first line to read.
+
+        Returns:
+            tuple: A list of memoryviews, and the cursor to read from next.
+        """
+
+        view, starts, ends = self.view, self.starts, self.ends
+        lines = [view[starts[slot]:ends[slot]] for slot in
+                 (number % self.max_lines for number in
+                  range(max(cursor, self.first), self.next))]
+        return lines, self.next
+
+    def timestamps(self, cursor):
+        """Returns the times of all lines from a cursor onwards.
+
+        Args:
+            cursor (int): The sequence number of the first line.
+
+        Returns:
+            list of int: The times of the lines, in milliseconds.
+        """
+
+        times = self.times
+        return [times[number % self.max_lines] for number in
+                range(max(cursor, self.first), self.next)]
@@ -0,0 +1,203 @@
+"""Sputnik Logging Implementation
+
+This module provides the Sputnik logging pipeline. Records are handed to a
+queue on the event loop, and are formatted and written in batches by a
+background thread, so that a slow or blocked output never stalls traffic.
+"""
+
+import atexit
+import logging
+import os
+import sys
+import threading
+from collections import deque
+
+N2B = logging.getLogger("sputnik.traffic.n2b")
+B2C = logging.getLogger("sputnik.traffic.b2c")
+C2B = logging.getLogger("sputnik.traffic.c2b")
+DIRECTIONS = { "n2b" : N2B, "b2c" : B2C, "c2b" : C2B }
+
+
+class NetworkFilter(logging.Filter):
+    """Passes traffic records only for a set of networks.
+
+    Attributes:
+        networks (set of str): The names of the networks to pass.
+    """
+
+    def __init__(self, networks):
+        """Creates an instance of a NetworkFilter.
+
+        Args:
+            networks (iterable of str): The names of the networks to pass.
+        """
+
+        super().__init__()
+        self.networks = set(networks)
+
+    def filter(self, record):
+        return getattr(record, "network", None) in self.networks
+
+
+class Handler(logging.Handler):
+    """A Handler that queues records for the Writer.
+
+    Records are appended to a deque as they are, without taking the handler
+    lock. Every argument logged by the Bouncer is immutable, so the cost of
+    formatting may safely be paid later, on the Writer thread. The deque is
+    bounded, so should the Writer fall behind, the oldest records are dropped
+    and counted, rather than held without limit.
+
+    Attributes:
+        records (collections.deque): Records waiting to be written.
+        dropped (int): The number of records dropped from a full deque.
+    """
+
+    def __init__(self, records):
+        """Creates an instance of a Handler.
+
+        Args:
+            records (collections.deque): Records waiting to be written.
+        """
+
+        super().__init__()
+        self.records = records
+        self.dropped = 0
+
+    def handle(self, record):
+        if self.filter(record): self.emit(record)
+
+    def emit(self, record):
+        records = self.records
+        if len(records) == records.maxlen: self.dropped += 1
+        records.append(record)
+
+
+class Writer(threading.Thread):
+    """A background thread that writes queued records in batches.
+
+    The thread wakes periodically, rather than for every record, and writes
+    every record waiting in the queue in a single call. The event loop never
+    waits on the thread, and is rarely interrupted by it.
+
+    Attributes:
+        records (collections.deque): Records waiting to be written.
+        stream (file): The stream that records are written to.
+        formatter (logging.Formatter): Formats each record.
+        interval (float): The seconds between batches.
+        handler (sputnik.Handler): Counts the records dropped, or ``None``.
+        reported (int): The number of dropped records already reported.
+    """
+
+    def __init__(self, records, stream, formatter, interval=0.1,
+                 handler=None):
+        """Creates an instance of a Writer.
+
+        Args:
+            records (collections.deque): Records waiting to be written.
+            stream (file): The stream that records are written to.
+            formatter (logging.Formatter): Formats each record.
+            interval (float, optional): The seconds between batches.
+                Defaults to ``0.1``.
+            handler (sputnik.Handler, optional): Counts the records dropped,
+                which are reported with each batch. Defaults to ``None``.
+        """
+
+        super().__init__(name="sputnik-log", daemon=True)
+        self.records = records
+        self.stream = stream
+        self.formatter = formatter
+        self.interval = interval
+        self.handler = handler
+        self.reported = 0
+        self.stopping = threading.Event()
+
+    def run(self):
+        """Writes batches of records until the Writer is stopped."""
+
+        while not self.stopping.wait(self.interval): self.write()
+        self.write()
+
+    def write(self):
+        """Formats and writes every record waiting in the queue."""
+
+        records, lines = self.records, []
+        while records:
+            lines.append(self.formatter.format(records.popleft()) + "\n")
+        dropped = self.handler.dropped if self.handler else 0
+        if dropped > self.reported:
+            count, self.reported = dropped - self.reported, dropped
+            lines.append("Dropped %d Log Records\n" % count)
+        if not lines: return
+
+        try:
+            self.stream.write("".join(lines))
+            self.stream.flush()
+        except Exception: pass
+
+    def stop(self):
+        """Writes any remaining records, then stops the thread."""
+
+        self.stopping.set()
+        if self.is_alive(): self.join()
+
+
+def configure(level=None, traffic=None, networks=None, stream=None,
+              limit=None):
+    """Configures the Sputnik loggers, and starts a Writer.
+
+    Traffic lines are logged at the ``DEBUG`` level, in each direction, to the
+    ``n2b`` (Network to Bouncer), ``b2c`` (Bouncer to Client), and ``c2b``
+    (Client to Bouncer) traffic loggers. Each direction is only logged if it
+    is enabled, regardless of the level, so that traffic nobody reads costs
+    no more than a level check.
+
+    Args:
+        level (str, optional): The minimum level of records to write.
+            Defaults to ``SPUTNIK_LOG_LEVEL``, or ``"INFO"``.
+        traffic (list of str, optional): The traffic directions to log.
+            Defaults to ``SPUTNIK_LOG_TRAFFIC``, or no traffic.
+        networks (list of str, optional): The networks to log traffic for.
+            Defaults to ``SPUTNIK_LOG_NETWORKS``, or every network.
+        stream (file, optional): The stream to write to. Defaults to
+            ``sys.stdout``.
+        limit (int, optional): The most records waiting to be written.
+            Defaults to ``SPUTNIK_LOG_BUFFER``, or ``65536``.
+
+    Returns:
+        sputnik.Writer: The started Writer, which is stopped at exit.
+    """
+
+    if level is None: level = os.getenv("SPUTNIK_LOG_LEVEL", "INFO")
+    if traffic is None:
+        traffic = os.getenv("SPUTNIK_LOG_TRAFFIC", "").split(",")
+    if networks is None:
+        networks = os.getenv("SPUTNIK_LOG_NETWORKS", "").split(",")
+    networks = [network for network in networks if network]
+    if limit is None: limit = int(os.getenv("SPUTNIK_LOG_BUFFER", 65536))
+
+    # The process and thread of each record are never written, so they are
+    # not looked up for every record either. Nor is the caller written.
+    logging.logProcesses = logging.logThreads = logging.logMultiprocessing = 0
+
+    records = deque(maxlen=limit)
+    handler = Handler(records)
+    writer = Writer(records, stream or sys.stdout, logging.Formatter(
+        "%(asctime)s %(levelname)s %(message)s"), handler=handler)
+
+    logger = logging.getLogger("sputnik")
+    for old in list(logger.handlers): logger.removeHandler(old)
+    logger.addHandler(handler)
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+    for direction, traffic_logger in DIRECTIONS.items():
+        traffic_logger.setLevel(logging.DEBUG if direction in traffic
+                                else logging.INFO)
+        for old in list(traffic_logger.filters):
+            traffic_logger.removeFilter(old)
+        if networks: traffic_logger.addFilter(NetworkFilter(networks))
+
+    writer.start()
+    atexit.register(writer.stop)
+    return writer
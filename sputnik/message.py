@@ -0,0 +1,187 @@
+"""Sputnik Message Implementation
+
+This module provides the Sputnik Message implementation. It represents a single
+line of the IRC protocol, as described by
+_RFC 2812: https://tools.ietf.org/html/rfc2812 , extended with the message tags
+described by _IRCv3: http://ircv3.net/specs/core/message-tags-3.2.html .
+"""
+
+import calendar
+import re
+import time
+
+TAG_ESCAPES = { ":" : ";", "s" : " ", "r" : "\r", "n" : "\n", "\\" : "\\" }
+TAG_ESCAPE = re.compile(r"\\(.?)")
+
+
+def format_time(milliseconds):
+    """Formats a time as used by the IRCv3 server-time tag.
+
+    Args:
+        milliseconds (int): Milliseconds since the epoch.
+
+    Returns:
+        str: The time, e.g. ``"2015-01-01T00:00:00.000Z"``.
+    """
+
+    seconds, milliseconds = divmod(int(milliseconds), 1000)
+    return "%s.%03dZ" % (time.strftime("%Y-%m-%dT%H:%M:%S",
+                                       time.gmtime(seconds)), milliseconds)
+
+
+def parse_time(value):
+    """Parses a time as used by the IRCv3 server-time tag.
+
+    Args:
+        value (str): The time, e.g. ``"2015-01-01T00:00:00.000Z"``.
+
+    Returns:
+        int: Milliseconds since the epoch.
+
+    Raises:
+        ValueError: If the time is malformed.
+    """
+
+    seconds, _, fraction = value.rstrip("Z").partition(".")
+    seconds = calendar.timegm(time.strptime(seconds, "%Y-%m-%dT%H:%M:%S"))
+    return seconds * 1000 + int((fraction + "000")[:3])
+
+
+def add_tags(line, tags):
+    """Adds message tags to an encoded line, merging with any it has.
+
+    Args:
+        line (bytes): An encoded line.
+        tags (bytes): The tags to add, e.g. ``b"time=...;batch=1"``.
+
+    Returns:
+        bytes: The tagged line.
+    """
+
+    if line.startswith(b"@"): return b"".join([b"@", tags, b";", line[1:]])
+    return b"".join([b"@", tags, b" ", line])
+
+
+class Message(object):
+    """A single IRC message, parsed lazily.
+
+    Most lines passing through the Bouncer are relayed verbatim, and only need
+    their command inspected in order to be routed. A Message therefore only
+    finds the command when it is created, with a single split of the line in
+    the usual case, and defers splitting off the tags, prefix and parameters
+    until they are first needed. Every attribute is safe to access, even for
+    malformed lines.
+
+    Attributes:
+        line (str): The raw line, without its line ending.
+        encoded (memoryview): The line as received, ending in CRLF, or
+            ``None`` if it was not received from a transport.
+        command (str): The command, in upper case. Numerics are kept as-is.
+    """
+
+    __slots__ = ("line", "encoded", "command", "_tags", "_prefix", "_rest",
+                 "_params", "_trailing")
+
+    def __init__(self, line, encoded=None):
+        """Creates an instance of a Message.
+
+        Args:
+            line (str): A decoded line, without its line ending.
+            encoded (memoryview, optional): The line as received, ending in
+                CRLF. Defaults to ``None``.
+        """
+
+        self.line = line
+        self.encoded = encoded
+        self._tags = self._params = None
+
+        words = line.split(" ", 2)
+        first = line[:1]
+        if first == ":": command = words[1] if len(words) > 1 else ""
+        elif first == "@": command = ""
+        else: command = words[0]
+        if not command: command = self._parse_head()
+        self.command = command.upper()
+
+    def __str__(self):
+        return self.line
+
+    def __repr__(self):
+        return "Message(%r)" % self.line
+
+    def _parse_head(self):
+        """Splits off the tags, prefix and command of the message.
+
+        Returns:
+            str: The command, as it appears in the line.
+        """
+
+        line, tags, prefix = self.line, "", None
+        if line[:1] == "@":
+            tags, _, line = line[1:].partition(" ")
+            line = line.lstrip(" ")
+        if line[:1] == ":":
+            prefix, _, line = line[1:].partition(" ")
+            line = line.lstrip(" ")
+
+        command, _, self._rest = line.partition(" ")
+        self._tags, self._prefix = tags, prefix
+        return command
+
+    def _parse_params(self):
+        """Splits the parameters of the message, including any trailing."""
+
+        if self._tags is None: self._parse_head()
+        rest = self._rest
+        if rest.startswith(":"):
+            middle, separator, trailing = "", ":", rest[1:]
+        else: middle, separator, trailing = rest.partition(" :")
+
+        self._params = middle.split()
+        self._trailing = trailing if separator else None
+        if separator: self._params.append(trailing)
+
+    @property
+    def tags(self):
+        """dict: The IRCv3 message tags, with values unescaped."""
+
+        if self._tags is None: self._parse_head()
+        if not isinstance(self._tags, str): return self._tags
+
+        tags = {}
+        for tag in self._tags.split(";"):
+            key, _, value = tag.partition("=")
+            if "\\" in value:
+                value = TAG_ESCAPE.sub(lambda match: TAG_ESCAPES.get(
+                    match.group(1), match.group(1)), value)
+            if key: tags[key] = value
+        self._tags = tags
+        return tags
+
+    @property
+    def prefix(self):
+        """str: The message prefix, or ``None`` if it has none."""
+
+        if self._tags is None: self._parse_head()
+        return self._prefix
+
+    @property
+    def nick(self):
+        """str: The nickname or servername portion of the prefix."""
+
+        prefix = self.prefix
+        return prefix.split("!", 1)[0].split("@", 1)[0] if prefix else None
+
+    @property
+    def params(self):
+        """list of str: All parameters, including the trailing parameter."""
+
+        if self._params is None: self._parse_params()
+        return self._params
+
+    @property
+    def trailing(self):
+        """str: The trailing parameter, or ``None`` if it has none."""
+
+        if self._params is None: self._parse_params()
+        return self._trailing
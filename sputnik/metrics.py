@@ -0,0 +1,287 @@
+"""Sputnik Metrics Implementation
+
+This module provides the Sputnik metrics. Networks and Clients count the lines
+and bytes they carry in plain integer attributes, which cost no more than an
+addition on the hot path. Everything else is gathered only when the metrics
+are scraped, and rendered in the Prometheus text exposition format.
+"""
+
+import asyncio
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram(object):
+    """A histogram of observed values, with fixed bucket boundaries.
+
+    Counts are kept per bucket, and accumulated only when rendered, so an
+    observation is a single bisection and three additions.
+
+    Attributes:
+        buckets (tuple of float): The upper bound of each bucket.
+        counts (list of int): The observations falling in each bucket, with
+            a final bucket for observations above every bound.
+        count (int): The number of observations.
+        sum (float): The sum of every observation.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Creates an instance of a Histogram.
+
+        Args:
+            buckets (tuple of float, optional): The upper bound of each
+                bucket, in increasing order. Defaults to ``LATENCY_BUCKETS``.
+        """
+
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Records an observation.
+
+        Args:
+            value (float): The value observed.
+        """
+
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def render(self, name, labels=None):
+        """Renders the histogram as Prometheus samples.
+
+        Args:
+            name (str): The name of the metric.
+            labels (dict, optional): Labels for every sample. Defaults to
+                ``None``.
+
+        Returns:
+            list of str: The rendered samples.
+        """
+
+        labels = dict(labels or {})
+        lines, total = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            labels["le"] = str(bound)
+            lines.append(sample(name + "_bucket", labels, total))
+        del labels["le"]
+        lines.append(sample(name + "_sum", labels, self.sum))
+        lines.append(sample(name + "_count", labels, self.count))
+        return lines
+
+
+LOOP_LAG = Histogram()
+DATASTORE = {}
+
+
+class LagSampler(object):
+    """Measures how late the event loop runs a callback scheduled in advance.
+
+    A loop that is busy with other work runs timers late, so the delay
+    between when a callback was due and when it ran is the time any line
+    would have waited for the loop at that moment.
+
+    Attributes:
+        histogram (sputnik.Histogram): Receives each measured lag.
+        interval (float): The seconds between samples.
+    """
+
+    def __init__(self, histogram=LOOP_LAG, interval=0.5):
+        """Creates an instance of a LagSampler.
+
+        Args:
+            histogram (sputnik.Histogram, optional): Receives each measured
+                lag. Defaults to ``LOOP_LAG``.
+            interval (float, optional): The seconds between samples.
+                Defaults to ``0.5``.
+        """
+
+        self.histogram = histogram
+        self.interval = interval
+        self.due = None
+        self.handle = None
+
+    def start(self):
+        """Schedules the first sample."""
+
+        loop = asyncio.get_event_loop()
+        self.due = loop.time() + self.interval
+        self.handle = loop.call_at(self.due, self.tick)
+
+    def tick(self):
+        """Records the lag of this sample, and schedules the next."""
+
+        loop = asyncio.get_event_loop()
+        self.histogram.observe(max(0.0, loop.time() - self.due))
+        self.due = loop.time() + self.interval
+        self.handle = loop.call_at(self.due, self.tick)
+
+    def stop(self):
+        """Cancels the next sample."""
+
+        if self.handle: self.handle.cancel()
+        self.handle = None
+
+
+def time_command(command, future):
+    """Records the latency of a Datastore command once its reply arrives.
+
+    Args:
+        command (str): The name of the command, e.g. ``"HGETALL"``.
+        future (asyncio.Future): Resolves once the reply arrives.
+    """
+
+    histogram = DATASTORE.get(command)
+    if not histogram: histogram = DATASTORE[command] = Histogram()
+    loop = asyncio.get_event_loop()
+    started = loop.time()
+    future.add_done_callback(
+        lambda future: histogram.observe(loop.time() - started))
+
+
+def escape(value):
+    """Escapes a label value for the Prometheus text format."""
+
+    return (str(value).replace("\\", "\\\\").replace("\n", "\\n")
+            .replace('"', '\\"'))
+
+
+def sample(name, labels, value):
+    """Renders a single Prometheus sample.
+
+    Args:
+        name (str): The name of the metric.
+        labels (dict): The labels of the sample.
+        value (float): The value of the sample.
+
+    Returns:
+        str: The rendered sample.
+    """
+
+    if labels:
+        name += "{%s}" % ",".join('%s="%s"' % (key, escape(value))
+                                  for key, value in sorted(labels.items()))
+    return "%s %s" % (name, repr(float(value)) if isinstance(value, float)
+                      else value)
+
+
+def network_metrics(network):
+    """Gathers the metrics of a Network.
+
+    Args:
+        network (sputnik.Network): A Network.
+
+    Returns:
+        dict: The value of each metric, by name.
+    """
+
+    return { "lines_in"   : network.lines_in,
+             "bytes_in"   : network.bytes_in,
+             "lines_out"  : network.lines_out,
+             "bytes_out"  : network.bytes_out,
+             "queued"     : len(network.priority) + len(network.bulk),
+             "history"    : len(network.chat_history),
+             "reconnects" : network.reconnects,
+             "registered" : int(network.state == "registered") }
+
+
+def client_metrics(client):
+    """Gathers the metrics of a Client.
+
+    Args:
+        client (sputnik.Client): A Client.
+
+    Returns:
+        dict: The value of each metric, by name.
+    """
+
+    transport = client.transport
+    buffered = transport.get_write_buffer_size() if transport else 0
+    behind = client.broker.chat_history.next - client.cursor \
+        if client.broker and client.ready else 0
+    return { "lines_in"  : client.lines_in,
+             "bytes_in"  : client.bytes_in,
+             "lines_out" : client.lines_out,
+             "bytes_out" : client.bytes_out,
+             "buffered"  : buffered,
+             "behind"    : behind }
+
+
+NETWORK = [
+    ("lines_in", "counter", "Lines received from the IRC network."),
+    ("bytes_in", "counter", "Bytes received from the IRC network."),
+    ("lines_out", "counter", "Lines written to the IRC network."),
+    ("bytes_out", "counter", "Bytes written to the IRC network."),
+    ("queued", "gauge", "Lines waiting for the flood limit."),
+    ("history", "gauge", "Lines held in the chat history."),
+    ("reconnects", "counter", "Connection attempts that were retried."),
+    ("registered", "gauge", "Whether the network has welcomed us.") ]
+
+CLIENT = [
+    ("lines_in", "counter", "Lines received from the IRC client."),
+    ("bytes_in", "counter", "Bytes received from the IRC client."),
+    ("lines_out", "counter", "Lines written to the IRC client."),
+    ("bytes_out", "counter", "Bytes written to the IRC client."),
+    ("buffered", "gauge", "Bytes waiting in the transport buffer."),
+    ("behind", "gauge", "History lines yet to be sent.") ]
+
+
+def family(name, kind, description, samples):
+    """Renders a metric family, with its help and type."""
+
+    return (["# HELP %s %s" % (name, description),
+             "# TYPE %s %s" % (name, kind)] + samples)
+
+
+def render(bouncer):
+    """Renders every metric of the Bouncer in the Prometheus text format.
+
+    Networks reported by the Workers of a Supervisor carry their metrics,
+    and those of their Clients, with them, as of their last report. Loop lag
+    and Datastore latency are those of the current process.
+
+    Args:
+        bouncer (sputnik.Bouncer): The Bouncer singleton.
+
+    Returns:
+        str: The rendered metrics.
+    """
+
+    networks = [(name, network.metrics if hasattr(network, "metrics")
+                 else network_metrics(network))
+                for name, network in sorted(bouncer.networks.items())]
+    clients = [(client.network, client.serial, client_metrics(client))
+               for client in bouncer.clients]
+    clients += [(name, serial, values)
+                for name, network in sorted(bouncer.networks.items())
+                for serial, values in getattr(network, "clients", ())]
+
+    lines = []
+    for key, kind, description in NETWORK:
+        name = "sputnik_network_%s%s" % (key, "_total" * (kind == "counter"))
+        lines += family(name, kind, description, [
+            sample(name, { "network" : network }, values[key])
+            for network, values in networks if key in values])
+
+    for key, kind, description in CLIENT:
+        name = "sputnik_client_%s%s" % (key, "_total" * (kind == "counter"))
+        lines += family(name, kind, description, [
+            sample(name, { "network" : network or "", "client" : serial },
+                   values[key]) for network, serial, values in clients])
+
+    lines += family("sputnik_loop_lag_seconds", "histogram",
+                    "How late the event loop ran scheduled callbacks.",
+                    LOOP_LAG.render("sputnik_loop_lag_seconds"))
+
+    histograms = []
+    for command, histogram in sorted(DATASTORE.items()):
+        histograms += histogram.render("sputnik_datastore_seconds",
+                                       { "command" : command })
+    lines += family("sputnik_datastore_seconds", "histogram",
+                    "Latency of Datastore commands.", histograms)
+    return "\n".join(lines) + "\n"
@@ -5,8 +5,22 @@ a Connection, and defines an interface to IRC server networks implementing
 _RFC 2813: https://tools.ietf.org/html/rfc2813 .
 """
 
+import asyncio
+import logging
+import os
+import sys
+import time
+from channel import CHANNEL_MODES, CHANNEL_TYPES, MODE_PREFIXES, Channel, \
+    User, pack_joins, parse_chanmodes, parse_prefix
 from collections import deque
 from connection import Connection
+from history import History
+from log import B2C, N2B
+from message import add_tags, format_time
+from throttle import TokenBucket
+from tls import client_context
+
+logger = logging.getLogger("sputnik.network")
 
 
 class Network(Connection):
@@ -17,13 +31,49 @@ class Network(Connection):
     be either a single IRC server, or more likely, a network of servers behind
     a load balancer. It does not implement an actual IRC server, as defined in
 
+    A Network outlives its individual connections. When its connection is
+    lost, the same instance is reconnected by the Bouncer's Scheduler, so the
+    chat history survives reconnects, and attached Clients stay attached.
+
     Attributes:
-        ??? (revisit this later)
+        attempts (int): The number of consecutive failed connection attempts.
+        autojoin (dict): Channels and passwords to join on the next connection,
+            if already known, rather than reading them from the Datastore.
+        bouncer (sputnik.Bouncer): A reference to the Bouncer singleton.
+        bucket (sputnik.TokenBucket): Paces lines written to the IRC network.
+        bulk (collections.deque): Queued lines of bulk traffic, such as JOINs.
+        chanmodes (tuple of str): The channel modes of the network, by type.
+        channels (dict of sputnik.Channel): The channels we have joined, by
+            lowercased name.
+        chat_history (sputnik.History): Recent lines, for delivery to Clients.
+        connected (bool): Indicates if the Network should remain connected.
+        context (sputnik.SessionContext): The TLS context kept across
+            reconnects, or ``None`` for a plaintext connection.
+        handle (asyncio.Handle): A scheduled dial, or ``None``.
+        network (str): The name of the IRC network.
+        prefixes (collections.OrderedDict): The member status modes of the
+            network, and their prefixes.
+        priority (collections.deque): Queued lines sent ahead of bulk traffic.
+        reconnects (int): The number of connection attempts retried.
+        registered (asyncio.Future): Resolves to ``True`` once the current
+            connection registers, or ``False`` if it is lost first.
+        registration (list of bytes): The registration burst, encoded for
+            replay.
+        source (str): Our full prefix on the network, e.g. ``nick!user@host``.
+        startup (float): The seconds the last connection took to register.
+        stamped (list of tuple): The sequence number and tagged form of
+            history lines, by slot, shared by Clients with ``server-time``.
+        state (str): ``"connecting"``, ``"registered"``, ``"backing off"`` or
+            ``"disconnected"``.
+        tls (bool): Indicates if the Network is reached over TLS.
+        users (dict): What is known of the members of our channels, by
+            nickname.
+        welcomed (str): The nickname the registration burst addresses.
     """
 
     def __init__(self, bouncer, network, hostname, port,
                  nickname, username, realname,
-                 password=None, usermode=0):
+                 password=None, usermode=0, tls=False):
         """Creates an instance of a Network.
 
         This performs a minimum level of string formatting and type coercion in
@@ -39,6 +89,8 @@ class Network(Connection):
             realname (str): The real name of the user.
             password (str, optional): Bouncer password. Defaults to ``None``.
             usermode (int, optional): The IRC usermode. Defaults to ``0``.
+            tls (bool, optional): Whether to connect over TLS. Defaults to
+                ``False``.
         """
 
         self.usermode = str(usermode)
@@ -50,113 +102,582 @@ class Network(Connection):
         self.network = network
         self.hostname = hostname
         self.port = port
+        self.tls = tls
+        self.context = None if not tls else client_context(
+            verify=os.getenv("SPUTNIK_TLS_VERIFY", "1") != "0",
+            cafile=os.getenv("SPUTNIK_TLS_CAFILE"))
+
+        self.connected = True
+        self.state = "connecting"
+        self.attempts = 0
+        self.reconnects = 0
+        self.handle = None
+        self.transport = None
+        self.registered = None
+        self.startup = None
+        self.autojoin = None
+        self.priority = deque()
+        self.bulk = deque()
+        self.draining = None
+        self.bucket = TokenBucket(
+            rate=float(os.getenv("SPUTNIK_FLOOD_RATE", 1.0)),
+            burst=int(os.getenv("SPUTNIK_FLOOD_BURST", 5)))
+        self.server = hostname
+        self.source = nickname
+        self.welcomed = nickname
+        self.registration = []
+        self.channels = {}
+        self.users = {}
+        self.prefixes = MODE_PREFIXES
+        self.chanmodes = CHANNEL_MODES
+        self.flushing = False
+        self.chat_history = History(
+            max_lines=int(os.getenv("SPUTNIK_HISTORY_LINES", 1024)),
+            max_bytes=int(os.getenv("SPUTNIK_HISTORY_BYTES", 262144)))
+        self.stamped = [None] * self.chat_history.max_lines
 
     def connection_made(self, transport):
-        """Registers the connected Network with the Bouncer.
+        """Prepares the Network for a new connection to the IRC network.
 
-        Adds the Network to the set of connected Networks in the Bouncer and
-        saves the transport for later use. This also creates a collection of
-        buffers and logging facilities, and initiates the authentication
-        handshake, if applicable.
+        Saves the transport for later use, resets the state learned from any
+        previous connection, and initiates the authentication handshake, if
+        applicable. Clients attached by name to a Network that has since been
+        replaced are moved over to this one.
         """
 
-        print("Bouncer Connected to Network")
-        if self.network in self.bouncer.networks:
-            self.bouncer.networks[self.network].transport.close()
-        self.bouncer.networks[self.network] = self
-
-        self.connected = True
-        self.transport = transport
-        self.linebuffer = ""
-        self.server_log = []
-        self.chat_history = deque()
+        logger.info("Bouncer Connected to %s", self.network)
+        for client in self.bouncer.subscribers.get(self.network, ()):
+            if client.broker is not self:
+                client.broker = self
+                client.cursor = self.chat_history.first
+
+        super().connection_made(transport)
+        self.registered = asyncio.Future()
+        self.server = self.hostname
+        self.source = self.nickname
+        self.welcomed = self.nickname
+        self.registration = []
+        self.channels = {}
+        self.users = {}
+        self.prefixes = MODE_PREFIXES
+        self.chanmodes = CHANNEL_MODES
+        self.bucket.refill()
 
         self.send("PASS", self.password) if self.password else None
         self.send("NICK", self.nickname)
         self.send("USER", self.username, self.usermode, "*",
                   ":%s" % self.realname)
 
-        if self.bouncer.datastore:
-            channels = self.bouncer.datastore.get_channels(self.network)
-            for channel_info, password in channels.items():
-                channel_name = channel_info.split(":")[1]
-                self.send("JOIN", channel_name, password or "")
+    @asyncio.coroutine
+    def rejoin(self):
+        """Rejoins the channels saved for this Network in the Datastore.
 
-    def attempt_reconnect(self, attempt=0, retries=5):
-        """Attempts to reconnect to a network that unexpectedly disconnected.
+        The saved channels are fetched without blocking the event loop, so
+        other Networks and Clients are not stalled while we wait for Redis.
+        Channels loaded while bootstrapping are used instead, once.
 
-        This is only called if we drop the connection to a network and the
-        connected flag is set, to distinguish from intentional disconnects.
+        The channels are packed into as few JOIN commands as possible, which
+        are queued as bulk traffic, behind anything sent by Clients.
+        """
+
+        channels, self.autojoin = self.autojoin, None
+        if channels is None:
+            datastore = self.bouncer.datastore
+            saved = yield from datastore.get_channels(self.network)
+            channels = { channel_info.split(":", 1)[1] : password
+                         for channel_info, password in saved.items() }
+        for line in pack_joins(channels):
+            self.send(line, bulk=True)
+
+    def send(self, *args, bulk=False, urgent=False):
+        """Queues a message to be written to the IRC network.
+
+        Lines are written as fast as the token bucket allows, so that bursts
+        of traffic never trip the flood protection of the IRC server. Bulk
+        traffic is only written once no other lines are waiting. Urgent
+        traffic, such as the reply to a keepalive, is written at once, as the
+        server disconnects us should it wait behind a long queue.
 
         Args:
-            attempt (int): The current attempt count.
-            retries (int): The number of times to attempt to reconnect.
+            args (list of str): A list of strings to concatenate.
+            bulk (bool, optional): Indicates if the message may wait behind
+                other traffic. Defaults to ``False``.
+            urgent (bool, optional): Indicates if the message bypasses the
+                queue and the token bucket. Defaults to ``False``.
+        """
+
+        message = self.normalize(" ".join(args)).encode()
+        if urgent and self.transport:
+            self.transport.write(message)
+            self.lines_out += 1
+            self.bytes_out += len(message)
+            return
+        (self.bulk if bulk else self.priority).append(message)
+        if not self.draining: self.drain()
+
+    def relay(self, lines):
+        """Queues lines from a Client, exactly as the Client sent them.
+
+        Args:
+            lines (list of memoryview): Encoded lines, ending in CRLF.
+        """
+
+        self.priority.extend(lines)
+        if not self.draining: self.drain()
+
+    def drain(self):
+        """Writes queued lines until the token bucket runs dry.
+
+        If lines remain, another drain is scheduled for when the next token
+        becomes available.
         """
 
-        if attempt <= retries:
+        self.draining = None
+        while self.transport and (self.priority or self.bulk):
 
-            network = self.bouncer.add_network(
-                self.network, self.hostname, self.port,
-                self.nickname, self.username,
-                self.password, self.usermode)
+            wait = self.bucket.consume()
+            if wait:
+                self.draining = asyncio.get_event_loop().call_later(
+                    wait, self.drain)
+                return
 
-            if network.connected: return
-            asyncio.sleep(2**attempt)
-            self.attempt_reconnect(attempt + 1)
+            line = (self.priority or self.bulk).popleft()
+            self.transport.write(line)
+            self.lines_out += 1
+            self.bytes_out += len(line)
 
     def connection_lost(self, exc):
-        """Unregisters the connected Network from the Bouncer.
+        """Reconnects to the IRC network, unless we meant to disconnect.
 
-        Removes the Network from the dictionary of connected Clients in the
-        Bouncer before the connection is terminated. After this point, there
-        should be no remaining references to this instance of the Network.
+        This distinguishes intentional disconnects from lost connections by
+        checking the connected flag, which is cleared by the Bouncer when a
+        Network is removed.
         """
-        self.bouncer.networks.pop(self.network)
+
+        self.transport = None
+        if self.draining: self.draining.cancel()
+        self.draining = None
+        self.priority.clear()
+        self.bulk.clear()
+        if not self.registered.done(): self.registered.set_result(False)
         if not self.connected:
-            print("Bouncer Disconnected from Network")
-        else: self.attempt_reconnect()
+            self.state = "disconnected"
+            logger.info("Bouncer Disconnected from %s", self.network)
+        else: self.bouncer.scheduler.retry(self)
 
     def data_received(self, data):
         """Handles incoming messages from connected IRC networks.
 
         Messages coming from IRC networks are potentially batched and need to
-        be parsed into individual lines before any other operation may occur.
-        On certain occasions, incoming data may overflow the transport buffer,
-        requiring additional logic to reconstitute the messages into a single
-        stream. Afterwards, we split lines according to the IRC message format
-        and perform actions as appropriate.
+        be framed into individual lines before any other operation may occur.
+        Lines split across reads are reassembled, and each line is decoded
+        for its handler, which is also handed the line as received. Lines are
+        therefore recorded exactly as they arrived, without being encoded
+        again.
         """
 
-        data = self.decode(data)
-        if not data.endswith("\r\n"):
-            self.linebuffer += data
-            return
+        frames = self.linebuffer.frames(data)
+        self.bytes_in += len(data)
+        self.lines_in += len(frames)
+        for frame in frames:
+            self.line_received(self.decode(frame[:-2]), frame)
+
+    def line_received(self, line, encoded=None):
+        """Handles a single line received from the IRC network.
+
+        Args:
+            line (str): A decoded line, without its line ending.
+            encoded (memoryview, optional): The line as received, ending in
+                CRLF. Defaults to ``None``.
+        """
+
+        if N2B.isEnabledFor(logging.DEBUG):
+            N2B.debug("[N to B]\t%s\t%s", self.network, line,
+                      extra={ "network" : self.network })
+        super().line_received(line, encoded)
+
+    def irc_PING(self, message):
+        """Answers a keepalive from the IRC network on behalf of Clients."""
+
+        token = message.params[-1] if message.params else ""
+        self.send("PONG", ":%s" % token, urgent=True)
+
+    def irc_PONG(self, message):
+        """Passes an answered keepalive straight through to Clients."""
+
+        self.forward(message.line)
+
+    def irc_PRIVMSG(self, message):
+        """Buffers a chat message for delivery to Clients, and archives it."""
+
+        self.record(message, *self.conversation(message))
+
+    irc_NOTICE = irc_PRIVMSG
+
+    def irc_001(self, message):
+        """Marks the Network registered, and rejoins its saved channels.
+
+        This also begins a new registration burst, and learns our nickname.
+        """
+
+        self.state = "registered"
+        self.attempts = 0
+        if not self.registered.done(): self.registered.set_result(True)
+        self.server = message.prefix or self.hostname
+        if message.params: self.nickname = message.params[0]
+        self.source = self.welcomed = self.nickname
+        self.registration = [bytes(self.record(message))]
+
+        if self.bouncer.datastore or self.autojoin:
+            asyncio.async(self.rejoin())
+
+    def add_registration(self, message):
+        """Keeps a line of the registration burst, for replay to Clients."""
+
+        self.registration.append(bytes(self.record(message)))
+
+    irc_002 = irc_003 = irc_004 = add_registration
+
+    def irc_005(self, message):
+        """Learns the member status and channel modes the network supports."""
+
+        self.add_registration(message)
+        for token in message.params[1:]:
+            name, _, value = token.partition("=")
+            if name == "PREFIX":
+                self.prefixes = parse_prefix(value) or self.prefixes
+            elif name == "CHANMODES": self.chanmodes = parse_chanmodes(value)
+    irc_375 = irc_372 = irc_376 = irc_422 = add_registration
+
+    def irc_JOIN(self, message):
+        """Tracks channels we join, and members joining our channels."""
+
+        if not message.params: return self.record(message)
+        self.record(message, *message.params[0].split(","))
+        if not message.prefix: return
+
+        nick = sys.intern(message.nick)
+        for name in message.params[0].split(","):
+            if nick == self.nickname:
+                self.source = message.prefix
+                self.channels[name.lower()] = Channel(name)
+            elif name.lower() in self.channels:
+                self.channels[name.lower()].members[nick] = ""
+
+        if nick not in self.users and (nick == self.nickname or
+                                       self.shared(nick)):
+            user, _, host = message.prefix.partition("!")[2].partition("@")
+            self.users[nick] = User(user, host)
+
+    def irc_PART(self, message):
+        """Tracks channels we leave, and members leaving our channels."""
+
+        if not message.params: return self.record(message)
+        self.record(message, *message.params[0].split(","))
+
+        for name in message.params[0].split(","):
+            self.remove_member(name, message.nick)
+
+    def irc_KICK(self, message):
+        """Tracks members, including ourselves, being kicked from channels."""
+
+        self.record(message, *message.params[:1])
+        if len(message.params) > 1:
+            self.remove_member(message.params[0], message.params[1])
+
+    def irc_QUIT(self, message):
+        """Removes a member that quit from all of our channels."""
+
+        self.record(message, *self.shared(message.nick))
+        for channel in self.channels.values():
+            channel.members.pop(message.nick, None)
+        self.users.pop(message.nick, None)
+
+    def irc_NICK(self, message):
+        """Tracks nickname changes, including our own."""
+
+        self.record(message, *self.shared(message.nick))
+        if not message.params: return
+
+        nick = sys.intern(message.params[0])
+        if message.nick == self.nickname:
+            self.nickname = nick
+            _, mask, address = self.source.partition("!")
+            self.source = nick + mask + address
+        for channel in self.channels.values():
+            if message.nick in channel.members:
+                channel.members[nick] = channel.members.pop(message.nick)
+        if message.nick in self.users:
+            self.users[nick] = self.users.pop(message.nick)
+
+    def irc_MODE(self, message):
+        """Tracks member status changes in our channels."""
+
+        self.record(message, *[target for target in message.params[:1]
+                               if target[:1] in CHANNEL_TYPES])
+        channel = self.get_channel(message.params, 0)
+        if channel and len(message.params) > 1:
+            channel.set_mode(message.params[1], message.params[2:],
+                             self.prefixes, self.chanmodes)
+
+    def irc_TOPIC(self, message):
+        """Tracks topic changes in our channels."""
+
+        self.record(message, *message.params[:1])
+        channel = self.get_channel(message.params, 0)
+        if channel and len(message.params) > 1:
+            channel.topic = message.params[1]
+            channel.topic_info = [message.prefix, str(int(time.time()))]
+
+    def irc_332(self, message):
+        """Tracks the topic of a channel, reported on joining it."""
+
+        self.record(message)
+        channel = self.get_channel(message.params, 1)
+        if channel and len(message.params) > 2:
+            channel.topic = message.params[2]
+
+    def irc_333(self, message):
+        """Tracks the setter and time of a channel topic."""
+
+        self.record(message)
+        channel = self.get_channel(message.params, 1)
+        if channel: channel.topic_info = message.params[2:4]
+
+    def irc_353(self, message):
+        """Tracks the members of a channel, reported by a NAMES reply."""
+
+        self.record(message)
+        channel = self.get_channel(message.params, 2)
+        if channel and len(message.params) > 3:
+            channel.add_names(message.params[1], message.params[3],
+                              self.prefixes)
+
+    def irc_366(self, message):
+        """Marks the end of a NAMES reply."""
+
+        self.record(message)
+        channel = self.get_channel(message.params, 1)
+        if channel: channel.synced = True
+
+    def irc_324(self, message):
+        """Tracks the modes of a channel, reported by a MODE query."""
+
+        self.record(message)
+        channel = self.get_channel(message.params, 1)
+        if channel and len(message.params) > 2:
+            channel.modes = {}
+            channel.set_mode(message.params[2], message.params[3:],
+                             self.prefixes, self.chanmodes)
+
+    def irc_331(self, message):
+        """Tracks a channel having no topic, reported by a TOPIC query."""
 
-        for line in (self.linebuffer + data).rstrip().split("\r\n"):
+        self.record(message)
+        channel = self.get_channel(message.params, 1)
+        if channel: channel.topic, channel.topic_info = None, []
 
-            print("[N to B]\t%s" % line)
+    def irc_352(self, message):
+        """Learns the details of a member of our channels from a WHO reply."""
+
+        self.record(message)
+        if len(message.params) < 8: return
+        _, _, user, host, server, nick, flags, trailing = message.params[:8]
+        if nick not in self.users and not self.shared(nick): return
 
-            l = line.split(" ", 2)
-            if   l[0] == "PING": self.send("PONG", l[1])
-            elif l[1] == "PONG": self.forward("PONG", l[2])
-            elif l[0] == "PRIVMSG" or l[1] == "PRIVMSG":
+        details = self.users.get(nick)
+        if not details: details = self.users[sys.intern(nick)] = User()
+        details.user, details.host, details.server = user, host, server
+        details.realname = trailing.partition(" ")[2]
+        details.away = flags[:1] == "G"
+
+    def unhandled(self, message):
+        """Buffers any other message for delivery to Clients."""
+
+        self.record(message)
+
+    def get_channel(self, params, index):
+        """Looks up a joined channel named by a message parameter.
 
-                self.chat_history.append(line)
+        Args:
+            params (list of str): The message parameters.
+            index (int): The position of the channel name.
+
+        Returns:
+            sputnik.Channel: The channel, or ``None`` if we have not joined it.
+        """
+
+        if len(params) <= index: return None
+        return self.channels.get(params[index].lower())
+
+    def conversation(self, message):
+        """Names the channel or query that a chat message belongs to.
+
+        Args:
+            message (sputnik.Message): A PRIVMSG or NOTICE.
+
+        Returns:
+            list of str: The channel or nickname, or nothing for a message
+            from a server, such as a notice sent before registering.
+        """
+
+        target = message.params[0] if message.params else ""
+        if target[:1] in CHANNEL_TYPES: return [target]
+        if "!" not in (message.prefix or ""): return []
+        return [message.nick if target == self.nickname else target]
+
+    def shared(self, nick):
+        """Lists the names of our channels that a member belongs to.
+
+        Args:
+            nick (str): The nickname of the member.
+
+        Returns:
+            list of str: The channel names.
+        """
+
+        return [channel.name for channel in self.channels.values()
+                if nick in channel.members]
+
+    def remove_member(self, name, nick):
+        """Removes a member from a channel, forgetting it if it was us.
+
+        Args:
+            name (str): The name of the channel.
+            nick (str): The nickname of the member.
+        """
+
+        if nick == self.nickname: self.channels.pop(name.lower(), None)
+        elif name.lower() in self.channels:
+            self.channels[name.lower()].members.pop(nick, None)
 
-            else:
+        # members we no longer share a channel with are forgotten
+        for member in list(self.users) if nick == self.nickname else [nick]:
+            if member != self.nickname and not self.shared(member):
+                self.users.pop(member, None)
+
+    def roster(self):
+        """Lists our channels and their members, for the web interface.
+
+        Returns:
+            list of dict: The name, topic, member count, and prefixed member
+            nicknames of each channel, with members of higher status first.
+        """
+
+        ranks = { prefix : rank for rank, prefix in
+                  enumerate(self.prefixes.values()) }
+        return [{ "name"    : channel.name,
+                  "topic"   : channel.topic,
+                  "count"   : len(channel.members),
+                  "members" : [prefix + nick for nick, prefix in sorted(
+                      channel.members.items(), key=lambda member: (
+                          ranks.get(member[1][:1], len(ranks)),
+                          member[0].lower()))] }
+                for _, channel in sorted(self.channels.items())]
+
+    def snapshot(self):
+        """Renders the current state of the Network for an attaching Client.
+
+        This is the registration burst, followed by the replies a server would
+        send on joining each of our channels. Its size depends only on the
+        current state, however long the Network has been connected. Should
+        our nickname have changed since the burst, the Client is told so
+        before anything addresses the new one.
+
+        Returns:
+            bytes: The encoded lines, ready to be written in a single call.
+        """
+
+        lines = []
+        if self.welcomed != self.nickname:
+            _, mask, address = self.source.partition("!")
+            lines.append(":%s%s%s NICK %s" % (self.welcomed, mask, address,
+                                              self.nickname))
+        for channel in self.channels.values():
+            lines.extend(channel.snapshot(self.server, self.nickname,
+                                          self.source))
+        return b"".join(self.registration) + "".join(
+            self.normalize(line) for line in lines).encode()
+
+    def record(self, message, *targets):
+        """Appends a message to the chat history, exactly as it was received.
+
+        Rather than writing to Clients immediately, a flush is scheduled for
+        the end of the current event loop iteration, so that every line
+        received in the meantime is delivered to each Client in one batch.
+        The line is also archived under each channel or query it concerns.
+        Only a message that was not received from the IRC network is encoded.
+
+        Args:
+            message (sputnik.Message): The message.
+            targets (list of str): The channels or nicknames to archive under.
+
+        Returns:
+            memoryview: The encoded line, ending in CRLF.
+        """
+
+        encoded = message.encoded
+        if encoded is None:
+            encoded = memoryview(self.normalize(message.line).encode())
+        timestamp = int(time.time() * 1000)
+        self.chat_history.append(encoded, timestamp)
+        if targets: self.archive(encoded, timestamp, *targets)
+        if not self.flushing:
+            self.flushing = True
+            asyncio.get_event_loop().call_soon(self.flush)
+        return encoded
+
+    def stamp(self, cursor, lines):
+        """Tags lines of the chat history with their time, for ``server-time``.
+
+        Each line is tagged only once, however many Clients it is sent to.
+        Tagged lines are kept in the same slot as in the chat history, and are
+        replaced along with it.
+
+        Args:
+            cursor (int): The sequence number of the first line.
+            lines (list of memoryview): The lines read from that cursor.
+
+        Returns:
+            list of bytes: The tagged lines.
+        """
+
+        history, stamped = self.chat_history, self.stamped
+        tagged = []
+        numbers = range(max(cursor, history.first), history.next)
+        for number, line, stamp in zip(numbers, lines,
+                                       history.timestamps(cursor)):
+            slot = number % history.max_lines
+            cached = stamped[slot]
+            if cached is None or cached[0] != number:
+                cached = stamped[slot] = (number, add_tags(
+                    bytes(line), b"time=" + format_time(stamp).encode()))
+            tagged.append(cached[1])
+        return tagged
+
+    def archive(self, encoded, timestamp, *targets):
+        """Archives a line under each channel or query it concerns.
+
+        Args:
+            encoded (bytes): An encoded line, including its line ending.
+            timestamp (int): The time of the line, in milliseconds.
+            targets (list of str): The channels or nicknames to archive under.
+        """
 
-                self.chat_history.append(line)
-                self.server_log.append(line)
+        if not self.bouncer.archive: return
+        for target in targets:
+            self.bouncer.archive.append(self.network, target, encoded,
+                                        timestamp)
 
-        self.linebuffer = ""
+    def flush(self):
+        """Catches up every attached Client on the chat history."""
 
-        if self.bouncer.clients:
-            while self.chat_history:
-                line = self.chat_history.popleft()
-                self.forward(line)
+        self.flushing = False
+        for client in self.bouncer.subscribers.get(self.network, ()):
+            if client.ready: client.catch_up()
 
     def forward(self, *args):
-        """Writes a message to all connected CLients.
+        """Writes a message to all Clients attached to this Network.
 
         Because the Network represents an instance of a connection to an IRC
         network, we instead need to write to the transports of all clients.
@@ -166,7 +687,12 @@ class Network(Connection):
         """
 
         message = self.normalize(" ".join(args))
-        for client in self.bouncer.clients:
-            if client.broker == self:
-                client.transport.write(message.encode())
-                print("[B to C]\t%s" % message, end="")
+        encoded = message.encode()
+        for client in self.bouncer.subscribers.get(self.network, ()):
+            if not client.paused:
+                client.transport.write(encoded)
+                client.lines_out += 1
+                client.bytes_out += len(encoded)
+        if B2C.isEnabledFor(logging.DEBUG):
+            B2C.debug("[B to C]\t%s\t%s", self.network, message.rstrip(),
+                      extra={ "network" : self.network })
@@ -0,0 +1,82 @@
+"""Sputnik Event Loop Policy
+
+This module selects the event loop that Sputnik runs on. The standard library
+loop is always available, while uvloop is used when it is installed. The loop
+is chosen before any other part of Sputnik asks for one, so that the Bouncer,
+its Networks and Clients, and the Tornado bridge all share it.
+"""
+
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger("sputnik.policy")
+
+BACKENDS = ("asyncio", "uvloop")
+
+
+def policy(backend):
+    """Creates the event loop policy of a backend.
+
+    Args:
+        backend (str): Either ``"asyncio"`` or ``"uvloop"``.
+
+    Returns:
+        asyncio.AbstractEventLoopPolicy: The policy of the backend.
+
+    Raises:
+        ImportError: If the backend is not installed.
+        ValueError: If the backend is unknown.
+    """
+
+    if backend == "asyncio": return asyncio.DefaultEventLoopPolicy()
+    if backend == "uvloop":
+        import uvloop
+        return uvloop.EventLoopPolicy()
+    raise ValueError("Unknown Event Loop %r" % backend)
+
+
+def available():
+    """Returns the backends that are installed.
+
+    Returns:
+        list of str: The name of each installed backend.
+    """
+
+    backends = []
+    for backend in BACKENDS:
+        try: policy(backend)
+        except ImportError: continue
+        backends.append(backend)
+    return backends
+
+
+def install(backend=None):
+    """Installs the event loop policy of a backend.
+
+    This must be called before the first call to ``asyncio.get_event_loop``.
+    The ``"auto"`` backend is uvloop if it is installed, and the standard
+    library loop otherwise. A backend that is not installed falls back to the
+    standard library loop.
+
+    Args:
+        backend (str, optional): ``"auto"``, ``"asyncio"``, or ``"uvloop"``.
+            Defaults to ``SPUTNIK_LOOP``, or ``"auto"``.
+
+    Returns:
+        str: The name of the installed backend.
+    """
+
+    if backend is None: backend = os.getenv("SPUTNIK_LOOP", "auto")
+    backend = backend.lower()
+    if backend == "auto": backend = available()[-1]
+
+    try: asyncio.set_event_loop_policy(policy(backend))
+    except ImportError:
+        logger.warning("Event Loop %s Is Not Installed. Using asyncio.",
+                       backend)
+        backend = "asyncio"
+        asyncio.set_event_loop_policy(policy(backend))
+
+    logger.info("Using the %s Event Loop", backend)
+    return backend
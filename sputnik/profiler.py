@@ -0,0 +1,151 @@
+"""Sputnik Profiler Implementation
+
+This module provides the Sputnik Profiler implementation. It is a statistical
+profiler, which may be started and stopped while the Bouncer is running, and
+which produces collapsed stacks that flame graph tools can render directly.
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+
+
+class Profiler(object):
+    """A sampling profiler for the event loop thread.
+
+    While running, a background thread periodically looks at the stack of
+    the event loop thread, and counts how often each distinct stack is seen.
+    The event loop is never interrupted or instrumented, so the overhead is
+    only that of the sampling thread taking the GIL once per interval, and
+    nothing at all while the profiler is stopped.
+
+    Each stack is recorded from the outermost frame to the innermost, with
+    frames named ``module:function``, so that time spent in, for example,
+    ``network:data_received`` or ``resp:data_received`` is attributed to it
+    and to everything that called it.
+
+    Attributes:
+        interval (float): The seconds between samples.
+        depth (int): The maximum number of frames recorded per stack.
+        stacks (collections.Counter): The number of samples of each stack.
+        samples (int): The total number of samples taken.
+        started (float): When the profiler was last started, or ``None``.
+        stopped (float): When the profiler was last stopped, or ``None``.
+    """
+
+    def __init__(self, interval=0.005, depth=64):
+        """Creates an instance of a Profiler.
+
+        Args:
+            interval (float, optional): The seconds between samples.
+                Defaults to ``0.005``.
+            depth (int, optional): The maximum number of frames recorded per
+                stack. Defaults to ``64``.
+        """
+
+        self.interval = interval
+        self.depth = depth
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.started = None
+        self.stopped = None
+        self.labels = {}
+        self.thread = None
+        self.stopping = threading.Event()
+
+    @property
+    def running(self):
+        """bool: Indicates if the profiler is sampling."""
+
+        return bool(self.thread and self.thread.is_alive())
+
+    def start(self, target=None):
+        """Starts sampling a thread, discarding any earlier samples.
+
+        Args:
+            target (int, optional): The identifier of the thread to sample.
+                Defaults to the calling thread, which is the event loop
+                thread when called from a request handler.
+        """
+
+        if self.running: return
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.started, self.stopped = time.time(), None
+        self.stopping.clear()
+        self.thread = threading.Thread(
+            target=self.run, name="sputnik-profiler", daemon=True,
+            args=(target or threading.get_ident(),))
+        self.thread.start()
+
+    def stop(self):
+        """Stops sampling, keeping the samples taken."""
+
+        if not self.running: return
+        self.stopping.set()
+        self.thread.join()
+        self.stopped = time.time()
+
+    def run(self, target):
+        """Samples the target thread until the profiler is stopped.
+
+        Args:
+            target (int): The identifier of the thread to sample.
+        """
+
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            if frame is None: break
+            self.stacks[self.collapse(frame)] += 1
+            self.samples += 1
+
+    def collapse(self, frame):
+        """Names the frames of a stack, from the outermost to the innermost.
+
+        Args:
+            frame (frame): The innermost frame of the stack.
+
+        Returns:
+            str: The names of the frames, separated by semicolons.
+        """
+
+        labels, names = self.labels, []
+        while frame is not None and len(names) < self.depth:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                module = os.path.splitext(os.path.basename(code.co_filename))
+                label = labels[code] = "%s:%s" % (module[0], code.co_name)
+            names.append(label)
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def collapsed(self):
+        """Renders the samples as collapsed stacks, one per line.
+
+        Returns:
+            str: Each stack, followed by the number of times it was sampled.
+        """
+
+        stacks = dict(self.stacks)
+        return "".join("%s %d\n" % (stack, count)
+                       for stack, count in sorted(stacks.items()))
+
+    def top(self, limit=20):
+        """Returns the functions most often seen running.
+
+        Args:
+            limit (int, optional): The number of functions. Defaults to
+                ``20``.
+
+        Returns:
+            list of tuple: Each function and its share of the samples.
+        """
+
+        counts = collections.Counter()
+        for stack, count in dict(self.stacks).items():
+            counts[stack.rsplit(";", 1)[-1]] += count
+        return [(name, count / (self.samples or 1))
+                for name, count in counts.most_common(limit)]
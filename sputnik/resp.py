@@ -0,0 +1,207 @@
+"""Sputnik Redis Protocol Implementation
+
+This module provides an asyncio implementation of the Redis Serialization
+Protocol, _RESP: http://redis.io/topics/protocol . It allows the Datastore to
+talk to Redis without blocking the event loop, and automatically pipelines
+every command issued during a single iteration of the event loop.
+"""
+
+import asyncio
+from collections import deque
+
+
+class RedisError(Exception):
+    """An error reply returned by Redis."""
+
+
+class Incomplete(Exception):
+    """Raised by the ReplyParser when a reply has not been fully received."""
+
+
+def encode(args):
+    """Encodes a command as a RESP array of bulk strings.
+
+    Args:
+        args (list): The command name and its arguments.
+
+    Returns:
+        bytes: The encoded command.
+    """
+
+    parts = [("*%d\r\n" % len(args)).encode()]
+    for arg in args:
+        if not isinstance(arg, bytes): arg = str(arg).encode()
+        parts.append(("$%d\r\n" % len(arg)).encode())
+        parts.append(arg)
+        parts.append(b"\r\n")
+    return b"".join(parts)
+
+
+class ReplyParser(object):
+    """An incremental parser for RESP replies.
+
+    Bulk strings are returned as bytes, and errors are returned as instances
+    of RedisError rather than raised, so that they may be matched with the
+    command that caused them.
+
+    Attributes:
+        buffer (bytearray): Bytes received that do not yet form a reply.
+    """
+
+    def __init__(self):
+        """Creates an instance of a ReplyParser."""
+
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """Appends a chunk of data and returns the replies it completed.
+
+        Args:
+            data (bytes): A chunk of data read from the transport.
+
+        Returns:
+            list: The complete replies, in the order they were received.
+        """
+
+        self.buffer.extend(data)
+        replies, consumed = [], 0
+        try:
+            while consumed < len(self.buffer):
+                reply, consumed = self.parse(consumed)
+                replies.append(reply)
+        except Incomplete: pass
+
+        if replies: del self.buffer[:consumed]
+        return replies
+
+    def parse(self, position):
+        """Parses a single reply starting at a position in the buffer.
+
+        Args:
+            position (int): The offset of the reply in the buffer.
+
+        Returns:
+            tuple: The reply, and the offset following it.
+        """
+
+        buffer = self.buffer
+        end = buffer.find(b"\r\n", position)
+        if end < 0: raise Incomplete
+
+        kind, line = buffer[position:position+1], bytes(buffer[position+1:end])
+        position = end + 2
+
+        if kind == b"+": return line.decode(), position
+        if kind == b"-": return RedisError(line.decode()), position
+        if kind == b":": return int(line), position
+        if kind == b"$":
+
+            length = int(line)
+            if length < 0: return None, position
+            if len(buffer) < position + length + 2: raise Incomplete
+            return bytes(buffer[position:position+length]), \
+                position + length + 2
+
+        if kind == b"*":
+
+            length = int(line)
+            if length < 0: return None, position
+            items = []
+            for _ in range(length):
+                item, position = self.parse(position)
+                items.append(item)
+            return items, position
+
+        raise RedisError("Unexpected Reply Type %r" % kind)
+
+
+class RedisProtocol(asyncio.Protocol):
+    """An asyncio connection to a Redis server.
+
+    Commands are not written as soon as they are issued. Instead, they are
+    queued, and the queue is written in a single call at the end of the
+    current event loop iteration. Every command issued in the same iteration
+    therefore shares a single round trip to Redis.
+
+    Once its connection is lost, a RedisProtocol fails every command issued
+    to it straight away, rather than queueing commands that would never be
+    written, and a new RedisProtocol must be connected in its place.
+
+    Attributes:
+        closed (bool): Indicates if the connection has been lost.
+        lost (callable): Called with the exception, if any, once the
+            connection is lost, or ``None``.
+        pending (collections.deque): Futures awaiting a reply, in order.
+        queued (list of bytes): Encoded commands not yet written.
+        transport (asyncio.Transport): The underlying transport.
+    """
+
+    def __init__(self, lost=None):
+        """Creates an instance of a RedisProtocol.
+
+        Args:
+            lost (callable, optional): Called with the exception, if any, once
+                the connection is lost. Defaults to ``None``.
+        """
+
+        self.pending = deque()
+        self.queued = []
+        self.parser = ReplyParser()
+        self.transport = None
+        self.closed = False
+        self.lost = lost
+
+    def connection_made(self, transport):
+        """Saves the transport, and writes any commands already queued."""
+
+        self.transport = transport
+        if self.queued: self.flush()
+
+    def connection_lost(self, exc):
+        """Fails every command still awaiting a reply."""
+
+        self.transport = None
+        self.closed = True
+        self.queued = []
+        while self.pending:
+            future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(ConnectionError("Lost Redis Connection"))
+        if self.lost: self.lost(exc)
+
+    def data_received(self, data):
+        """Resolves the oldest pending command with each reply received."""
+
+        for reply in self.parser.feed(data):
+            future = self.pending.popleft()
+            if future.done(): continue
+            if isinstance(reply, RedisError): future.set_exception(reply)
+            else: future.set_result(reply)
+
+    def execute(self, *args):
+        """Queues a command for the next pipelined write.
+
+        Args:
+            args (list): The command name and its arguments.
+
+        Returns:
+            asyncio.Future: A future that resolves to the reply, or fails
+            with a ConnectionError if the connection has been lost.
+        """
+
+        loop = asyncio.get_event_loop()
+        future = asyncio.Future(loop=loop)
+        if self.closed:
+            future.set_exception(ConnectionError("Lost Redis Connection"))
+            return future
+        if not self.queued: loop.call_soon(self.flush)
+        self.queued.append(encode(args))
+        self.pending.append(future)
+        return future
+
+    def flush(self):
+        """Writes every queued command in a single call."""
+
+        if self.transport and self.queued:
+            self.transport.write(b"".join(self.queued))
+            self.queued = []
@@ -0,0 +1,194 @@
+"""Sputnik Scheduler Implementation
+
+This module provides the Sputnik Scheduler implementation. It is responsible
+for dialing IRC networks, and for reconnecting to them with a jittered,
+exponential backoff when their connections are lost.
+"""
+
+import asyncio
+import logging
+import random
+import ssl
+from tls import remember
+
+logger = logging.getLogger("sputnik.scheduler")
+
+
+class Scheduler(object):
+    """A singleton that schedules connections to IRC networks.
+
+    Each Network moves through a small set of states, which are kept on the
+    Network itself: ``"connecting"`` while it is being dialed or is awaiting
+    registration, ``"registered"`` once the server has welcomed it, and
+    ``"backing off"`` while it waits to be dialed again.
+
+    Failed attempts are retried after a delay that doubles with each attempt,
+    up to a cap. Delays are randomized, and dials are spaced apart, so that
+    many Networks losing their connections at once, such as after an upstream
+    outage, do not all dial out again at the same moment.
+
+    Only a limited number of Networks may be connecting at once. A Network
+    holds its place in the pool from the moment it is dialed until it has
+    registered, failed, or timed out, so a cold start with many Networks
+    proceeds at a bounded pace rather than all at once.
+
+    Attributes:
+        base (float): The delay, in seconds, before the first retry.
+        cap (float): The maximum delay, in seconds, between retries.
+        spacing (float): The minimum time, in seconds, between two dials.
+        limit (int): The maximum number of Networks connecting at once.
+        timeout (float): The time, in seconds, allowed to connect and register.
+    """
+
+    def __init__(self, base=1.0, cap=300.0, spacing=0.2, limit=10,
+                 timeout=30.0):
+        """Creates an instance of a Scheduler.
+
+        Args:
+            base (float, optional): The delay before the first retry.
+                Defaults to ``1.0``.
+            cap (float, optional): The maximum delay between retries.
+                Defaults to ``300.0``.
+            spacing (float, optional): The minimum time between two dials.
+                Defaults to ``0.2``.
+            limit (int, optional): The maximum number of Networks connecting
+                at once. Defaults to ``10``.
+            timeout (float, optional): The time allowed to connect and
+                register. Defaults to ``30.0``.
+        """
+
+        self.base = base
+        self.cap = cap
+        self.spacing = spacing
+        self.limit = limit
+        self.timeout = timeout
+        self.next_slot = 0
+        self.random = random.Random()
+        self.pool = None
+
+    def delay(self, attempt):
+        """Returns a randomized delay before retrying a connection.
+
+        The delay is drawn uniformly from the upper half of the exponential
+        backoff window, so that retries spread out without ever retrying
+        sooner than half of the intended delay.
+
+        Args:
+            attempt (int): The number of consecutive failed attempts.
+
+        Returns:
+            float: The delay, in seconds.
+        """
+
+        ceiling = min(self.cap, self.base * 2 ** min(attempt, 32))
+        return self.random.uniform(ceiling / 2, ceiling)
+
+    def slot(self, delay):
+        """Reserves a time at which to dial, at least ``spacing`` apart.
+
+        Args:
+            delay (float): The earliest time to dial, relative to now.
+
+        Returns:
+            float: The time to dial, in event loop time.
+        """
+
+        when = max(asyncio.get_event_loop().time() + delay, self.next_slot)
+        self.next_slot = when + self.spacing
+        return when
+
+    def connect(self, network, delay=0):
+        """Schedules a Network to be dialed.
+
+        Args:
+            network (sputnik.Network): The Network to dial.
+            delay (float, optional): The time to wait before dialing.
+                Defaults to ``0``.
+        """
+
+        if network.handle: network.handle.cancel()
+        network.state = "backing off" if delay else "connecting"
+        network.handle = asyncio.get_event_loop().call_at(
+            self.slot(delay), self.dial, network)
+
+    def retry(self, network):
+        """Schedules a Network to be dialed again after a failed attempt.
+
+        Args:
+            network (sputnik.Network): The Network to dial.
+        """
+
+        delay = self.delay(network.attempts)
+        network.attempts += 1
+        network.reconnects += 1
+        logger.info("Reconnecting to %s in %.1fs", network.network, delay)
+        self.connect(network, delay)
+
+    def cancel(self, network):
+        """Cancels any scheduled dial of a Network.
+
+        Args:
+            network (sputnik.Network): The Network to stop dialing.
+        """
+
+        if network.handle: network.handle.cancel()
+        network.handle = None
+
+    def dial(self, network):
+        """Opens a connection to a Network, once the pool has room for it.
+
+        Args:
+            network (sputnik.Network): The Network to dial.
+        """
+
+        network.handle = None
+        if network.connected: asyncio.async(self.open(network))
+
+    @asyncio.coroutine
+    def open(self, network):
+        """Connects to a Network and waits for it to register.
+
+        A Network that cannot be reached is retried. A Network that connects
+        but does not register in time is disconnected, and is retried once its
+        connection is lost. The time taken to register is kept on the Network,
+        and reported. A Network reached over TLS keeps the session of its
+        registered connection, so that its next connection may resume it.
+
+        Args:
+            network (sputnik.Network): The Network to dial.
+        """
+
+        if not self.pool: self.pool = asyncio.Semaphore(self.limit)
+        yield from self.pool.acquire()
+        try:
+            if not network.connected: return
+            network.state = "connecting"
+            loop = asyncio.get_event_loop()
+            started = loop.time()
+
+            try:
+                yield from asyncio.wait_for(loop.create_connection(
+                    lambda: network, network.hostname, network.port,
+                    ssl=network.context), self.timeout)
+            except (OSError, ssl.CertificateError,
+                    asyncio.TimeoutError) as exc:
+                logger.warning("Failed to Connect to %s: %s", network.network,
+                               exc or "Timed Out")
+                if network.connected: self.retry(network)
+                return
+
+            try:
+                registered = yield from asyncio.wait_for(
+                    network.registered, self.timeout - loop.time() + started)
+            except asyncio.TimeoutError:
+                logger.warning("Timed Out Registering with %s",
+                               network.network)
+                if network.transport: network.transport.close()
+                return
+
+            if registered:
+                remember(network.transport)
+                network.startup = loop.time() - started
+                logger.info("Registered with %s in %.2fs", network.network,
+                            network.startup)
+        finally: self.pool.release()
@@ -7,6 +7,7 @@ connect to and disconnect from networks.
 
 import os
 import handlers
+import metrics
 import tornado.web
 import tornado.httpserver
 import tornado.platform.asyncio
@@ -33,14 +34,22 @@ class HTTPServer(tornado.web.Application):
         self.bouncer = bouncer
 
         route_dict = dict(bouncer=self.bouncer)
-        routes = [(r"/edit/(\w+)/?",   handlers.EditHandler,     route_dict),
+        routes = [(r"/channels/(\w+)/?",
+                   handlers.ChannelsHandler, route_dict),
+                  (r"/edit/(\w+)/?",   handlers.EditHandler,     route_dict),
                   (r"/delete/(\w+)/?", handlers.DeleteHandler,   route_dict),
                   (r"/add/?",          handlers.AddHandler,      route_dict),
                   (r"/login/?",        handlers.LoginHandler,    route_dict),
                   (r"/logout/?",       handlers.LogoutHandler,   route_dict),
+                  (r"/metrics/?",      handlers.MetricsHandler,  route_dict),
+                  (r"/profile/?",      handlers.ProfileHandler,  route_dict),
+                  (r"/profile/download/?",
+                   handlers.ProfileDownloadHandler, route_dict),
                   (r"/settings/?",     handlers.SettingsHandler, route_dict),
                   (r"/?",              handlers.MainHandler,     route_dict)]
 
+        # Tornado runs on the current asyncio loop, whichever backend the
+        # policy selected, so the bridge must be installed after the policy.
         tornado.platform.asyncio.AsyncIOMainLoop().install()
         super().__init__(debug=os.getenv("DEBUG"),
                          handlers=routes,
@@ -60,3 +69,5 @@ class HTTPServer(tornado.web.Application):
 
         port = os.getenv("PORT", port)
         tornado.httpserver.HTTPServer(self).listen(port)
+        self.lag = metrics.LagSampler()
+        self.lag.start()
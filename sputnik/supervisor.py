@@ -0,0 +1,509 @@
+"""Sputnik Supervisor Implementation
+
+This module provides the Sputnik Supervisor implementation. It spreads the
+Bouncer across several processes, so that a single host may use every core:
+each Worker process owns a share of the networks, while the Supervisor serves
+the web interface and relays each IRC client to the Worker that owns its
+network.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import metrics
+import types
+from bouncer import Bouncer, shard_of
+from client import Client
+from server import HTTPServer
+
+logger = logging.getLogger("sputnik.supervisor")
+
+
+def describe(network):
+    """Returns the details of a Network shown by the web interface.
+
+    Args:
+        network (sputnik.Network): A Network.
+
+    Returns:
+        dict: The credentials and state of the Network, and the name, topic,
+        and member count of each of its channels.
+    """
+
+    return { "network"  : network.network,
+             "hostname" : network.hostname,
+             "port"     : network.port,
+             "nickname" : network.nickname,
+             "username" : network.username,
+             "realname" : network.realname,
+             "tls"      : network.tls,
+             "state"    : network.state,
+             "channels" : [{ "name"  : channel.name,
+                             "topic" : channel.topic,
+                             "count" : len(channel.members) }
+                           for channel in network.channels.values()] }
+
+
+def report(bouncer):
+    """Returns the details and metrics a Worker reports for its networks.
+
+    The metrics of each Client are reported with the network it selected, as
+    the Supervisor has no Clients of its own. A network is owned by a single
+    Worker, so its Clients are still told apart by their serials.
+
+    Args:
+        bouncer (sputnik.Bouncer): The Worker's Bouncer.
+
+    Returns:
+        dict of dict: The details of each network, with its metrics, and the
+        serial and metrics of each of its Clients.
+    """
+
+    clients = {}
+    for client in bouncer.clients:
+        clients.setdefault(client.network, []).append(
+            [client.serial, metrics.client_metrics(client)])
+    return { name : dict(describe(network),
+                         metrics=metrics.network_metrics(network),
+                         clients=clients.get(name, []))
+             for name, network in bouncer.networks.items() }
+
+
+def route(buffer):
+    """Finds the network requested by a Client, from the lines it has sent.
+
+    Clients name their network with their username, in the USER command,
+    which follows any CAP, PASS, and NICK commands.
+
+    Args:
+        buffer (bytes): Everything received from the Client so far.
+
+    Returns:
+        str: The name of the network, or ``None`` if USER is yet to arrive.
+    """
+
+    for line in buffer.split(b"\n")[:-1]:
+        words = line.split()
+        if words and words[0].startswith(b"@"): del words[0]
+        if words and words[0].startswith(b":"): del words[0]
+        if len(words) > 1 and words[0].upper() == b"USER":
+            return words[1].decode(errors="replace")
+    return None
+
+
+def proxy_header(transport):
+    """Returns the PROXY header that names the address of a Client.
+
+    The header follows version 1 of the HAProxy PROXY protocol, so that the
+    Worker may limit logins by the Client's address, rather than by the
+    Supervisor's Unix socket, which every relayed Client would share.
+
+    Args:
+        transport (asyncio.Transport): The connection to the Client.
+
+    Returns:
+        bytes: The header, ending in CRLF.
+    """
+
+    peer = transport.get_extra_info("peername")
+    local = transport.get_extra_info("sockname")
+    if not (isinstance(peer, tuple) and isinstance(local, tuple)):
+        return b"PROXY UNKNOWN\r\n"
+    family = "TCP6" if ":" in peer[0] else "TCP4"
+    header = "PROXY %s %s %s %d %d\r\n" % (family, peer[0], local[0],
+                                           peer[1], local[1])
+    return header.encode()
+
+
+class Relay(asyncio.Protocol):
+    """A Client connection, relayed to the Worker that owns its network.
+
+    Lines are held until the Client names its network, then everything is
+    passed through to the Worker unchanged, in both directions, after a PROXY
+    header naming the Client's address. Each side is
+    paused while the other cannot keep up.
+
+    Attributes:
+        supervisor (sputnik.Supervisor): The Supervisor singleton.
+        buffer (bytes): Lines received before the Worker was reached.
+        transport (asyncio.Transport): The connection to the Client.
+        upstream (asyncio.Transport): The connection to the Worker.
+    """
+
+    limit = 4096
+
+    def __init__(self, supervisor):
+        """Creates an instance of a Relay.
+
+        Args:
+            supervisor (sputnik.Supervisor): The Supervisor singleton.
+        """
+
+        self.supervisor = supervisor
+        self.buffer = b""
+        self.transport = None
+        self.upstream = None
+        self.opening = False
+        self.closed = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        """Relays data to the Worker, or holds it until the Worker is known."""
+
+        if self.upstream: return self.upstream.write(data)
+        self.buffer += data
+        if self.opening: return
+
+        network = route(self.buffer)
+        if network is not None:
+            self.opening = True
+            asyncio.async(self.open(network))
+        elif len(self.buffer) > self.limit:
+            self.transport.close()
+
+    @asyncio.coroutine
+    def open(self, network):
+        """Connects to the Worker that owns a network, and relays to it.
+
+        Args:
+            network (str): The name of the network.
+        """
+
+        worker = self.supervisor.worker(network)
+        try:
+            upstream, _ = yield from asyncio.get_event_loop(
+                ).create_unix_connection(lambda: Upstream(self), worker.path)
+        except OSError as exc:
+            logger.warning("Failed to Reach Worker %d: %s", worker.index, exc)
+            self.transport.close()
+            return
+
+        if self.closed: return upstream.close()
+        self.upstream = upstream
+        upstream.write(proxy_header(self.transport) + self.buffer)
+        self.buffer = b""
+
+    def connection_lost(self, exc):
+        self.closed = True
+        if self.upstream: self.upstream.close()
+
+    def pause_writing(self):
+        if self.upstream: self.upstream.pause_reading()
+
+    def resume_writing(self):
+        if self.upstream: self.upstream.resume_reading()
+
+
+class Upstream(asyncio.Protocol):
+    """The connection from a Relay to a Worker.
+
+    Attributes:
+        relay (sputnik.Relay): The Relay for the Client.
+    """
+
+    def __init__(self, relay):
+        """Creates an instance of an Upstream.
+
+        Args:
+            relay (sputnik.Relay): The Relay for the Client.
+        """
+
+        self.relay = relay
+
+    def data_received(self, data):
+        self.relay.transport.write(data)
+
+    def connection_lost(self, exc):
+        self.relay.transport.close()
+
+    def pause_writing(self):
+        self.relay.transport.pause_reading()
+
+    def resume_writing(self):
+        self.relay.transport.resume_reading()
+
+
+class Worker(object):
+    """A Worker process, owning one shard of the networks.
+
+    Each Worker runs a Bouncer, which loads only the networks of its shard,
+    and accepts Clients relayed to it on a Unix socket. Commands are sent to
+    the Worker on its stdin, and it reports the state and metrics of its
+    networks on its stdout, as lines of JSON. A Worker that exits is started
+    again.
+
+    Attributes:
+        index (int): The index of the shard owned by the Worker.
+        count (int): The number of shards.
+        path (str): The Unix socket that the Worker accepts Clients on.
+        process (asyncio.subprocess.Process): The running process, or
+            ``None``.
+        running (bool): Indicates if the Worker should be kept running.
+    """
+
+    def __init__(self, index, count, directory):
+        """Creates an instance of a Worker.
+
+        Args:
+            index (int): The index of the shard owned by the Worker.
+            count (int): The number of shards.
+            directory (str): The directory to hold the Unix socket.
+        """
+
+        self.index = index
+        self.count = count
+        self.path = os.path.join(directory, "worker-%d.sock" % index)
+        self.process = None
+        self.running = True
+
+    @asyncio.coroutine
+    def supervise(self, supervisor):
+        """Runs the Worker process, starting it again whenever it exits.
+
+        Args:
+            supervisor (sputnik.Supervisor): Receives the Worker's reports.
+        """
+
+        environment = dict(os.environ,
+                           SPUTNIK_SHARD="%d/%d" % (self.index, self.count),
+                           SPUTNIK_SHARD_SOCKET=self.path)
+        main = os.path.dirname(os.path.abspath(__file__))
+
+        while self.running:
+            self.process = yield from asyncio.create_subprocess_exec(
+                sys.executable, main, env=environment,
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+            logger.info("Started Worker %d", self.index)
+
+            while True:
+                line = yield from self.process.stdout.readline()
+                if not line: break
+                supervisor.update(self, json.loads(line.decode()))
+
+            code = yield from self.process.wait()
+            self.process = None
+            supervisor.update(self, {})
+            if self.running:
+                logger.warning("Worker %d Exited with %d", self.index, code)
+                yield from asyncio.sleep(1)
+
+    def command(self, operation, **arguments):
+        """Sends a command to the Worker.
+
+        Args:
+            operation (str): Either ``"connect"`` or ``"disconnect"``.
+            arguments (dict): The arguments of the command.
+        """
+
+        if not self.process: return
+        arguments["operation"] = operation
+        self.process.stdin.write((json.dumps(arguments) + "\n").encode())
+
+    def stop(self):
+        """Stops the Worker, letting it save its state as it exits."""
+
+        self.running = False
+        if self.process and self.process.returncode is None:
+            self.process.stdin.close()
+
+
+class Supervisor(Bouncer):
+    """A Bouncer that shares its networks among several Worker processes.
+
+    Networks are assigned to Workers by a hash of their names, so that every
+    process agrees on the owner of a network without coordination. The
+    Supervisor keeps no Networks of its own. Its ``networks`` are views of
+    the Networks in every Worker, refreshed as the Workers report them, so
+    that the web interface shows the state of every shard.
+
+    Attributes:
+        directory (str): A temporary directory holding the Unix sockets.
+        workers (list of sputnik.Worker): The Worker for each shard.
+    """
+
+    def __init__(self, workers):
+        """Creates an instance of a Supervisor.
+
+        Args:
+            workers (int): The number of Worker processes to run.
+        """
+
+        self.directory = tempfile.mkdtemp(prefix="sputnik-")
+        self.workers = [Worker(index, workers, self.directory)
+                        for index in range(workers)]
+        super().__init__()
+
+    @asyncio.coroutine
+    def bootstrap(self):
+        """Prepares the Datastore, leaving the networks to the Workers."""
+
+        yield from self.datastore.connect()
+        if not (yield from self.datastore.get_password()):
+            yield from self.datastore.set_password()
+
+    def start(self, hostname="", port=6667):
+        """Starts the Workers, and the IRC and HTTP listen servers.
+
+        Note:
+            This is a blocking call.
+
+        Args:
+            hostname (str, optional): Hostname to use. Defaults to ``""``.
+            port (int, optional): The port to listen on. Defaults to 6667.
+        """
+
+        hport = os.getenv("RUPPELLS_SOCKETS_LOCAL_PORT")
+        if hport: port = int(hport)
+
+        loop = asyncio.get_event_loop()
+        tasks = [asyncio.async(worker.supervise(self))
+                 for worker in self.workers]
+        loop.run_until_complete(loop.create_server(
+            lambda: Relay(self), hostname, port, ssl=self.listener_context()))
+        HTTPServer(self).start()
+
+        try: loop.run_forever()
+        except KeyboardInterrupt: pass
+        finally:
+            for worker in self.workers: worker.stop()
+            loop.run_until_complete(asyncio.wait(tasks))
+            if self.datastore: self.datastore.writes.flush_sync()
+            shutil.rmtree(self.directory, ignore_errors=True)
+            loop.close()
+
+    def worker(self, network):
+        """Returns the Worker that owns a network.
+
+        Args:
+            network (str): The name of a network.
+
+        Returns:
+            sputnik.Worker: The owning Worker.
+        """
+
+        return self.workers[shard_of(network, len(self.workers))]
+
+    def update(self, worker, report):
+        """Replaces the views of a Worker's networks with a fresh report.
+
+        Args:
+            worker (sputnik.Worker): The reporting Worker.
+            report (dict of dict): The details of each of its networks.
+        """
+
+        for name in [name for name in self.networks
+                     if self.worker(name) is worker]:
+            del self.networks[name]
+        for name, details in report.items():
+            self.networks[name] = types.SimpleNamespace(**details)
+
+    @asyncio.coroutine
+    def change_password(self, password):
+        """Changes the Bouncer password, and has every Worker forget the old.
+
+        Args:
+            password (str): The new password for the Bouncer.
+        """
+
+        yield from super().change_password(password)
+        for worker in self.workers: worker.command("forget_password")
+
+    def connect(self, credentials, autojoin=None):
+        """Asks the owning Worker to connect a Network.
+
+        Args:
+            credentials (dict): The network credentials.
+            autojoin (dict, optional): Unused, as the Worker loads channels
+                itself. Defaults to ``None``.
+        """
+
+        name = credentials["network"]
+        details = describe(types.SimpleNamespace(state="connecting",
+                                                 channels={}, **credentials))
+        self.networks[name] = types.SimpleNamespace(metrics={}, **details)
+        self.worker(name).command("connect", credentials=credentials)
+
+    def disconnect(self, network):
+        """Asks the owning Worker to disconnect a Network.
+
+        Args:
+            network (str): the name of a network.
+        """
+
+        self.networks.pop(network, None)
+        self.worker(network).command("disconnect", network=network)
+
+
+@asyncio.coroutine
+def control(bouncer, interval=1.0):
+    """Carries out a Supervisor's commands, and reports on the networks.
+
+    The loop is stopped once the Supervisor closes the Worker's stdin.
+
+    Args:
+        bouncer (sputnik.Bouncer): The Worker's Bouncer.
+        interval (float, optional): The seconds between reports. Defaults
+            to ``1.0``.
+    """
+
+    loop = asyncio.get_event_loop()
+    reader = asyncio.StreamReader()
+    yield from loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    writer, _ = yield from loop.connect_write_pipe(asyncio.Protocol,
+                                                   sys.stdout)
+
+    def send_report():
+        writer.write((json.dumps(report(bouncer)) + "\n").encode())
+
+    def periodically():
+        send_report()
+        handle[0] = loop.call_later(interval, periodically)
+
+    handle = [None]
+    periodically()
+    while True:
+        line = yield from reader.readline()
+        if not line: break
+        command = json.loads(line.decode())
+        if command["operation"] == "connect":
+            bouncer.connect(command["credentials"])
+        elif command["operation"] == "disconnect":
+            bouncer.disconnect(command["network"])
+        elif command["operation"] == "forget_password":
+            if bouncer.datastore: bouncer.datastore.forget_password()
+        send_report()
+
+    handle[0].cancel()
+    loop.stop()
+
+
+def work(shard, path):
+    """Runs a Worker's Bouncer, accepting relayed Clients on a Unix socket.
+
+    Note:
+        This is a blocking call.
+
+    Args:
+        shard (str): The shard owned by the Worker, e.g. ``"0/4"``.
+        path (str): The Unix socket to accept Clients on.
+    """
+
+    index, count = (int(part) for part in shard.split("/"))
+    bouncer = Bouncer(shard=(index, count))
+
+    if os.path.exists(path): os.unlink(path)
+    loop = asyncio.get_event_loop()
+    loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    loop.run_until_complete(loop.create_unix_server(lambda: Client(bouncer),
+                                                    path))
+    asyncio.async(control(bouncer, float(
+        os.getenv("SPUTNIK_STATUS_INTERVAL", 1.0))))
+    bouncer.run()
@@ -0,0 +1,136 @@
+"""Sputnik Throttle Implementation
+
+This module provides the Sputnik Throttle implementation. It is a token bucket,
+used to pace the lines written to an IRC network so that the Bouncer does not
+trip the server's flood protection, and to limit how often each address may
+attempt to log in.
+"""
+
+import collections
+import time
+
+
+class TokenBucket(object):
+    """A token bucket rate limiter.
+
+    The bucket holds up to ``burst`` tokens, and is refilled at ``rate`` tokens
+    per second. Each line written consumes a token, so short bursts are sent
+    immediately, while sustained traffic is paced to the refill rate.
+
+    Attributes:
+        rate (float): The number of tokens added per second.
+        burst (float): The maximum number of tokens held.
+        tokens (float): The number of tokens currently held.
+    """
+
+    def __init__(self, rate=1.0, burst=5, clock=time.monotonic):
+        """Creates an instance of a TokenBucket, initially full.
+
+        Args:
+            rate (float, optional): Tokens added per second. Defaults to
+                ``1.0``.
+            burst (float, optional): The maximum tokens held. Defaults to
+                ``5``.
+            clock (callable, optional): Returns the current time, in seconds.
+                Defaults to ``time.monotonic``.
+        """
+
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def refill(self):
+        """Restores every token, as after a fresh connection."""
+
+        self.tokens = self.burst
+        self.updated = self.clock()
+
+    def consume(self):
+        """Takes a token if one is available.
+
+        Returns:
+            float: ``0`` if a token was taken, or else the number of seconds
+            until one will be available.
+        """
+
+        now = self.clock()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class Limiter(object):
+    """Limits the rate of attempts made from each of many addresses.
+
+    Each address has its own TokenBucket, created on its first attempt. Once
+    too many addresses are held, those whose buckets have refilled are
+    forgotten, as they are indistinguishable from addresses never seen, and
+    failing that, those that made an attempt least recently.
+
+    Attributes:
+        rate (float): The attempts allowed per second, for each address.
+        burst (float): The attempts allowed at once, for each address.
+        buckets (collections.OrderedDict): The TokenBucket of each address,
+            from the least to the most recent attempt.
+    """
+
+    def __init__(self, rate=0.1, burst=5, clock=time.monotonic, limit=4096):
+        """Creates an instance of a Limiter.
+
+        Args:
+            rate (float, optional): Attempts allowed per second, for each
+                address. Defaults to ``0.1``.
+            burst (float, optional): Attempts allowed at once, for each
+                address. Defaults to ``5``.
+            clock (callable, optional): Returns the current time, in seconds.
+                Defaults to ``time.monotonic``.
+            limit (int, optional): The number of addresses held before they
+                are pruned. Defaults to ``4096``.
+        """
+
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.limit = limit
+        self.buckets = collections.OrderedDict()
+
+    def allow(self, address):
+        """Records an attempt, unless the address has made too many.
+
+        Args:
+            address (str): The address making the attempt.
+
+        Returns:
+            bool: Whether the attempt may go ahead.
+        """
+
+        bucket = self.buckets.get(address)
+        if bucket is None:
+            if len(self.buckets) >= self.limit: self.prune()
+            bucket = self.buckets[address] = TokenBucket(self.rate, self.burst,
+                                                         self.clock)
+        else: self.buckets.move_to_end(address)
+        return not bucket.consume()
+
+    def prune(self):
+        """Forgets every address whose bucket has refilled.
+
+        Should too many addresses still be limited, those that made an attempt
+        least recently are forgotten, so that memory stays bounded however
+        many addresses are seen, without releasing every address at once.
+        """
+
+        now = self.clock()
+        for address, bucket in list(self.buckets.items()):
+            if bucket.tokens + (now - bucket.updated) * bucket.rate >= \
+               bucket.burst:
+                del self.buckets[address]
+        while len(self.buckets) >= self.limit:
+            self.buckets.popitem(last=False)
@@ -0,0 +1,100 @@
+"""Sputnik TLS Implementation
+
+This module provides the TLS contexts used by Sputnik, both for connections to
+IRC networks and for the listen server that accepts IRC clients. Each Network
+keeps a single client context across reconnects, so that once it has completed
+a handshake, it may resume that TLS session rather than repeat the key exchange
+and certificate verification that make a full handshake expensive. Sessions can
+only be resumed from Python 3.6, and before then, every handshake is full.
+"""
+
+import ssl
+
+
+class SessionContext(ssl.SSLContext):
+    """A client TLS context that resumes the last session it negotiated.
+
+    asyncio offers no way to pass a TLS session when it connects, so the
+    context offers its saved session to every connection it wraps. Should
+    the server decline to resume it, a full handshake takes place, and the
+    new session is saved in its place.
+
+    Attributes:
+        session (ssl.SSLSession): The session to resume, or ``None``.
+    """
+
+    session = None
+
+    def wrap_bio(self, incoming, outgoing, server_side=False,
+                 server_hostname=None, session=None):
+        """Wraps a pair of memory buffers, offering the saved session."""
+
+        return super().wrap_bio(incoming, outgoing, server_side=server_side,
+                                server_hostname=server_hostname,
+                                session=session or self.session)
+
+
+def client_context(verify=True, cafile=None):
+    """Creates a TLS context for connections to an IRC network.
+
+    Args:
+        verify (bool, optional): Whether to verify the server certificate
+            and hostname. Defaults to ``True``.
+        cafile (str, optional): Certificates to trust, in place of the
+            system's. Defaults to ``None``.
+
+    Returns:
+        ssl.SSLContext: A SessionContext, which resumes its last session, or
+        a plain context where Python cannot resume sessions.
+    """
+
+    factory = SessionContext if hasattr(ssl, "SSLSession") else ssl.SSLContext
+    context = factory(getattr(ssl, "PROTOCOL_TLS_CLIENT",
+                              ssl.PROTOCOL_SSLv23))
+    if verify:
+        context.verify_mode = ssl.CERT_REQUIRED
+        context.check_hostname = True
+        if cafile: context.load_verify_locations(cafile)
+        else: context.load_default_certs()
+    else:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def server_context(certfile, keyfile=None):
+    """Creates a TLS context for the listen server.
+
+    OpenSSL keeps a session cache and issues session tickets by default, so
+    IRC clients that reconnect may resume their sessions.
+
+    Args:
+        certfile (str): The certificate chain, in PEM format.
+        keyfile (str, optional): The private key, if not in the certfile.
+            Defaults to ``None``.
+
+    Returns:
+        ssl.SSLContext: A server context.
+    """
+
+    context = ssl.SSLContext(getattr(ssl, "PROTOCOL_TLS_SERVER",
+                                     ssl.PROTOCOL_SSLv23))
+    context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+def remember(transport):
+    """Saves the TLS session of a connection, for its context to resume.
+
+    Under TLS 1.3, the session ticket arrives after the handshake, so this is
+    best called once the server has sent some data, e.g. once registered.
+
+    Args:
+        transport (asyncio.Transport): A connection made with a
+            SessionContext, or any other transport, which is ignored.
+    """
+
+    ssl_object = transport.get_extra_info("ssl_object") if transport else None
+    session = getattr(ssl_object, "session", None)
+    if session and isinstance(ssl_object.context, SessionContext):
+        ssl_object.context.session = session
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Sputnik modules import one another by name, as they do when run as a folder.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "sputnik"))
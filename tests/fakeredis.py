@@ -0,0 +1,106 @@
+"""A minimal in-process Redis server, for testing the AsyncDatastore.
+
+Only the commands used by Sputnik are implemented. Each chunk of data received
+is counted as a batch, so that tests can check how commands were pipelined.
+"""
+
+import asyncio
+import fnmatch
+
+from sputnik import resp
+
+
+class FakeRedis(asyncio.Protocol):
+    def __init__(self, data):
+        self.data = data
+        self.parser = resp.ReplyParser()
+        self.queue = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.data["batches"] = self.data.get("batches", 0) + 1
+        for command in self.parser.feed(data):
+            name = command[0].decode().upper()
+            args = [arg.decode() for arg in command[1:]]
+            self.data.setdefault("commands", []).append(name)
+
+            if name == "MULTI": self.queue, reply = [], "OK"
+            elif name == "EXEC":
+                reply = [getattr(self, queued)(*queued_args)
+                         for queued, queued_args in self.queue]
+                self.queue = None
+            elif self.queue is not None:
+                self.queue.append((name, args))
+                reply = "QUEUED"
+            else: reply = getattr(self, name)(*args)
+            self.transport.write(self.reply(reply))
+
+    def reply(self, value):
+        if value is None: return b"$-1\r\n"
+        if isinstance(value, int): return (":%d\r\n" % value).encode()
+        if isinstance(value, list):
+            return b"".join([("*%d\r\n" % len(value)).encode()] +
+                            [self.reply(item) for item in value])
+        value = value.encode()
+        return ("$%d\r\n" % len(value)).encode() + value + b"\r\n"
+
+    @property
+    def keys(self):
+        return self.data.setdefault("keys", {})
+
+    def PING(self): return "PONG"
+    def GET(self, key): return self.keys.get(key)
+    def MGET(self, *keys): return [self.keys.get(key) for key in keys]
+    def KEYS(self, pattern): return fnmatch.filter(self.keys, pattern)
+
+    def SET(self, key, value):
+        self.keys[key] = value
+        return "OK"
+
+    def DEL(self, *keys):
+        return sum(self.keys.pop(key, None) is not None for key in keys)
+
+    def SADD(self, key, *members):
+        members = set(members) - self.keys.setdefault(key, set())
+        self.keys[key] |= members
+        return len(members)
+
+    def SREM(self, key, *members):
+        members = set(members) & self.keys.get(key, set())
+        self.keys.get(key, set()).difference_update(members)
+        return len(members)
+
+    def SMEMBERS(self, key):
+        return sorted(self.keys.get(key, set()))
+
+    def HMSET(self, key, *pairs):
+        self.keys.setdefault(key, {}).update(zip(pairs[::2], pairs[1::2]))
+        return "OK"
+
+    def HSET(self, key, field, value):
+        new = field not in self.keys.setdefault(key, {})
+        self.keys[key][field] = value
+        return int(new)
+
+    def HDEL(self, key, *fields):
+        return sum(self.keys.get(key, {}).pop(field, None) is not None
+                   for field in fields)
+
+    def HGETALL(self, key):
+        return [item for pair in self.keys.get(key, {}).items()
+                for item in pair]
+
+
+def start(loop):
+    """Starts a FakeRedis server on an ephemeral port.
+
+    Returns:
+        tuple: The server, its shared state, and the port it listens on.
+    """
+
+    data = {}
+    server = loop.run_until_complete(loop.create_server(
+        lambda: FakeRedis(data), "127.0.0.1", 0))
+    return server, data, server.sockets[0].getsockname()[1]
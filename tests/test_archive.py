@@ -0,0 +1,151 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from sputnik import archive
+
+
+class TestLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fill(self, log, count, step=10):
+        for number in range(count):
+            log.append(1000 + number * step,
+                       ("PRIVMSG #a :%d\r\n" % number).encode())
+
+    def test_read(self):
+        log = archive.Log(self.directory)
+        self.fill(log, 1000)
+
+        records = log.read(since=5000, until=5050)
+        self.assertEqual([stamp for stamp, _ in records],
+                         [5000, 5010, 5020, 5030, 5040])
+        self.assertEqual(records[0][1], b"PRIVMSG #a :400\r\n")
+        self.assertEqual(len(log.read(since=5000, limit=3)), 3)
+        self.assertEqual(len(log.read()), 1000)
+
+        # the index is sparse, but covers the whole segment
+        segment = log.segments[-1]
+        self.assertGreater(len(segment.times), 1)
+        self.assertLess(len(segment.times), 100)
+
+    def test_before(self):
+        log = archive.Log(self.directory, max_bytes=8192)
+        self.fill(log, 1000)
+        self.assertGreater(len(log.segments), 1)
+
+        records = log.before(until=5000, limit=3)
+        self.assertEqual([stamp for stamp, _ in records], [4970, 4980, 4990])
+        records = log.before(limit=2)
+        self.assertEqual([stamp for stamp, _ in records], [10980, 10990])
+
+        # reads span index blocks and segments, oldest first
+        records = log.before(until=10000, limit=600)
+        self.assertEqual([stamp for stamp, _ in records],
+                         list(range(4000, 10000, 10)))
+        self.assertEqual(len(log.before(until=10000, since=9000)), 100)
+
+        def even(line): return int(line.split(b":")[1]) % 2 == 0
+
+        records = log.before(until=5000, limit=2, match=even)
+        self.assertEqual([line for _, line in records],
+                         [b"PRIVMSG #a :396\r\n", b"PRIVMSG #a :398\r\n"])
+        self.assertEqual(len(log.read(since=5000, limit=5, match=even)), 5)
+
+    def test_reopen(self):
+        log = archive.Log(self.directory)
+        self.fill(log, 100)
+        log.close()
+
+        # a torn record left by a crash is discarded
+        path = log.segments[-1].path + ".log"
+        with open(path, "ab") as data: data.write(b"2000 PRIVMSG #a :tor")
+
+        log = archive.Log(self.directory)
+        self.assertEqual(len(log.read()), 100)
+        log.append(500, b"PRIVMSG #a :late\r\n")
+        records = log.read(since=1990)
+        self.assertEqual(records, [(1990, b"PRIVMSG #a :99\r\n"),
+                                   (1990, b"PRIVMSG #a :late\r\n")])
+
+    def test_rotate_and_compact(self):
+        log = archive.Log(self.directory, max_bytes=1024, max_age=1,
+                          retention=5, max_total=1 << 20)
+        self.fill(log, 200)
+        self.assertGreater(len(log.segments), 3)
+        self.assertEqual(len(log.read()), 200)
+
+        # segments older than the retention period are deleted on rotation
+        log.append(1000 + 200 * 10 + 60000, b"PRIVMSG #a :later\r\n")
+        log.append(1000 + 200 * 10 + 61000, b"PRIVMSG #a :latest\r\n")
+        records = log.read()
+        self.assertLess(len(records), 200)
+        self.assertEqual(records[-1][1], b"PRIVMSG #a :latest\r\n")
+        self.assertEqual(len(os.listdir(self.directory)),
+                         2 * len(log.segments))
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.directory)
+
+    def test_archive(self):
+        store = archive.Archive(self.directory, interval=0.01)
+        store.append("freenode", "#Sputnik", b"PRIVMSG #Sputnik :hi\r\n", 10)
+        store.append("freenode", "#a/b", b"PRIVMSG #a/b :hi\r\n", 20)
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertIsNone(store.timer)
+
+        self.assertEqual(store.read("freenode", "#sputnik"),
+                         [(10, b"PRIVMSG #Sputnik :hi\r\n")])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.directory,
+                                                        "freenode"))),
+                         ["#a%2Fb", "#sputnik"])
+
+        # queries for unknown targets create nothing
+        self.assertEqual(store.read("freenode", "#unknown"), [])
+        self.assertEqual(store.before("efnet", "#unknown"), [])
+        self.assertEqual(len(store.logs), 2)
+        self.assertEqual(sorted(os.listdir(self.directory)), ["freenode"])
+        store.close()
+
+    def test_open_logs(self):
+        store = archive.Archive(self.directory, open_logs=2)
+        for number, target in enumerate(["a", "b", "a", "c"]):
+            store.append("efnet", target, b"PRIVMSG x :hi\r\n", number)
+        store.append("efnet", "a", b"PRIVMSG a :hi\r\n", 4)
+
+        # the least recently used Log is closed, and loaded again on demand
+        self.assertEqual(list(store.logs), [("efnet", "c"), ("efnet", "a")])
+        self.assertEqual(store.unsynced,
+                         [os.path.join(self.directory, "efnet", "b",
+                                       "0000000000001.log")])
+        self.assertEqual(len(store.read("efnet", "b")), 1)
+        self.assertEqual(len(store.read("efnet", "a")), 3)
+        store.close()
+
+    def test_escape(self):
+        self.assertEqual(archive.escape(".."), "%2E%2E")
+        self.assertEqual(archive.escape("."), "%2E")
+        self.assertEqual(archive.escape("a.b/c"), "a.b%2Fc")
+        self.assertEqual(archive.escape("#a&b", safe="#&"), "#a&b")
+
+        store = archive.Archive(self.directory)
+        store.append("..", "..", b"PRIVMSG .. :hi\r\n", 10)
+        store.close()
+        self.assertEqual(os.listdir(self.directory), ["%2E%2E"])
+
+if __name__ == "__main__":
+    unittest.main()
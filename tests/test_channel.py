@@ -0,0 +1,105 @@
+import unittest
+
+from sputnik import channel
+
+
+class TestPackJoins(unittest.TestCase):
+    def test_pack(self):
+        self.assertEqual(channel.pack_joins({"#a": None, "#b": "key",
+                                             "#c": None, "#d": "pw"}),
+                         ["JOIN #b,#d,#a,#c key,pw"])
+        self.assertEqual(channel.pack_joins({}), [])
+
+    def test_limit(self):
+        channels = { "#channel%03d" % n : None for n in range(200) }
+        channels["#keyed"] = "secret"
+        lines = channel.pack_joins(channels)
+
+        self.assertTrue(all(len(line.encode()) <= 510 for line in lines))
+        self.assertTrue(lines[0].endswith(" secret"))
+        self.assertEqual(len(lines), 5)
+        joined = [name for line in lines
+                  for name in line.split()[1].split(",")]
+        self.assertEqual(sorted(joined), sorted(channels))
+
+
+class TestChannel(unittest.TestCase):
+    def setUp(self):
+        self.channel = channel.Channel("#sputnik")
+        self.channel.add_names("=", "@alice +bob carol")
+
+    def test_names(self):
+        self.assertEqual(self.channel.members, {"alice": "@", "bob": "+",
+                                                "carol": ""})
+
+        # a fresh NAMES reply replaces the member list once one has completed
+        self.channel.synced = True
+        self.channel.add_names("@", "dave")
+        self.assertEqual(self.channel.members, {"dave": ""})
+        self.assertEqual(self.channel.symbol, "@")
+
+    def test_set_mode(self):
+        self.channel.set_mode("+v-o+b", ["alice", "alice", "*!*@spam"])
+        self.channel.set_mode("+o", ["bob"])
+        self.assertEqual(self.channel.members, {"alice": "+", "bob": "@+",
+                                                "carol": ""})
+
+    def test_snapshot(self):
+        self.channel.topic = "Welcome"
+        self.channel.topic_info = ["alice", "1420070400"]
+        lines = self.channel.snapshot("irc.example.net", "me", "me!u@h")
+        self.assertEqual(lines, [
+            ":me!u@h JOIN #sputnik",
+            ":irc.example.net 332 me #sputnik :Welcome",
+            ":irc.example.net 333 me #sputnik alice 1420070400",
+            ":irc.example.net 353 me = #sputnik :@alice +bob carol",
+            ":irc.example.net 366 me #sputnik :End of /NAMES list."])
+
+    def test_channel_modes(self):
+        self.channel.set_mode("+ntk-t+lb", ["key", "10", "*!*@spam"])
+        self.assertEqual(self.channel.mode_params(), ["+kln", "key", "10"])
+        self.channel.set_mode("-kl", ["key"])
+        self.assertEqual(self.channel.mode_params(), ["+n"])
+
+    def test_isupport(self):
+        prefixes = channel.parse_prefix("(Yov)!@+")
+        self.assertEqual(list(prefixes.items()),
+                         [("Y", "!"), ("o", "@"), ("v", "+")])
+        self.assertIsNone(channel.parse_prefix("(ov)@"))
+        chanmodes = channel.parse_chanmodes("beI,k,l,imnpst,X")
+        self.assertEqual(chanmodes, ("beI", "k", "l", "imnpst"))
+
+        # members are tracked with the prefixes the network advertises
+        self.channel.add_names("=", "!erin", prefixes)
+        self.channel.set_mode("+vY", ["alice", "bob"], prefixes, chanmodes)
+        self.assertEqual(self.channel.members["alice"], "@+")
+        self.assertEqual(self.channel.members["bob"], "!+")
+        self.assertEqual(self.channel.members["erin"], "!")
+
+    def test_replies(self):
+        self.assertEqual(self.channel.topic_replies("irc", "me"),
+                         [":irc 331 me #sputnik :No topic is set."])
+
+        users = { "alice" : channel.User("a", "host") }
+        self.assertIsNone(self.channel.who("irc", "me", users))
+        for nick in ("alice", "bob", "carol"):
+            user = users.setdefault(nick, channel.User(nick[0], "host"))
+            user.server, user.realname = "irc", nick.title()
+        users["bob"].away = True
+        self.assertEqual(self.channel.who("irc", "me", users), [
+            ":irc 352 me #sputnik a host irc alice H@ :0 Alice",
+            ":irc 352 me #sputnik b host irc bob G+ :0 Bob",
+            ":irc 352 me #sputnik c host irc carol H :0 Carol",
+            ":irc 315 me #sputnik :End of /WHO list."])
+
+    def test_snapshot_long_names(self):
+        for number in range(200): self.channel.members["nick%d" % number] = ""
+        lines = self.channel.snapshot("irc.example.net", "me", "me!u@h")
+        names = [line for line in lines if " 353 " in line]
+        self.assertGreater(len(names), 1)
+        for line in names: self.assertLessEqual(len(line) + 2, 512)
+        self.assertEqual(sum(len(line.split(":")[2].split())
+                             for line in names), 203)
+
+if __name__ == "__main__":
+    unittest.main()
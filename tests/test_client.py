@@ -0,0 +1,390 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import types
+import unittest
+
+from sputnik import archive
+from sputnik import client
+from sputnik import history
+from sputnik import network
+from sputnik import throttle
+
+
+class Transport(object):
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(bytes(data))
+
+    def writelines(self, lines):
+        self.written.extend(bytes(line) for line in lines)
+
+    def set_write_buffer_limits(self, high, low): pass
+
+    def get_extra_info(self, name): return ("192.0.2.1", 50000)
+
+    def close(self): self.closed = True
+
+
+class UnixTransport(Transport):
+    def get_extra_info(self, name): return None
+
+
+class Bouncer(object):
+    def __init__(self):
+        self.clients = set()
+        self.networks = {}
+        self.subscribers = {}
+        self.datastore = None
+        self.archive = None
+        self.logins = throttle.Limiter(rate=0.1, burst=2)
+
+
+class Datastore(object):
+    def is_verified(self, password):
+        return False
+
+    def check_password(self, password):
+        future = asyncio.Future()
+        future.set_result(password == "cosmonaut")
+        return future
+
+
+class TestClient(unittest.TestCase):
+    def setUp(self):
+        self.transport = Transport()
+        self.client = client.Client(Bouncer())
+        self.client.connection_made(self.transport)
+
+    def test_is_chat(self):
+        self.assertTrue(client.is_chat(b":a!b@c PRIVMSG #d :e\r\n"))
+        self.assertTrue(client.is_chat(b"@time=x :a!b@c NOTICE #d :e\r\n"))
+        self.assertFalse(client.is_chat(b":a!b@c JOIN #d\r\n"))
+        self.assertFalse(client.is_chat(b"PING :e\r\n"))
+
+    def test_cap(self):
+        self.client.data_received(b"CAP LS 302\r\n")
+        self.assertTrue(self.client.negotiating)
+        self.assertEqual(self.transport.written,
+                         [b":sputnik CAP * LS :batch server-time\r\n"])
+
+        self.client.data_received(b"CAP REQ :server-time batch\r\n"
+                                  b"CAP REQ :draft/chathistory\r\n"
+                                  b"CAP END\r\n")
+        self.assertEqual(self.transport.written[1:], [
+            b":sputnik CAP * ACK :server-time batch\r\n",
+            b":sputnik CAP * NAK :draft/chathistory\r\n"])
+        self.assertEqual(self.client.caps, {"server-time", "batch"})
+        self.assertFalse(self.client.negotiating)
+
+
+class Broker(object):
+    source = "nick!user@host"
+
+    def __init__(self):
+        self.transport = Transport()
+        self.relayed = []
+        self.sent = []
+        self.archived = []
+
+    def archive(self, encoded, timestamp, *targets):
+        self.archived.append(encoded)
+
+    def relay(self, lines):
+        self.relayed.extend(lines)
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+class TestRelay(unittest.TestCase):
+    def setUp(self):
+        self.bouncer = Bouncer()
+        self.client = client.Client(self.bouncer)
+        self.client.connection_made(Transport())
+        self.client.broker = self.broker = Broker()
+        self.client.ready = True
+
+    def test_command_of(self):
+        self.assertEqual(client.command_of(memoryview(b"mode #a +o b\r\n")),
+                         "MODE")
+        self.assertEqual(client.command_of(memoryview(b"AWAY\r\n")), "AWAY")
+        self.assertEqual(client.command_of(
+            memoryview(b"@label=1 :nick WHO #a\r\n")), "WHO")
+
+    def test_relay(self):
+        data = b"MODE #a +o b\r\nAWAY :out\nJOIN #b\r\nPRIVMSG #a :hi\r\n"
+        self.client.data_received(data)
+
+        # unhandled lines are relayed untouched, without being copied
+        self.assertEqual([bytes(line) for line in self.broker.relayed],
+                         [b"MODE #a +o b\r\n", b"AWAY :out\r\n",
+                          b"PRIVMSG #a :hi\r\n"])
+        self.assertIs(self.broker.relayed[0].obj, data)
+        self.assertEqual(self.broker.sent, ["JOIN #b\r\n"])
+
+        # chat messages are inspected when there is an Archive to keep them
+        self.bouncer.archive = object()
+        self.client.data_received(b"PRIVMSG #a :hi\r\n")
+        self.assertEqual(len(self.broker.relayed), 3)
+        self.assertEqual(self.broker.sent[-1], "PRIVMSG #a :hi\r\n")
+        self.assertEqual(self.broker.archived,
+                         [b":nick!user@host PRIVMSG #a :hi\r\n"])
+
+
+class TestAuthentication(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.bouncer = Bouncer()
+        self.bouncer.datastore = Datastore()
+        self.bouncer.networks["freenode"] = types.SimpleNamespace(
+            chat_history=types.SimpleNamespace(first=0))
+
+    def tearDown(self):
+        self.loop.close()
+
+    def connect(self, *lines, transport=None):
+        transport = transport or Transport()
+        connection = client.Client(self.bouncer)
+        connection.connection_made(transport)
+        connection.data_received(b"".join(line + b"\r\n" for line in lines))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        return connection, transport
+
+    def test_password(self):
+        connection, transport = self.connect(b"PASS cosmonaut", b"JOIN #a")
+        self.assertTrue(connection.authenticated)
+        self.assertFalse(hasattr(transport, "closed"))
+
+    def test_rejected(self):
+        # nothing but registration is handled before the password is checked
+        connection, transport = self.connect(b"PASS wrong", b"JOIN #a")
+        self.assertFalse(connection.authenticated)
+        self.assertEqual(transport.written,
+                         [b":sputnik 464 * :Password Incorrect\r\n"])
+        self.assertTrue(transport.closed)
+
+        connection, transport = self.connect(b"USER freenode 0 * :real")
+        self.assertEqual(transport.written,
+                         [b":sputnik 464 * :Password Required\r\n"])
+
+    def test_limit(self):
+        self.connect(b"PASS wrong")
+        self.connect(b"PASS wrong")
+        connection, transport = self.connect(b"PASS cosmonaut")
+        self.assertFalse(connection.authenticated)
+        self.assertEqual(transport.written,
+                         [b":sputnik 464 * :Too Many Attempts\r\n"])
+
+    def test_subscribers(self):
+        # only authenticated Clients of existing Networks are subscribed
+        self.connect(b"USER nowhere 0 * :real")
+        self.connect(b"USER freenode 0 * :real")
+        self.assertEqual(self.bouncer.subscribers, {})
+
+    def test_relayed(self):
+        # relayed Clients are limited by the address in their PROXY header
+        def header(host):
+            return ("PROXY TCP4 192.0.2.%d 192.0.2.9 1 2" % host).encode()
+
+        for _ in range(2):
+            self.connect(header(2), b"PASS wrong", transport=UnixTransport())
+        connection, transport = self.connect(header(3), b"PASS cosmonaut",
+                                             transport=UnixTransport())
+        self.assertEqual(connection.address(), "192.0.2.3")
+        self.assertTrue(connection.authenticated)
+
+        # the header is only trusted from a Unix socket
+        connection, _ = self.connect(header(4), b"PASS cosmonaut")
+        self.assertEqual(connection.address(), "192.0.2.1")
+
+
+class TestDelivery(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.bouncer = Bouncer()
+        self.network = network.Network(self.bouncer, "net", "localhost", 6667,
+                                       "nick", "user", "real")
+        self.network.connection_made(Transport())
+        self.bouncer.networks["net"] = self.network
+
+    def tearDown(self):
+        self.loop.close()
+
+    def attach(self, *caps):
+        transport = Transport()
+        connection = client.Client(self.bouncer)
+        connection.connection_made(transport)
+        connection.caps.update(caps)
+        connection.data_received(b"USER net 0 * :real\r\n")
+        return connection
+
+    def test_ping(self):
+        # keepalives are answered at once, even while the bucket is empty
+        self.network.bucket.tokens = 0
+        self.network.send("PRIVMSG", "#a", ":queued")
+        self.network.data_received(b"PING :irc.example.net\r\n")
+        self.assertEqual(self.network.transport.written[-1],
+                         b"PONG :irc.example.net\r\n")
+        self.assertEqual(list(self.network.priority),
+                         [b"PRIVMSG #a :queued\r\n"])
+        self.network.draining.cancel()
+
+    def overflow(self, policy):
+        # a paused Client is sent more lines than the history holds
+        self.network.chat_history = history.History(max_lines=4)
+        connection = self.attach()
+        connection.overflow = policy
+        connection.pause_writing()
+        written = len(connection.transport.written)
+        lines = [(":a!b@c PRIVMSG #a :%d\r\n" % number).encode()
+                 for number in range(6)]
+        self.network.data_received(b"".join(lines))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(len(connection.transport.written), written)
+        connection.resume_writing()
+        return connection, connection.transport.written[written:], lines
+
+    def test_overflow_drop(self):
+        # the Client resumes from the oldest line still retained
+        connection, written, lines = self.overflow("drop")
+        self.assertEqual(written, [b"".join(lines[2:])])
+        self.assertEqual(connection.cursor, self.network.chat_history.next)
+        self.assertFalse(hasattr(connection.transport, "closed"))
+
+    def test_overflow_disconnect(self):
+        connection, written, lines = self.overflow("disconnect")
+        self.assertEqual(written, [])
+        self.assertTrue(connection.transport.closed)
+
+    def test_subscribers(self):
+        connection = self.attach()
+        self.assertEqual(self.bouncer.subscribers, {"net": {connection}})
+        connection.data_received(b"USER nowhere 0 * :real\r\n")
+        self.assertEqual(self.bouncer.subscribers, {})
+
+        # empty indexes are removed once their last Client disconnects
+        connection = self.attach()
+        connection.connection_lost(None)
+        self.assertEqual(self.bouncer.subscribers, {})
+
+    def test_unknown_history(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.bouncer.archive = archive.Archive(directory)
+        connection = self.attach("batch", "draft/chathistory")
+        connection.transport.written = []
+        connection.data_received(b"CHATHISTORY LATEST #nowhere * 10\r\n")
+
+        # an unknown target is answered with an empty batch, creating nothing
+        self.assertEqual(connection.transport.written,
+                         [b":sputnik BATCH +1 chathistory #nowhere\r\n"
+                          b":sputnik BATCH -1\r\n"])
+        self.assertEqual((self.bouncer.archive.logs, os.listdir(directory)),
+                         ({}, []))
+
+    def test_as_received(self):
+        plain = self.attach().transport
+        timed = self.attach("server-time").transport
+        other = self.attach("server-time").transport
+        self.network.data_received(b":irc.example.net 001 nick :Welcome\n"
+                                   b":a!b@c PRIVMSG #d :caf\xe9\r\n")
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        # lines are recorded and delivered exactly as they were received
+        self.assertEqual(self.network.registration,
+                         [b":irc.example.net 001 nick :Welcome\r\n"])
+        self.assertTrue(plain.written[-1].endswith(
+            b"\r\n:a!b@c PRIVMSG #d :caf\xe9\r\n"))
+
+        # and each line is tagged once for every Client with server-time
+        lines, _ = self.network.chat_history.read(0)
+        tagged = self.network.stamp(0, lines)
+        self.assertTrue(tagged[1].startswith(b"@time="))
+        self.assertTrue(tagged[1].endswith(b" :a!b@c PRIVMSG #d :caf\xe9\r\n"))
+        self.assertIs(self.network.stamp(1, lines[1:])[0], tagged[1])
+        self.assertEqual(timed.written[-1], b"".join(tagged))
+        self.assertEqual(other.written[-1], b"".join(tagged))
+
+    def test_attach(self):
+        self.network.data_received(
+            b":irc 001 nick :Welcome\r\n"
+            b":nick!user@host JOIN #a\r\n"
+            b":irc 353 nick = #a :nick alice\r\n"
+            b":irc 366 nick #a :End of /NAMES list.\r\n"
+            b":alice!a@b PRIVMSG #a :hi\r\n"
+            b":bob!b@c JOIN #a\r\n")
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        # the snapshot stands in for everything but the chat messages
+        for caps in [(), ("server-time",)]:
+            written = b"".join(self.attach(*caps).transport.written)
+            self.assertEqual(written.count(b" 001 "), 1)
+            self.assertEqual(written.count(b" JOIN #a"), 1)
+            self.assertEqual(written.count(b" 353 "), 1)
+            self.assertIn(b" :nick alice bob\r\n", written)
+            self.assertTrue(written.endswith(b"PRIVMSG #a :hi\r\n"))
+
+    def test_nick(self):
+        self.network.data_received(
+            b":irc 001 nick :Welcome\r\n"
+            b":nick!user@host JOIN #a\r\n"
+            b":irc 353 nick = #a :nick\r\n"
+            b":irc 366 nick #a :End of /NAMES list.\r\n"
+            b":nick!user@host NICK renamed\r\n")
+        self.assertEqual(self.network.source, "renamed!user@host")
+
+        # the Client learns of the change before the snapshot of our channels
+        lines = b"".join(self.attach().transport.written).split(b"\r\n")
+        self.assertEqual(lines[1:4], [b":nick!user@host NICK renamed",
+                                      b":renamed!user@host JOIN #a",
+                                      b":irc 353 renamed = #a :renamed"])
+
+    def test_queries(self):
+        connection = self.attach()
+        transport = connection.transport
+        self.network.data_received(
+            b":irc 001 nick :Welcome\r\n"
+            b":irc 005 nick PREFIX=(ov)@+ CHANMODES=b,k,l,nt :supported\r\n"
+            b":nick!user@host JOIN #a\r\n"
+            b":irc 353 nick = #a :nick @alice\r\n"
+            b":irc 366 nick #a :End of /NAMES list.\r\n")
+        self.loop.run_until_complete(asyncio.sleep(0))
+        written = len(transport.written)
+
+        # NAMES and TOPIC are answered from memory, and WHO is forwarded
+        # until every member is known
+        connection.data_received(b"NAMES #a\r\nTOPIC #a\r\nWHO #a\r\n")
+        self.assertEqual(transport.written[written:], [
+            b":irc 353 nick = #a :nick @alice\r\n"
+            b":irc 366 nick #a :End of /NAMES list.\r\n",
+            b":irc 331 nick #a :No topic is set.\r\n"])
+        self.assertEqual(self.network.transport.written[-1], b"WHO #a\r\n")
+
+        self.network.data_received(
+            b":irc 352 nick #a user host irc nick H :0 Real\r\n"
+            b":irc 352 nick #a a b irc alice G@ :0 Alice\r\n"
+            b":irc 315 nick #a :End of /WHO list.\r\n")
+        self.loop.run_until_complete(asyncio.sleep(0))
+        sent = len(self.network.transport.written)
+        connection.data_received(b"WHO #a\r\n")
+        self.assertEqual(len(self.network.transport.written), sent)
+        self.assertEqual(transport.written[-1],
+                         b":irc 352 nick #a user host irc nick H :0 Real\r\n"
+                         b":irc 352 nick #a a b irc alice G@ :0 Alice\r\n"
+                         b":irc 315 nick #a :End of /WHO list.\r\n")
+
+        # members are forgotten once we no longer share a channel with them
+        self.network.data_received(b":alice!a@b PART #a\r\n")
+        self.assertEqual(list(self.network.users), ["nick"])
+        self.assertEqual(self.network.roster(), [
+            { "name" : "#a", "topic" : None, "count" : 1,
+              "members" : ["nick"] }])
+
+if __name__ == "__main__":
+    unittest.main()
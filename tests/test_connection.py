@@ -0,0 +1,60 @@
+import unittest
+
+from sputnik import connection
+
+
+class TestLineBuffer(unittest.TestCase):
+    def setUp(self):
+        self.linebuffer = connection.LineBuffer(limit=16)
+
+    def test_complete_lines(self):
+        lines = self.linebuffer.feed(b"PING :a\r\nPING :b\r\n")
+        self.assertEqual(lines, [b"PING :a", b"PING :b"])
+        self.assertEqual(len(self.linebuffer.buffer), 0)
+
+    def test_split_lines(self):
+        # a line split at every possible byte boundary is still framed once
+        data = b"PING :a\r\nPING :b\r\n"
+        for split in range(len(data) + 1):
+            linebuffer = connection.LineBuffer()
+            lines = linebuffer.feed(data[:split])
+            lines += linebuffer.feed(data[split:])
+            self.assertEqual(lines, [b"PING :a", b"PING :b"])
+
+    def test_single_bytes(self):
+        lines = []
+        for byte in b"PING :a\r\n\r\nPING :b\n":
+            lines.extend(self.linebuffer.feed(bytes([byte])))
+        self.assertEqual(lines, [b"PING :a", b"PING :b"])
+
+    def test_overlong_lines(self):
+        # overlong lines are dropped whole, whether or not they are complete
+        lines = self.linebuffer.feed(b"X" * 20 + b"\r\nPING :a\r\n")
+        self.assertEqual(lines, [b"PING :a"])
+
+        self.assertEqual(self.linebuffer.feed(b"X" * 10), [])
+        self.assertEqual(self.linebuffer.feed(b"X" * 10), [])
+        self.assertEqual(self.linebuffer.feed(b"X" * 10), [])
+        self.assertEqual(self.linebuffer.feed(b"X\r\nPING :b\r\n"),
+                         [b"PING :b"])
+
+    def test_frames(self):
+        # frames are the lines of feed, ending in CRLF, however data is split
+        data = (b"PING :a\r\n\r\nPING :b\nPING :c\r\r\n" + b"X" * 20 +
+                b"\r\nPING :d\r\n")
+        for split in range(len(data) + 1):
+            feed, frames = (connection.LineBuffer(limit=16),
+                            connection.LineBuffer(limit=16))
+            lines = feed.feed(data[:split]) + feed.feed(data[split:])
+            framed = frames.frames(data[:split]) + frames.frames(data[split:])
+            self.assertEqual([bytes(frame) for frame in framed],
+                             [line + b"\r\n" for line in lines])
+
+        # lines ending in CRLF are views of the data received, not copies
+        data = b"PING :a\r\nPING :b\n"
+        first, second = self.linebuffer.frames(data)
+        self.assertIs(first.obj, data)
+        self.assertEqual(bytes(second), b"PING :b\r\n")
+
+if __name__ == "__main__":
+    unittest.main()
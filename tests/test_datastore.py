@@ -1,7 +1,10 @@
+import asyncio
+import json
 import unittest
 import bcrypt
 
 from sputnik import datastore
+from tests import fakeredis
 
 
 class TestDatastore(unittest.TestCase):
@@ -54,6 +57,26 @@ class TestDatastore(unittest.TestCase):
         self.assertEqual(len(networks), 1)
         self.assertNotIn("freenode", networks)
 
+    def test_migrate(self):
+        # set up with the original key scheme
+        self.datastore.database.set("network=freenode", json.dumps(
+            { "network" : "freenode", "hostname" : "irc.freenode.net",
+              "port" : 6667, "nickname" : "freenick", "username" : "freeuser",
+              "realname" : "freereal", "password" : None }))
+        self.datastore.database.set("channel=freenode:#test", "")
+        self.datastore.database.set("channel=freenode2:#test", "secret")
+
+        # test migrate() converts and removes the original keys
+        self.datastore.migrate()
+        self.assertEqual(self.datastore.database.keys("network=*"), [])
+        self.assertEqual(self.datastore.database.keys("channel=*"), [])
+        networks = self.datastore.get_networks()
+        self.assertEqual(networks["freenode"]["port"], 6667)
+        self.assertEqual(self.datastore.get_channels("freenode"),
+                         { "freenode:#test" : None })
+        self.assertEqual(self.datastore.get_channels("freenode2"),
+                         { "freenode2:#test" : "secret" })
+
     def test_password(self):
         # check default password status
         self.assertIsNone(self.datastore.get_password())
@@ -78,5 +101,163 @@ class TestDatastore(unittest.TestCase):
                                        stored_password.encode()).decode(),
                          stored_password)
 
+
+class TestAsyncDatastore(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server, self.redis, port = fakeredis.start(self.loop)
+        self.datastore = datastore.AsyncDatastore(hostname="127.0.0.1",
+                                                  port=port)
+        self.datastore.writes.interval = 0.01
+        self.wait(self.datastore.connect())
+
+    def tearDown(self):
+        self.datastore.connection.lost = None
+        if self.datastore.connection.transport:
+            self.datastore.connection.transport.close()
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    def wait(self, *coroutines):
+        return self.loop.run_until_complete(asyncio.gather(*coroutines))
+
+    def test_pipelining(self):
+        # writes issued in the same tick share a single round trip
+        self.redis["batches"] = 0
+        self.wait(self.datastore.add_channel("freenode", "test12345"),
+                  self.datastore.add_channel("quakenet", "test54321", "pw"),
+                  self.datastore.remove_channel("quakenet", "missing"))
+        self.assertEqual(self.redis["batches"], 1)
+
+    def test_reconnect(self):
+        # commands fail at once while disconnected, rather than hanging
+        self.datastore.connection.lost = None
+        self.datastore.connection.transport.close()
+        self.wait(asyncio.sleep(0.01))
+        with self.assertRaises(ConnectionError):
+            self.wait(self.datastore.execute("PING"))
+
+        self.wait(self.datastore.reconnect(base=0.01))
+        self.assertEqual(self.wait(self.datastore.execute("PING")), [b"PONG"])
+
+    def test_channels(self):
+        self.wait(self.datastore.add_channel("freenode", "test12345"),
+                  self.datastore.add_channel("quakenet", "test54321", "pw"))
+
+        channels, = self.wait(self.datastore.get_channels())
+        self.assertEqual(channels, {"freenode:test12345": None,
+                                    "quakenet:test54321": "pw"})
+
+        self.wait(self.datastore.remove_channel("quakenet", "test54321"))
+        channels, = self.wait(self.datastore.get_channels("quakenet"))
+        self.assertEqual(channels, {})
+
+        # test get_channels() does not match networks sharing a prefix
+        self.wait(self.datastore.add_channel("freenode2", "test12345"))
+        channels, = self.wait(self.datastore.get_channels("freenode"))
+        self.assertEqual(channels, {"freenode:test12345": None})
+
+    def test_write_behind(self):
+        # repeated writes to a channel collapse into its latest write
+        writes = [self.datastore.add_channel("freenode", "#a", "old"),
+                  self.datastore.add_channel("freenode", "#b"),
+                  self.datastore.remove_channel("freenode", "#b"),
+                  self.datastore.add_channel("freenode", "#a", "new")]
+        self.assertEqual(len(self.datastore.writes), 2)
+        self.assertEqual(self.redis.get("commands"), None)
+
+        self.wait(*writes)
+        self.assertEqual(self.redis["commands"],
+                         ["MULTI", "HSET", "HDEL", "SADD", "EXEC"])
+        self.assertEqual(self.redis["keys"]["channels:freenode"],
+                         {"#a": "new"})
+
+    def test_write_behind_limit(self):
+        self.datastore.writes.limit = 3
+        self.datastore.add_channel("freenode", "#a")
+        self.datastore.add_channel("freenode", "#b")
+        self.assertEqual(len(self.datastore.writes), 2)
+        self.datastore.add_channel("freenode", "#c")
+        self.assertEqual(len(self.datastore.writes), 0)
+
+    def test_write_behind_reconnect(self):
+        # writes flushed while disconnected are kept until they succeed
+        self.datastore.connection.lost = None
+        self.datastore.connection.transport.close()
+        self.wait(asyncio.sleep(0.01))
+
+        saved = self.datastore.add_channel("freenode", "#a", "old")
+        self.datastore.add_channel("freenode", "#b")
+        self.datastore.writes.flush()
+        # a newer write is not overwritten by the batch that failed
+        self.datastore.add_channel("freenode", "#a", "new")
+        self.wait(asyncio.sleep(0.05))
+        self.assertFalse(saved.done())
+        self.assertEqual(len(self.datastore.writes), 2)
+
+        self.wait(self.datastore.reconnect(base=0.01), saved)
+        self.assertEqual(len(self.datastore.writes), 0)
+        self.assertEqual(self.redis["keys"]["channels:freenode"],
+                         {"#a": "new", "#b": ""})
+
+    def test_networks(self):
+        self.wait(self.datastore.add_network("freenode", "irc.freenode.net",
+                                             6667, "freenick", "freeuser",
+                                             "freereal"),
+                  self.datastore.add_channel("freenode", "test12345"))
+
+        networks, = self.wait(self.datastore.get_networks())
+        self.assertEqual(networks["freenode"]["username"], "freeuser")
+
+        self.wait(self.datastore.remove_network("freenode"))
+        networks, channels = self.wait(self.datastore.get_networks(),
+                                       self.datastore.get_channels())
+        self.assertEqual((networks, channels), ({}, {}))
+
+    def test_load(self):
+        for name in ("freenode", "quakenet", "rizon"):
+            self.wait(self.datastore.add_network(name, "irc.%s.net" % name,
+                                                 6667, "nick", "user", "real"))
+        self.wait(self.datastore.add_channel("freenode", "#a"),
+                  self.datastore.add_channel("freenode", "#b", "pw"))
+
+        # every network and its channels take two round trips in total
+        self.redis["batches"] = 0
+        networks, = self.wait(self.datastore.load())
+        self.assertEqual(self.redis["batches"], 2)
+        self.assertEqual(sorted(networks), ["freenode", "quakenet", "rizon"])
+
+        credentials, channels = networks["freenode"]
+        self.assertEqual(credentials["hostname"], "irc.freenode.net")
+        self.assertFalse(credentials["tls"])
+        self.assertEqual(channels, {"#a": None, "#b": "pw"})
+        self.assertEqual(networks["rizon"][1], {})
+
+    def test_password(self):
+        self.wait(self.datastore.set_password("newpassword"))
+        stored, = self.wait(self.datastore.get_password())
+        self.assertEqual(bcrypt.hashpw(b"newpassword", stored.encode()),
+                         stored.encode())
+
+        # the stored hash is read from Redis only once
+        self.datastore.hashed = None
+        self.redis["commands"] = []
+        for _ in range(2): self.wait(self.datastore.get_password())
+        self.assertEqual(self.redis["commands"], ["GET"])
+
+        check = self.datastore.check_password
+        self.assertEqual(self.wait(check("wrong"), check("newpassword")),
+                         [False, True])
+        self.assertTrue(self.datastore.is_verified("newpassword"))
+        self.assertFalse(self.datastore.is_verified("wrong"))
+
+        # changing the password forgets the one verified
+        self.wait(self.datastore.set_password("other"))
+        self.assertFalse(self.datastore.is_verified("newpassword"))
+        self.assertEqual(self.wait(check("newpassword"), check("other")),
+                         [False, True])
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,72 @@
+import random
+import unittest
+
+from sputnik import history
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.history = history.History(max_lines=4, max_bytes=32)
+
+    def read(self, cursor):
+        lines, cursor = self.history.read(cursor)
+        return [bytes(line) for line in lines], cursor
+
+    def test_timestamps(self):
+        for number in range(6): self.history.append(b"x\r\n", number * 10)
+        self.assertEqual(self.history.timestamps(0), [20, 30, 40, 50])
+        self.assertEqual(self.history.timestamps(5), [50])
+
+    def test_append_and_read(self):
+        self.history.append(b"a\r\n")
+        self.history.append(b"b\r\n")
+        self.assertEqual(self.read(0), ([b"a\r\n", b"b\r\n"], 2))
+        self.assertEqual(self.read(1), ([b"b\r\n"], 2))
+        self.assertEqual(self.read(2), ([], 2))
+
+    def test_line_limit(self):
+        for line in [b"a\r\n", b"b\r\n", b"c\r\n", b"d\r\n", b"e\r\n"]:
+            self.history.append(line)
+        self.assertEqual(len(self.history), 4)
+
+        # a cursor behind the oldest line resumes from the oldest line
+        self.assertEqual(self.read(0), ([b"b\r\n", b"c\r\n",
+                                         b"d\r\n", b"e\r\n"], 5))
+
+    def test_byte_limit(self):
+        self.history.append(b"x" * 12 + b"\r\n")
+        self.history.append(b"y" * 12 + b"\r\n")
+        self.history.append(b"z" * 12 + b"\r\n")
+        self.assertEqual(self.read(0), ([b"y" * 12 + b"\r\n",
+                                         b"z" * 12 + b"\r\n"], 3))
+
+        self.history.append(b"x" * 40)
+        self.assertEqual(len(self.history), 2)
+
+    def test_independent_cursors(self):
+        self.history.append(b"a\r\n")
+        first, cursor = self.read(0)
+        self.history.append(b"b\r\n")
+        second, _ = self.read(cursor)
+        everything, _ = self.read(0)
+        self.assertEqual((first, second), ([b"a\r\n"], [b"b\r\n"]))
+        self.assertEqual(everything, [b"a\r\n", b"b\r\n"])
+
+    def test_random_lines(self):
+        # the ring always retains a suffix of what was appended, within limits
+        generator = random.Random(0)
+        ring = history.History(max_lines=16, max_bytes=256)
+        appended = []
+        for number in range(2000):
+            line = str(number).encode() * generator.randrange(1, 20) + b"\r\n"
+            ring.append(line)
+            appended.append(line)
+            lines, _ = ring.read(0)
+            lines = [bytes(line) for line in lines]
+            self.assertEqual(lines, appended[len(appended) - len(lines):])
+            self.assertLessEqual(len(lines), 16)
+            self.assertLessEqual(sum(map(len, lines)), 256)
+            self.assertEqual(lines[-1], line)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import io
+import logging
+import unittest
+from collections import deque
+
+from sputnik import log
+
+
+class TestLog(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+
+    def tearDown(self):
+        logger = logging.getLogger("sputnik")
+        for handler in list(logger.handlers): logger.removeHandler(handler)
+
+    def test_traffic(self):
+        writer = log.configure(level="INFO", traffic=["n2b"],
+                               networks=["freenode"], stream=self.stream)
+        self.assertTrue(log.N2B.isEnabledFor(logging.DEBUG))
+        self.assertFalse(log.B2C.isEnabledFor(logging.DEBUG))
+
+        log.N2B.debug("[N to B]\t%s", "PING :a", extra={"network": "freenode"})
+        log.N2B.debug("[N to B]\t%s", "PING :b", extra={"network": "quakenet"})
+        logging.getLogger("sputnik.network").info("Connected")
+        logging.getLogger("sputnik.network").debug("Ignored")
+        writer.stop()
+
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith("DEBUG [N to B]\tPING :a"))
+        self.assertTrue(lines[1].endswith("INFO Connected"))
+
+    def test_batching(self):
+        writes = []
+
+        class Stream(io.StringIO):
+            def write(self, data): writes.append(data)
+
+        records = deque(logging.makeLogRecord({"msg": "line %d",
+                                               "args": (number,)})
+                        for number in range(100))
+        writer = log.Writer(records, Stream(), logging.Formatter(),
+                            interval=60)
+        writer.start()
+        writer.stop()
+
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(writes[0].count("\n"), 100)
+
+    def test_dropped(self):
+        records = deque(maxlen=2)
+        handler = log.Handler(records)
+        for number in range(5):
+            handler.handle(logging.makeLogRecord({"msg": "line %d" % number}))
+        self.assertEqual(len(records), 2)
+        self.assertEqual(handler.dropped, 3)
+
+        stream = io.StringIO()
+        log.Writer(records, stream, logging.Formatter(),
+                   handler=handler).write()
+        self.assertEqual(stream.getvalue().splitlines(),
+                         ["line 3", "line 4", "Dropped 3 Log Records"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+
+from sputnik import connection
+from sputnik import message
+
+
+class TestMessage(unittest.TestCase):
+    def test_parse(self):
+        m = message.Message(":nick!user@host PRIVMSG #chan :hello there")
+        self.assertEqual(m.prefix, "nick!user@host")
+        self.assertEqual(m.nick, "nick")
+        self.assertEqual(m.command, "PRIVMSG")
+        self.assertEqual(m.params, ["#chan", "hello there"])
+        self.assertEqual(m.trailing, "hello there")
+        self.assertEqual(m.tags, {})
+
+    def test_parse_tags(self):
+        m = message.Message("@time=2015-01-01T00:00:00Z;msg=a\\sb\\:c\\\\;"
+                            "flag :server 001 nick :Welcome")
+        self.assertEqual(m.tags, {"time": "2015-01-01T00:00:00Z",
+                                  "msg": "a b;c\\", "flag": ""})
+        self.assertEqual(m.prefix, "server")
+        self.assertEqual(m.command, "001")
+        self.assertEqual(m.params, ["nick", "Welcome"])
+
+    def test_parse_params(self):
+        m = message.Message("MODE #chan +ov nick nick")
+        self.assertEqual(m.params, ["#chan", "+ov", "nick", "nick"])
+        self.assertIsNone(m.trailing)
+
+        m = message.Message("PING :irc.example.net")
+        self.assertEqual(m.params, ["irc.example.net"])
+
+        m = message.Message("PRIVMSG #chan ::) a :b")
+        self.assertEqual(m.params, ["#chan", ":) a :b"])
+
+    def test_parse_malformed(self):
+        # one-token and prefix-only lines must not raise
+        for line in ["PONG", ":server", "@tags", "@tags :server", ""]:
+            m = message.Message(line)
+            self.assertEqual(m.params, [])
+            self.assertIsNone(m.trailing)
+        self.assertEqual(message.Message("pong").command, "PONG")
+        self.assertEqual(message.Message(":server").command, "")
+
+        # repeated spaces between the tags, prefix and command are skipped
+        m = message.Message("@a=1  :server  ping  :x")
+        self.assertEqual((m.tags, m.prefix, m.command, m.params),
+                         ({"a": "1"}, "server", "PING", ["x"]))
+
+
+class TestTags(unittest.TestCase):
+    def test_time(self):
+        self.assertEqual(message.format_time(1420070400123),
+                         "2015-01-01T00:00:00.123Z")
+        self.assertEqual(message.parse_time("2015-01-01T00:00:00.123Z"),
+                         1420070400123)
+        self.assertEqual(message.parse_time("2015-01-01T00:00:01Z"),
+                         1420070401000)
+        self.assertRaises(ValueError, message.parse_time, "yesterday")
+
+    def test_add_tags(self):
+        self.assertEqual(message.add_tags(b":a PRIVMSG #b :c\r\n", b"x=1"),
+                         b"@x=1 :a PRIVMSG #b :c\r\n")
+        self.assertEqual(message.add_tags(b"@y=2 :a PING\r\n", b"x=1"),
+                         b"@x=1;y=2 :a PING\r\n")
+
+
+class TestDispatch(unittest.TestCase):
+    class Recorder(connection.Connection):
+        def __init__(self):
+            self.received = []
+            self.connection_made(transport=None)
+
+        def irc_PING(self, message):
+            self.received.append(("PING", message.params))
+
+        def unhandled(self, message):
+            self.received.append(("unhandled", message.command))
+
+    def test_dispatch(self):
+        recorder = self.Recorder()
+        recorder.line_received("PING :token")
+        recorder.line_received(":server NOTICE * :hi")
+        self.assertEqual(recorder.received, [("PING", ["token"]),
+                                             ("unhandled", "NOTICE")])
+
+    def test_hook(self):
+        class Hooked(self.Recorder): pass
+        Hooked.hook("ping", lambda c, m: c.received.append("hook"))
+        Hooked.hook("notice", lambda c, m: True)
+
+        recorder = Hooked()
+        Hooked.hook("privmsg", lambda c, m: c.received.append("late"))
+        recorder.line_received("PRIVMSG #chan :hi")
+        recorder.line_received("PING :token")
+        recorder.line_received(":server NOTICE * :hi")
+        self.assertEqual(recorder.received, ["late", ("unhandled", "PRIVMSG"),
+                                             "hook", ("PING", ["token"])])
+
+        # hooks on a subclass do not leak into its parent
+        recorder = self.Recorder()
+        recorder.line_received("PING :token")
+        self.assertEqual(recorder.received, [("PING", ["token"])])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from sputnik import connection, metrics
+
+
+class Transport(object):
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+
+class TestHistogram(unittest.TestCase):
+    def test_render(self):
+        histogram = metrics.Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 5.0): histogram.observe(value)
+        self.assertEqual(histogram.render("lag", { "network" : 'a"b' }), [
+            'lag_bucket{le="0.1",network="a\\"b"} 2',
+            'lag_bucket{le="1.0",network="a\\"b"} 3',
+            'lag_bucket{le="+Inf",network="a\\"b"} 4',
+            'lag_sum{network="a\\"b"} 5.65',
+            'lag_count{network="a\\"b"} 4'])
+
+
+class TestCounters(unittest.TestCase):
+    def test_connection(self):
+        conn = connection.Connection()
+        conn.connection_made(Transport())
+        conn.data_received(b"PING :a\r\nPING :b\r\nPI")
+        conn.data_received(b"NG :c\r\n")
+        conn.send("PONG", ":a")
+        self.assertEqual((conn.lines_in, conn.bytes_in), (3, 27))
+        self.assertEqual((conn.lines_out, conn.bytes_out), (1, 9))
+
+        # counters are kept per instance
+        self.assertEqual(connection.Connection.lines_in, 0)
+
+if __name__ == "__main__":
+    unittest.main()
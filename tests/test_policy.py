@@ -0,0 +1,23 @@
+import asyncio
+import unittest
+
+from sputnik import policy
+
+
+class TestPolicy(unittest.TestCase):
+    def tearDown(self):
+        asyncio.set_event_loop_policy(None)
+
+    def test_install(self):
+        self.assertEqual(policy.install("asyncio"), "asyncio")
+        self.assertIsInstance(asyncio.get_event_loop_policy(),
+                              asyncio.DefaultEventLoopPolicy)
+        self.assertIn(policy.install("auto"), policy.available())
+
+    def test_fallback(self):
+        expected = "uvloop" if "uvloop" in policy.available() else "asyncio"
+        self.assertEqual(policy.install("uvloop"), expected)
+        self.assertRaises(ValueError, policy.install, "twisted")
+
+if __name__ == "__main__":
+    unittest.main()
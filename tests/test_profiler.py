@@ -0,0 +1,53 @@
+import threading
+import time
+import unittest
+
+from sputnik import profiler
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline: pass
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profiler = profiler.Profiler(interval=0.001)
+
+    def tearDown(self):
+        self.profiler.stop()
+
+    def test_sampling(self):
+        self.profiler.start()
+        self.assertTrue(self.profiler.running)
+        busy(0.2)
+        self.profiler.stop()
+        self.assertFalse(self.profiler.running)
+
+        self.assertGreater(self.profiler.samples, 10)
+        lines = self.profiler.collapsed().splitlines()
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit()
+                            for line in lines))
+        self.assertTrue(any(";test_profiler:busy" in line for line in lines))
+        self.assertEqual(self.profiler.top(1)[0][0], "test_profiler:busy")
+
+    def test_restart(self):
+        self.profiler.start()
+        busy(0.05)
+        self.profiler.stop()
+        self.profiler.start()
+        self.assertEqual(self.profiler.samples, 0)
+
+    def test_target(self):
+        done = threading.Event()
+        worker = threading.Thread(target=lambda: (busy(0.2), done.set()))
+        worker.start()
+        self.profiler.start(target=worker.ident)
+        done.wait()
+        worker.join()
+        self.profiler.stop()
+        self.assertTrue(all("test_profiler:<lambda>" in stack
+                            for stack in self.profiler.stacks))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import unittest
+
+from sputnik import scheduler
+
+
+class FakeNetwork(object):
+    def __init__(self, name):
+        self.network = name
+        self.connected = True
+        self.attempts = 0
+        self.reconnects = 0
+        self.handle = None
+        self.context = None
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.scheduler = scheduler.Scheduler(base=1.0, cap=60.0, spacing=0.5)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_delay(self):
+        for attempt in range(12):
+            ceiling = min(60.0, 2.0 ** attempt)
+            for _ in range(50):
+                delay = self.scheduler.delay(attempt)
+                self.assertGreaterEqual(delay, ceiling / 2)
+                self.assertLessEqual(delay, ceiling)
+        self.assertLessEqual(self.scheduler.delay(10 ** 6), 60.0)
+
+    def test_stagger(self):
+        # record the time of each dial, as handles only expose it from 3.7
+        times, call_at = [], self.loop.call_at
+
+        def record(when, callback, *args):
+            times.append(when)
+            return call_at(when, callback, *args)
+        self.loop.call_at = record
+
+        networks = [FakeNetwork("net%d" % n) for n in range(4)]
+        for network in networks: self.scheduler.connect(network)
+        self.assertEqual([n.state for n in networks], ["connecting"] * 4)
+
+        for earlier, later in zip(times, times[1:]):
+            self.assertAlmostEqual(later - earlier, 0.5)
+
+    def test_retry(self):
+        network = FakeNetwork("net")
+        self.scheduler.retry(network)
+        self.assertEqual(network.state, "backing off")
+        self.assertEqual(network.attempts, 1)
+
+        self.scheduler.cancel(network)
+        self.assertIsNone(network.handle)
+
+    def test_pool(self):
+        self.scheduler.limit = 2
+        server = self.loop.run_until_complete(self.loop.create_server(
+            asyncio.Protocol, "127.0.0.1", 0))
+        port = server.sockets[0].getsockname()[1]
+
+        class Network(FakeNetwork, asyncio.Protocol):
+            hostname = "127.0.0.1"
+            transport = None
+
+            def connection_made(self, transport):
+                self.transport = transport
+                self.registered = asyncio.Future()
+
+        networks = [Network("net%d" % n) for n in range(5)]
+        for network in networks:
+            network.port = port
+            asyncio.async(self.scheduler.open(network))
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+
+        # only two Networks may be connecting at once
+        waiting = [n for n in networks if n.transport]
+        self.assertEqual(len(waiting), 2)
+
+        for network in waiting: network.registered.set_result(True)
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertEqual(len([n for n in networks if n.transport]), 4)
+        self.assertIsNotNone(waiting[0].startup)
+
+        for network in networks:
+            network.connected = False
+            if network.transport:
+                network.transport.close()
+                if not network.registered.done():
+                    network.registered.set_result(False)
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        server.close()
+        self.loop.run_until_complete(server.wait_closed())
+
+if __name__ == "__main__":
+    unittest.main()
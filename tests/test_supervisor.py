@@ -0,0 +1,81 @@
+import json
+import types
+import unittest
+
+from sputnik import bouncer, channel, client, metrics, network, supervisor
+
+
+class TestSharding(unittest.TestCase):
+    def test_shard_of(self):
+        names = ["network%d" % number for number in range(1000)]
+        shards = [bouncer.shard_of(name, 4) for name in names]
+        self.assertEqual(shards, [bouncer.shard_of(name, 4) for name in names])
+        for shard in range(4):
+            self.assertGreater(shards.count(shard), 200)
+
+    def test_route(self):
+        self.assertIsNone(supervisor.route(b"NICK a\r\nUSER freenode"))
+        self.assertEqual(supervisor.route(b"CAP LS 302\r\nNICK a\r\n"
+                                          b"USER freenode 0 * :a\r\n"),
+                         "freenode")
+        self.assertEqual(supervisor.route(b"user efnet 0 * :a\n"), "efnet")
+
+    def test_proxy_header(self):
+        def transport(peer, local):
+            extra = {"peername": peer, "sockname": local}
+            return types.SimpleNamespace(get_extra_info=extra.get)
+
+        self.assertEqual(supervisor.proxy_header(transport(
+            ("192.0.2.1", 50000), ("192.0.2.2", 6667))),
+            b"PROXY TCP4 192.0.2.1 192.0.2.2 50000 6667\r\n")
+        self.assertEqual(supervisor.proxy_header(transport(
+            ("2001:db8::1", 50000, 0, 0), ("2001:db8::2", 6667, 0, 0))),
+            b"PROXY TCP6 2001:db8::1 2001:db8::2 50000 6667\r\n")
+        self.assertEqual(supervisor.proxy_header(transport(None, None)),
+                         b"PROXY UNKNOWN\r\n")
+
+    def test_describe(self):
+        joined = channel.Channel("#a")
+        joined.members.update({"a": "@", "d": ""})
+        network = types.SimpleNamespace(network="efnet", hostname="irc.efnet",
+                                        port=6667, nickname="a", username="b",
+                                        realname="c", state="registered",
+                                        tls=True, channels={"#a": joined})
+        details = supervisor.describe(network)
+        self.assertEqual(details["state"], "registered")
+        self.assertTrue(details["tls"])
+
+        # channels are summarized, without their members, as plain JSON
+        self.assertEqual(json.loads(json.dumps(details))["channels"],
+                         [{"name": "#a", "topic": None, "count": 2}])
+
+
+class Transport(object):
+    def write(self, data): pass
+    def set_write_buffer_limits(self, high, low): pass
+    def get_write_buffer_size(self): return 0
+    def get_extra_info(self, name): return ("192.0.2.1", 50000)
+
+
+class TestReport(unittest.TestCase):
+    def test_clients(self):
+        worker = types.SimpleNamespace(clients=set(), networks={},
+                                       subscribers={}, datastore=None,
+                                       archive=None)
+        worker.networks["efnet"] = network.Network(
+            worker, "efnet", "irc.efnet", 6667, "a", "b", "c")
+        connection = client.Client(worker)
+        connection.connection_made(Transport())
+        connection.data_received(b"USER efnet 0 * :c\r\n")
+
+        # the Supervisor renders the Client gauges reported by its Workers
+        supervised = types.SimpleNamespace(clients=set(), networks={})
+        for name, details in json.loads(json.dumps(
+                supervisor.report(worker))).items():
+            supervised.networks[name] = types.SimpleNamespace(**details)
+        self.assertIn('sputnik_client_lines_in_total{client="%d",'
+                      'network="efnet"} 1' % connection.serial,
+                      metrics.render(supervised).splitlines())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from sputnik import throttle
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.bucket = throttle.TokenBucket(rate=2.0, burst=3,
+                                           clock=lambda: self.now)
+
+    def test_burst(self):
+        self.assertEqual([self.bucket.consume() for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(self.bucket.consume(), 0.5)
+
+    def test_refill(self):
+        for _ in range(3): self.bucket.consume()
+        self.now = 0.5
+        self.assertEqual(self.bucket.consume(), 0)
+        self.assertAlmostEqual(self.bucket.consume(), 0.5)
+
+        # tokens never accumulate beyond the burst
+        self.now = 100.0
+        self.assertEqual([self.bucket.consume() for _ in range(3)], [0, 0, 0])
+        self.assertGreater(self.bucket.consume(), 0)
+
+        self.bucket.refill()
+        self.assertEqual(self.bucket.consume(), 0)
+
+
+class TestLimiter(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.limiter = throttle.Limiter(rate=0.5, burst=2, limit=3,
+                                        clock=lambda: self.now)
+
+    def test_allow(self):
+        self.assertEqual([self.limiter.allow("a") for _ in range(3)],
+                         [True, True, False])
+        # each address has its own allowance
+        self.assertTrue(self.limiter.allow("b"))
+        self.now = 2.0
+        self.assertEqual([self.limiter.allow("a") for _ in range(2)],
+                         [True, False])
+
+    def test_prune(self):
+        for address in ("a", "b", "c"): self.limiter.allow(address)
+        self.now = 1.0
+        self.limiter.allow("a")
+
+        # only addresses whose buckets have refilled are forgotten
+        self.now = 2.0
+        self.limiter.allow("d")
+        self.assertEqual(sorted(self.limiter.buckets), ["a", "d"])
+
+        # while every address is limited, only the least recent is forgotten
+        for _ in range(2): self.limiter.allow("e")
+        self.limiter.allow("f")
+        self.assertEqual(list(self.limiter.buckets), ["d", "e", "f"])
+        self.assertFalse(self.limiter.allow("e"))
+
+if __name__ == "__main__":
+    unittest.main()
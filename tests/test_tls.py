@@ -0,0 +1,84 @@
+import asyncio
+import os
+import ssl
+import unittest
+
+from sputnik import tls
+
+CERTIFICATE = os.path.join(os.path.dirname(__file__), "keycert.pem")
+
+
+class Server(asyncio.Protocol):
+    def connection_made(self, transport):
+        transport.write(b":irc.example.net 001 nick :Welcome\r\n")
+
+
+class Client(asyncio.Protocol):
+    def __init__(self):
+        self.welcomed = asyncio.Future()
+
+    def data_received(self, data):
+        if not self.welcomed.done(): self.welcomed.set_result(data)
+
+
+class TestTLS(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(self.loop.create_server(
+            Server, "127.0.0.1", 0, ssl=tls.server_context(CERTIFICATE)))
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def tearDown(self):
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    def connect(self, context):
+        transport, client = self.loop.run_until_complete(
+            self.loop.create_connection(Client, "localhost", self.port,
+                                        ssl=context))
+        self.assertEqual(self.loop.run_until_complete(client.welcomed),
+                         b":irc.example.net 001 nick :Welcome\r\n")
+        return transport
+
+    @unittest.skipUnless(hasattr(ssl, "SSLSession"), "requires Python 3.6")
+    def test_resumption(self):
+        context = tls.client_context(cafile=CERTIFICATE)
+        transport = self.connect(context)
+        ssl_object = transport.get_extra_info("ssl_object")
+        self.assertFalse(ssl_object.session_reused)
+        tls.remember(transport)
+        self.assertIsNotNone(context.session)
+        transport.close()
+
+        # the next connection with the same context resumes the session
+        transport = self.connect(context)
+        self.assertTrue(transport.get_extra_info("ssl_object").session_reused)
+        transport.close()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+    def test_fallback(self):
+        # without SSLSession, a plain context is used, and nothing is saved
+        session = ssl.__dict__.pop("SSLSession", None)
+        try: context = tls.client_context(cafile=CERTIFICATE)
+        finally:
+            if session: ssl.SSLSession = session
+        self.assertNotIsInstance(context, tls.SessionContext)
+        transport = self.connect(context)
+        tls.remember(transport)
+        self.assertFalse(hasattr(context, "session"))
+        transport.close()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+    def test_verify(self):
+        with self.assertRaises(OSError):
+            self.connect(tls.client_context())
+
+        transport = self.connect(tls.client_context(verify=False))
+        tls.remember(transport)
+        transport.close()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+if __name__ == "__main__":
+    unittest.main()